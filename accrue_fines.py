@@ -0,0 +1,16 @@
+"""
+Accrue fines for overdue borrowings
+Run this nightly via cron job or scheduler (hourly keeps eligibility checks tighter)
+"""
+
+from models import db
+from fine_service import accrue_fines
+
+
+if __name__ == '__main__':
+    from app_new import app
+    
+    with app.app_context():
+        changed = accrue_fines()
+        db.session.commit()
+        print(f"✅ Fines accrued: {changed} borrowing(s) updated")
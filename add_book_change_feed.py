@@ -0,0 +1,49 @@
+"""
+Migration script for the catalog change feed
+Adds the (updated_at, id) index on books and the deleted_books tombstone table
+"""
+
+import sqlite3
+
+
+def add_book_change_feed():
+    """Backfill books.updated_at, index it and create deleted_books"""
+    conn = None
+    try:
+        conn = sqlite3.connect('instance/library_dev.db')
+        cursor = conn.cursor()
+        
+        # Rows without updated_at would never appear in the feed
+        cursor.execute(
+            "UPDATE books SET updated_at = COALESCE(added_date, CURRENT_TIMESTAMP) "
+            "WHERE updated_at IS NULL"
+        )
+        print(f"✅ Backfilled updated_at for {cursor.rowcount} books")
+        
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_books_updated_at_id ON books (updated_at, id)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS deleted_books (
+                id INTEGER PRIMARY KEY,
+                book_id INTEGER NOT NULL,
+                isbn VARCHAR(20),
+                deleted_at DATETIME NOT NULL
+            )
+        """)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS ix_deleted_books_deleted_at_book_id "
+            "ON deleted_books (deleted_at, book_id)"
+        )
+        conn.commit()
+        print("✅ Change feed index and deleted_books table are in place")
+        
+    except Exception as e:
+        print(f"❌ Error: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == '__main__':
+    print("Adding catalog change feed schema...")
+    add_book_change_feed()
+    print("Migration complete!")
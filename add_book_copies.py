@@ -0,0 +1,61 @@
+"""
+Migration script to link borrowings to physical book copies
+Run this once to update the database schema, then run reconcile_inventory.py
+to create copy records for existing books
+"""
+
+import sqlite3
+
+
+def add_book_copies():
+    """Create the book_copies table and add copy_id to borrowings"""
+    conn = None
+    try:
+        conn = sqlite3.connect('instance/library_dev.db')
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS book_copies (
+                id INTEGER NOT NULL PRIMARY KEY,
+                book_id INTEGER NOT NULL REFERENCES books (id),
+                barcode VARCHAR(30) NOT NULL,
+                shelf_location VARCHAR(20),
+                branch VARCHAR(50),
+                condition VARCHAR(20),
+                status VARCHAR(20),
+                created_at DATETIME,
+                updated_at DATETIME
+            )
+        """)
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_book_copies_barcode ON book_copies (barcode)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_book_copies_book_id ON book_copies (book_id)")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS ix_book_copies_available "
+            "ON book_copies (book_id) WHERE status = 'available'"
+        )
+        print("✅ book_copies table is in place")
+        
+        # Check if column already exists
+        cursor.execute("PRAGMA table_info(borrowings)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'copy_id' not in columns:
+            cursor.execute("ALTER TABLE borrowings ADD COLUMN copy_id INTEGER REFERENCES book_copies (id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS ix_borrowings_copy_id ON borrowings (copy_id)")
+            print("✅ Added 'copy_id' column to borrowings table")
+        else:
+            print("ℹ️  'copy_id' column already exists in borrowings table")
+        
+        conn.commit()
+        
+    except Exception as e:
+        print(f"❌ Error: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == '__main__':
+    print("Adding copy-level inventory...")
+    add_book_copies()
+    print("Migration complete!")
@@ -0,0 +1,75 @@
+"""
+Migration script to stop SQLite reusing borrowing ids
+Archived loans keep their id in borrowing_history; without AUTOINCREMENT SQLite
+hands the highest freed id to the next loan and the next archive run fails.
+Rebuilds borrowings as an AUTOINCREMENT table, starting after every id in use.
+"""
+
+import sqlite3
+
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateTable, CreateIndex
+
+from models import Borrowing
+
+
+def add_borrowings_autoincrement():
+    """Recreate borrowings with AUTOINCREMENT and seed its sequence"""
+    conn = None
+    try:
+        conn = sqlite3.connect('instance/library_dev.db')
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'borrowings'")
+        row = cursor.fetchone()
+        if row is None:
+            print("ℹ️  borrowings table does not exist yet; create_all() will build it")
+            return
+        if 'AUTOINCREMENT' in row[0].upper():
+            print("ℹ️  borrowings already uses AUTOINCREMENT")
+            return
+
+        table = Borrowing.__table__
+        dialect = sqlite.dialect()
+        cursor.execute("PRAGMA table_info(borrowings)")
+        existing = {column[1] for column in cursor.fetchall()}
+        columns = ', '.join(column.name for column in table.columns if column.name in existing)
+
+        # SQLite's table rebuild: new table, copy, drop, rename (other tables'
+        # foreign keys keep naming "borrowings")
+        cursor.execute("PRAGMA foreign_keys = OFF")
+        create = str(CreateTable(table).compile(dialect=dialect))
+        cursor.execute(create.replace('CREATE TABLE borrowings', 'CREATE TABLE borrowings_new', 1))
+        cursor.execute(f"INSERT INTO borrowings_new ({columns}) SELECT {columns} FROM borrowings")
+        cursor.execute("DROP TABLE borrowings")
+        cursor.execute("ALTER TABLE borrowings_new RENAME TO borrowings")
+        for index in table.indexes:
+            cursor.execute(str(CreateIndex(index).compile(dialect=dialect)))
+
+        # Start after ids already archived as well as live ones
+        cursor.execute("""
+            SELECT MAX(id) FROM (
+                SELECT MAX(id) AS id FROM borrowings
+                UNION ALL SELECT MAX(id) FROM borrowing_history
+            )
+        """)
+        highest = cursor.fetchone()[0] or 0
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'borrowings'")
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('borrowings', ?)", (highest,))
+        conn.commit()
+        cursor.execute("PRAGMA foreign_keys = ON")
+        print(f"✅ borrowings now uses AUTOINCREMENT; next id is {highest + 1}")
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        if conn:
+            conn.rollback()
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == '__main__':
+    print("Rebuilding borrowings with AUTOINCREMENT...")
+    add_borrowings_autoincrement()
+    print("Migration complete!")
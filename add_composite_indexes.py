@@ -0,0 +1,46 @@
+"""
+Migration script to add the composite indexes proposed by index_advisor.py
+Run this once to update the database schema
+"""
+
+import sqlite3
+
+
+INDEXES = [
+    ('ix_borrowings_user_id_status', 'borrowings', 'user_id, status'),
+    ('ix_borrowings_book_id_status', 'borrowings', 'book_id, status'),
+    ('ix_borrowings_status_due_date', 'borrowings', 'status, due_date'),
+    ('ix_reservations_user_id_status', 'reservations', 'user_id, status'),
+    ('ix_notifications_user_id_is_read_created_at', 'notifications', 'user_id, is_read, created_at'),
+    ('ix_transaction_verifications_user_id_code', 'transaction_verifications', 'user_id, verification_code'),
+    ('ix_transaction_verifications_user_id_is_verified', 'transaction_verifications',
+     'user_id, is_verified, verified_at'),
+]
+
+
+def add_composite_indexes():
+    """Create the composite indexes and drop the one they supersede"""
+    conn = None
+    try:
+        conn = sqlite3.connect('instance/library_dev.db')
+        cursor = conn.cursor()
+        
+        for name, table, columns in INDEXES:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+            print(f"✅ {name} is in place")
+        
+        # (user_id, is_read) is a prefix of the new notifications index
+        cursor.execute("DROP INDEX IF EXISTS ix_notifications_user_id_is_read")
+        conn.commit()
+        
+    except Exception as e:
+        print(f"❌ Error: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == '__main__':
+    print("Adding composite indexes...")
+    add_composite_indexes()
+    print("Migration complete!")
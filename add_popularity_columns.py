@@ -0,0 +1,69 @@
+"""
+Migration script for the book leaderboards
+Adds books.borrow_count and books.trending_score, backfilled from past loans
+"""
+
+import sqlite3
+from datetime import datetime
+
+HALF_LIFE_DAYS = 7
+
+
+def add_popularity_columns():
+    """Add and index the counters, then backfill them from borrowings and history"""
+    conn = None
+    try:
+        conn = sqlite3.connect('instance/library_dev.db')
+        cursor = conn.cursor()
+        
+        cursor.execute("PRAGMA table_info(books)")
+        columns = [column[1] for column in cursor.fetchall()]
+        if 'borrow_count' not in columns:
+            cursor.execute("ALTER TABLE books ADD COLUMN borrow_count INTEGER NOT NULL DEFAULT 0")
+        if 'trending_score' not in columns:
+            cursor.execute("ALTER TABLE books ADD COLUMN trending_score FLOAT NOT NULL DEFAULT 0")
+        
+        # All-time count covers archived loans too
+        cursor.execute("""
+            UPDATE books SET borrow_count = (
+                SELECT COUNT(*) FROM borrowings WHERE borrowings.book_id = books.id
+            ) + (
+                SELECT COUNT(*) FROM borrowing_history WHERE borrowing_history.book_id = books.id
+            )
+        """)
+        print(f"✅ Backfilled borrow_count for {cursor.rowcount} books")
+        
+        # Each loan weighs 0.5 ** (age in days / half-life), as if decayed since it was made
+        now = datetime.utcnow()
+        scores = {}
+        cursor.execute("SELECT book_id, borrow_date FROM borrowings WHERE borrow_date IS NOT NULL")
+        for book_id, borrow_date in cursor.fetchall():
+            age = (now - datetime.fromisoformat(borrow_date)).total_seconds() / 86400
+            scores[book_id] = scores.get(book_id, 0) + 0.5 ** (max(age, 0) / HALF_LIFE_DAYS)
+        cursor.execute("UPDATE books SET trending_score = 0")
+        cursor.executemany(
+            "UPDATE books SET trending_score = ? WHERE id = ?",
+            [(score if score >= 0.01 else 0, book_id) for book_id, score in scores.items()]
+        )
+        cursor.execute(
+            "INSERT OR REPLACE INTO settings (key, value, description) VALUES (?, ?, ?)",
+            ('trending_decayed_at', now.isoformat(), 'Last run of decay_trending_scores.py')
+        )
+        print(f"✅ Backfilled trending_score for {len(scores)} books")
+        
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_books_borrow_count ON books (borrow_count)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_books_trending_score ON books (trending_score)")
+        conn.commit()
+        print("✅ Leaderboard columns and indexes are in place")
+        
+    except Exception as e:
+        print(f"❌ Error: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == '__main__':
+    print("Adding book leaderboard columns...")
+    add_popularity_columns()
+    print("Migration complete!")
@@ -0,0 +1,33 @@
+"""
+Migration script to add the reservation queue index
+Run this once to update the database schema
+"""
+
+import sqlite3
+
+
+def add_reservation_queue_index():
+    """Create the (book_id, status, created_at) index used by the reservation queue"""
+    conn = None
+    try:
+        conn = sqlite3.connect('instance/library_dev.db')
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS ix_reservations_book_id_status_created_at "
+            "ON reservations (book_id, status, created_at)"
+        )
+        conn.commit()
+        print("✅ Reservation queue index is in place")
+        
+    except Exception as e:
+        print(f"❌ Error: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == '__main__':
+    print("Adding reservation queue index...")
+    add_reservation_queue_index()
+    print("Migration complete!")
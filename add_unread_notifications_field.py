@@ -0,0 +1,52 @@
+"""
+Migration script to add the denormalized unread_notifications counter to users
+Run this once to update the database schema
+"""
+
+import sqlite3
+
+
+def add_unread_notifications_field():
+    """Add unread_notifications column to users and backfill it"""
+    conn = None
+    try:
+        conn = sqlite3.connect('instance/library_dev.db')
+        cursor = conn.cursor()
+        
+        # Check if column already exists
+        cursor.execute("PRAGMA table_info(users)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'unread_notifications' not in columns:
+            cursor.execute("ALTER TABLE users ADD COLUMN unread_notifications INTEGER NOT NULL DEFAULT 0")
+            print("✅ Added 'unread_notifications' column to users table")
+        else:
+            print("ℹ️  'unread_notifications' column already exists in users table")
+        
+        # Composite index used by the unread badge and reconciliation
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS ix_notifications_user_id_is_read "
+            "ON notifications (user_id, is_read)"
+        )
+        
+        # Backfill from the notifications table
+        cursor.execute("""
+            UPDATE users SET unread_notifications = (
+                SELECT COUNT(*) FROM notifications
+                WHERE notifications.user_id = users.id AND notifications.is_read = 0
+            )
+        """)
+        conn.commit()
+        print(f"✅ Backfilled unread counters for {cursor.rowcount} users")
+        
+    except Exception as e:
+        print(f"❌ Error: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == '__main__':
+    print("Adding unread notifications counter to users table...")
+    add_unread_notifications_field()
+    print("Migration complete!")
@@ -0,0 +1,40 @@
+"""
+Migration script for precomputed recommendations
+Creates the user_recommendations table read by the user dashboard
+"""
+
+import sqlite3
+
+
+def add_user_recommendations():
+    """Create user_recommendations keyed by (user_id, rank)"""
+    conn = None
+    try:
+        conn = sqlite3.connect('instance/library_dev.db')
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_recommendations (
+                user_id INTEGER NOT NULL REFERENCES users (id),
+                rank SMALLINT NOT NULL,
+                book_id INTEGER NOT NULL REFERENCES books (id),
+                score FLOAT NOT NULL,
+                computed_at DATETIME,
+                PRIMARY KEY (user_id, rank)
+            )
+        """)
+        conn.commit()
+        print("✅ user_recommendations table is in place")
+        print("ℹ️  Run compute_recommendations.py to fill it")
+        
+    except Exception as e:
+        print(f"❌ Error: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == '__main__':
+    print("Adding recommendations table...")
+    add_user_recommendations()
+    print("Migration complete!")
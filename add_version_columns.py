@@ -0,0 +1,42 @@
+"""
+Migration script to add optimistic-locking version columns
+Run this once to update the database schema
+"""
+
+import sqlite3
+
+
+VERSIONED_TABLES = ['books', 'borrowings', 'reservations']
+
+
+def add_version_columns():
+    """Add version_id to books, borrowings and reservations"""
+    conn = None
+    try:
+        conn = sqlite3.connect('instance/library_dev.db')
+        cursor = conn.cursor()
+        
+        for table in VERSIONED_TABLES:
+            # Check if column already exists
+            cursor.execute(f"PRAGMA table_info({table})")
+            columns = [column[1] for column in cursor.fetchall()]
+            
+            if 'version_id' not in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN version_id INTEGER NOT NULL DEFAULT 1")
+                print(f"✅ Added 'version_id' column to {table} table")
+            else:
+                print(f"ℹ️  'version_id' column already exists in {table} table")
+        
+        conn.commit()
+        
+    except Exception as e:
+        print(f"❌ Error: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == '__main__':
+    print("Adding version columns...")
+    add_version_columns()
+    print("Migration complete!")
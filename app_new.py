@@ -12,7 +12,11 @@ from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect
 
 from config import config
-from models import db, User
+from models import db
+import cache_service
+import shared_cache_service
+import settings_service
+import page_cache_service
 
 # Load environment variables from .env file
 load_dotenv()
@@ -38,6 +42,10 @@ def create_app(config_name=None):
     mail.init_app(app)
     migrate.init_app(app, db)
     csrf.init_app(app)
+    cache_service.init_app(app)
+    shared_cache_service.init_app(app)
+    settings_service.init_app(app)
+    page_cache_service.init_app(app)
     
     # Login manager configuration
     login_manager.login_view = 'auth.login'
@@ -46,7 +54,7 @@ def create_app(config_name=None):
     
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return cache_service.load_principal(int(user_id))
     
     # Register blueprints
     from routes.main import main_bp
@@ -83,17 +91,14 @@ def create_app(config_name=None):
     # Context processors
     @app.context_processor
     def inject_globals():
-        from models import Category, Department, Notification
         from flask_login import current_user
         
-        categories = Category.query.filter_by(is_active=True).all()
-        departments = Department.query.filter_by(is_active=True).all()
+        categories = cache_service.get_active_categories()
+        departments = cache_service.get_active_departments()
         
         unread_notifications = 0
         if current_user.is_authenticated:
-            unread_notifications = Notification.query.filter_by(
-                user_id=current_user.id, is_read=False
-            ).count()
+            unread_notifications = current_user.unread_notifications or 0
         
         return dict(
             categories=categories,
@@ -105,6 +110,8 @@ def create_app(config_name=None):
     with app.app_context():
         db.create_all()
         initialize_data()
+        cache_service.warm_lookups()
+        settings_service.get_settings()
     
     return app
 
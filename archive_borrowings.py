@@ -0,0 +1,14 @@
+"""
+Archive settled borrowings to the borrowing_history table
+Run this nightly via cron job or scheduler to keep the borrowings table small
+"""
+
+from history_service import archive_borrowings
+
+
+if __name__ == '__main__':
+    from app_new import app
+    
+    with app.app_context():
+        archived = archive_borrowings()
+        print(f"✅ Borrowings archived: {archived} loan(s) moved to history")
@@ -0,0 +1,258 @@
+"""
+Book Payload Service Module
+Per-book JSON fragments (orjson bytes) cached by book id and updated_at; list
+responses are assembled by concatenating fragments instead of re-serialising rows.
+Sparse fieldsets (?fields=) are projected with load_only and serialized uncached.
+"""
+
+from datetime import datetime
+
+import orjson
+from flask import current_app
+from sqlalchemy import event, func, Float
+
+from models import db, Book, Review
+
+
+def _summary(book, rating):
+    return {
+        'id': book.id,
+        'isbn': book.isbn,
+        'title': book.title,
+        'author': book.author,
+        'category': book.category,
+        'department': book.department,
+        'available': book.available_copies > 0,
+        'available_copies': book.available_copies,
+        'cover_image': book.cover_image,
+        'rating': rating
+    }
+
+
+def _detail(book, rating):
+    return {
+        'id': book.id,
+        'isbn': book.isbn,
+        'title': book.title,
+        'author': book.author,
+        'publisher': book.publisher,
+        'publication_year': book.publication_year,
+        'category': book.category,
+        'department': book.department,
+        'language': book.language,
+        'pages': book.pages,
+        'total_copies': book.total_copies,
+        'available_copies': book.available_copies,
+        'shelf_location': book.shelf_location,
+        'description': book.description,
+        'cover_image': book.cover_image,
+        'rating': rating
+    }
+
+
+def _search(book, rating):
+    return {
+        'id': book.id,
+        'title': book.title,
+        'author': book.author,
+        'category': book.category or 'General',
+        'isbn': book.isbn,
+        'available_copies': book.available_copies,
+        'cover_image': book.cover_image or 'default_book.png'
+    }
+
+
+def _legacy_detail(book, rating):
+    return {
+        'id': book.id,
+        'isbn': book.isbn,
+        'title': book.title,
+        'author': book.author,
+        'publisher': book.publisher,
+        'publication_year': book.publication_year,
+        'category': book.category,
+        'department': book.department,
+        'description': book.description,
+        'total_copies': book.total_copies,
+        'available_copies': book.available_copies,
+        'average_rating': rating,
+        'cover_image': book.cover_image
+    }
+
+
+# shape name -> (builder, needs rating)
+SHAPES = {
+    'summary': (_summary, True),
+    'detail': (_detail, True),
+    'search': (_search, False),
+    'legacy_detail': (_legacy_detail, True),
+}
+
+
+# Summary fields a client may ask for with ?fields=: (columns needed, value getter)
+SUMMARY_FIELDS = {
+    'id': ((Book.id,), lambda book: book.id),
+    'isbn': ((Book.isbn,), lambda book: book.isbn),
+    'title': ((Book.title,), lambda book: book.title),
+    'author': ((Book.author,), lambda book: book.author),
+    'category': ((Book.category,), lambda book: book.category),
+    'department': ((Book.department,), lambda book: book.department),
+    'available': ((Book.available_copies,), lambda book: book.available_copies > 0),
+    'available_copies': ((Book.available_copies,), lambda book: book.available_copies),
+    'cover_image': ((Book.cover_image,), lambda book: book.cover_image),
+    'rating': ((), None),  # filled from one grouped ratings query
+}
+
+MAX_BATCH_IDS = 100
+
+
+def parse_fields(value):
+    """
+    Requested summary fields from a comma-separated ?fields= value
+
+    Returns:
+        tuple or None: Field names in request order, None for the full summary
+
+    Raises:
+        ValueError: An unknown field was requested
+    """
+    if not value:
+        return None
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in SUMMARY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields or None
+
+
+def parse_ids(value):
+    """
+    Book ids from a comma-separated ?ids= value, duplicates removed
+
+    Returns:
+        list or None: None when no ids were given
+
+    Raises:
+        ValueError: Non-numeric ids or more than MAX_BATCH_IDS of them
+    """
+    if not value:
+        return None
+    try:
+        ids = list(dict.fromkeys(int(book_id) for book_id in value.split(',') if book_id.strip()))
+    except ValueError:
+        raise ValueError('ids must be comma-separated integers')
+    if len(ids) > MAX_BATCH_IDS:
+        raise ValueError(f'At most {MAX_BATCH_IDS} ids per request')
+    return ids
+
+
+def sparse_columns(fields):
+    """Book columns to pass to load_only() for the requested fields"""
+    return list(dict.fromkeys(column for field in fields for column in SUMMARY_FIELDS[field][0]))
+
+
+def sparse_fragments(books, fields):
+    """
+    Serialized summaries restricted to `fields`, in the requested order
+
+    Only the projected columns are read, so rows loaded with
+    load_only(*sparse_columns(fields)) never lazy-load. Ratings are queried
+    only when asked for.
+    """
+    ratings = average_ratings([book.id for book in books]) if 'rating' in fields else {}
+    return [
+        orjson.dumps({
+            field: ratings.get(book.id, 0) if field == 'rating' else SUMMARY_FIELDS[field][1](book)
+            for field in fields
+        })
+        for book in books
+    ]
+
+
+def _payload_cache():
+    return current_app.extensions['book_payload_cache']
+
+
+def average_ratings(book_ids):
+    """Average rating per book for the given ids in one grouped query"""
+    if not book_ids:
+        return {}
+    # AVG() is NUMERIC on PostgreSQL, which comes back as Decimal and orjson rejects
+    return {book_id: float(rating) for book_id, rating in db.session.query(
+        Review.book_id, func.avg(Review.rating).cast(Float)
+    ).filter(Review.book_id.in_(book_ids)).group_by(Review.book_id)}
+
+
+def book_fragments(books, shape='summary'):
+    """
+    Serialized JSON object for each book, in order
+
+    Fragments are keyed by (shape, id, updated_at), so any write that touches
+    the book row makes old fragments unreachable in every worker. Ratings are
+    only queried for books that miss the cache.
+
+    Args:
+        books: Book rows (updated_at must be loaded)
+        shape: Key of SHAPES
+
+    Returns:
+        list: bytes fragments
+    """
+    build, needs_rating = SHAPES[shape]
+    cache = _payload_cache()
+    keys = [(shape, book.id, book.updated_at) for book in books]
+    fragments = [cache.get(key) for key in keys]
+
+    missing = [book for book, fragment in zip(books, fragments) if fragment is None]
+    if missing:
+        ratings = average_ratings([book.id for book in missing]) if needs_rating else {}
+        for index, fragment in enumerate(fragments):
+            if fragment is None:
+                book = books[index]
+                fragment = orjson.dumps(build(book, ratings.get(book.id, 0)))
+                cache.set(keys[index], fragment)
+                fragments[index] = fragment
+    return fragments
+
+
+def book_fragment(book, shape='detail'):
+    """Serialized JSON object for one book"""
+    return book_fragments([book], shape)[0]
+
+
+def json_response(body):
+    """Wrap pre-serialized JSON bytes in a response"""
+    return current_app.response_class(body, mimetype='application/json')
+
+
+def list_response(name, fragments, **envelope):
+    """
+    JSON object whose `name` key holds the concatenated fragments
+
+    Args:
+        name: Key of the list (e.g. 'books')
+        fragments: bytes from book_fragments()
+        envelope: Other top-level keys, serialized with orjson
+
+    Returns:
+        Response
+    """
+    body = b'{"' + name.encode() + b'":[' + b','.join(fragments) + b']'
+    if envelope:
+        body += b',' + orjson.dumps(envelope)[1:]
+    else:
+        body += b'}'
+    return json_response(body)
+
+
+# A review changes the rating baked into the book's fragments. Touch updated_at
+# only: the version counter guards circulation writes, not derived data.
+@event.listens_for(Review, 'after_insert')
+@event.listens_for(Review, 'after_update')
+@event.listens_for(Review, 'after_delete')
+def _review_changed(mapper, connection, target):
+    connection.execute(
+        Book.__table__.update()
+        .where(Book.__table__.c.id == target.book_id)
+        .values(updated_at=datetime.utcnow())
+    )
@@ -0,0 +1,306 @@
+"""
+Cache Service Module
+Process-local caches for rarely-changing lookup data (categories, departments),
+for the logged-in user principal, for serialized book payloads and for idempotent
+POST responses
+"""
+
+import time
+import uuid
+from functools import wraps
+from threading import Lock
+from types import SimpleNamespace
+
+from flask import current_app, request, jsonify, make_response
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+from models import db, Setting, Category, Department, User, Notification
+from shared_cache_service import RedisStore
+
+
+LOOKUP_VERSION_KEY = 'lookup_cache_version'
+
+# Never kept in the principal cache; loaded on demand from the database
+PRINCIPAL_EXCLUDED_COLUMNS = {'password_hash', 'verification_token', 'reset_token', 'reset_token_expiry'}
+
+
+def snapshot(obj, exclude=()):
+    """Copy an ORM row's column values into a plain, session-independent object"""
+    return SimpleNamespace(**{
+        column.name: getattr(obj, column.name) for column in obj.__table__.columns
+        if column.name not in exclude
+    })
+
+
+class VersionedCache:
+    """
+    Per-worker cache whose entries are dropped when a shared version counter changes.
+
+    The counter lives in the settings table so every worker sees a bump; each worker
+    re-reads it at most once every `check_interval` seconds.
+    """
+
+    def __init__(self, version_key, check_interval=30):
+        self.version_key = version_key
+        self.check_interval = check_interval
+        self._lock = Lock()
+        self._values = {}
+        self._version = None
+        self._checked_at = 0
+
+    def _sync_version(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self.check_interval:
+            return
+        version = Setting.get(self.version_key, '0')
+        if version != self._version:
+            self._values.clear()
+            self._version = version
+        self._checked_at = now
+
+    def get(self, name, loader):
+        """Return the cached value for `name`, calling `loader()` on a miss"""
+        with self._lock:
+            self._sync_version()
+            if name not in self._values:
+                self._values[name] = loader()
+            return self._values[name]
+
+    def version(self):
+        """Current shared version, e.g. for HTTP validators"""
+        with self._lock:
+            self._sync_version()
+            return self._version
+
+    def bump(self):
+        """Invalidate this cache in every worker"""
+        with self._lock:
+            version = str(int(Setting.get(self.version_key, '0') or 0) + 1)
+            Setting.set(self.version_key, version, 'Bumped when cached lookup data changes')
+            self._values.clear()
+            self._version = version
+            self._checked_at = time.monotonic()
+
+
+class TTLCache:
+    """Small per-worker key/value cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, ttl=60, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = Lock()
+        self._entries = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            return value
+
+    def _store(self, key, value, now):
+        # Re-inserted keys move to the end, so entries stay in expiry order and
+        # the expired ones (or, when full, the oldest) are always at the front
+        self._entries.pop(key, None)
+        while self._entries:
+            oldest = next(iter(self._entries))
+            if now < self._entries[oldest][0] and len(self._entries) < self.maxsize:
+                break
+            del self._entries[oldest]
+        self._entries[key] = (now + self.ttl, value)
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value, time.monotonic())
+
+    def add(self, key, value):
+        """Set `key` only if it is absent or expired; returns True if it was set"""
+        with self._lock:
+            now = time.monotonic()
+            entry = self._entries.get(key)
+            if entry is not None and now < entry[0]:
+                return False
+            self._store(key, value, now)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def init_app(app):
+    """Attach fresh lookup and user caches to the application"""
+    app.extensions['lookup_cache'] = VersionedCache(
+        LOOKUP_VERSION_KEY,
+        check_interval=app.config.get('LOOKUP_CACHE_TTL', 30)
+    )
+    app.extensions['user_cache'] = TTLCache(ttl=app.config.get('USER_CACHE_TTL', 60))
+    app.extensions['idempotency_cache'] = TTLCache(ttl=app.config.get('IDEMPOTENCY_KEY_TTL', 600))
+    app.extensions['book_payload_cache'] = TTLCache(ttl=app.config.get('BOOK_PAYLOAD_CACHE_TTL', 3600))
+    app.jinja_env.globals['idempotency_key'] = new_idempotency_key
+
+
+def _lookup_cache():
+    return current_app.extensions['lookup_cache']
+
+
+def get_active_categories():
+    """Active categories, served from the per-worker cache"""
+    return _lookup_cache().get('categories', lambda: [
+        snapshot(category) for category in Category.query.filter_by(is_active=True).all()
+    ])
+
+
+def get_active_departments():
+    """Active departments, served from the per-worker cache"""
+    return _lookup_cache().get('departments', lambda: [
+        snapshot(department) for department in Department.query.filter_by(is_active=True).all()
+    ])
+
+
+def warm_lookups():
+    """Preload lookup data so the first request of a worker pays nothing"""
+    get_active_categories()
+    get_active_departments()
+
+
+def invalidate_lookups():
+    """Call after categories or departments are added, edited or removed"""
+    _lookup_cache().bump()
+
+
+# ==================== USER PRINCIPAL ====================
+
+def _user_cache():
+    return current_app.extensions['user_cache']
+
+
+def load_principal(user_id):
+    """
+    Flask-Login user loader backed by the per-worker user cache.
+
+    On a hit the cached column values are merged into the session as a persistent
+    User without a SELECT, so writes and relationships keep working. Excluded
+    columns (password hash, tokens) are loaded on first access.
+    """
+    values = _user_cache().get(user_id)
+    if values is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            _user_cache().set(user_id, {
+                column.name: getattr(user, column.name)
+                for column in User.__table__.columns
+                if column.name not in PRINCIPAL_EXCLUDED_COLUMNS
+            })
+        return user
+
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def invalidate_user(user_id):
+    """Call after a user's profile, role or status changes"""
+    if 'user_cache' in current_app.extensions:
+        _user_cache().delete(user_id)
+
+
+# The unread badge lives on the cached principal; drop it when the counter moves
+@event.listens_for(Notification, 'after_insert')
+@event.listens_for(Notification, 'after_update')
+@event.listens_for(Notification, 'after_delete')
+def _notification_changed(mapper, connection, target):
+    invalidate_user(target.user_id)
+
+
+# ==================== IDEMPOTENCY KEYS ====================
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_FORM_FIELD = 'idempotency_key'
+IDEMPOTENCY_WAIT = 5  # Seconds a retry waits for the original request to finish
+
+_IN_FLIGHT = 'in-flight'
+
+
+def new_idempotency_key():
+    """Fresh key for a form's hidden `idempotency_key` field"""
+    return uuid.uuid4().hex
+
+
+def _wait_for_response(store, key):
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT
+    while time.monotonic() < deadline:
+        cached = store.get(key)
+        if cached != _IN_FLIGHT:
+            return cached
+        time.sleep(0.05)
+    return None
+
+
+def _idempotency_store():
+    """
+    The shared Redis tier when there is one, so a retry that reaches another
+    worker still sees the first request; otherwise this worker's TTLCache
+    """
+    local = current_app.extensions['idempotency_cache']
+    shared = current_app.extensions.get('shared_cache')
+    if shared is None or shared.redis is None:
+        return local
+    return RedisStore(shared.redis, f'{shared.namespace}:idempotency', local.ttl, fallback=local)
+
+
+def idempotent(view):
+    """
+    Replay the stored response when a POST repeats its idempotency key.
+
+    The key comes from the `Idempotency-Key` header or the `idempotency_key`
+    form field and is scoped to the user and URL. Requests without a key
+    run normally. A retry that arrives while the original is still running
+    waits for it; server errors are not stored so the client can try again.
+    Keys are claimed with SET NX in the shared Redis tier when one is
+    configured, so every worker sees them.
+    """
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER) or request.form.get(IDEMPOTENCY_FORM_FIELD)
+        if not key:
+            return view(*args, **kwargs)
+
+        owner = current_user.get_id() if current_user.is_authenticated else request.remote_addr
+        cache_key = f'{owner}:{request.path}:{key}'
+        store = _idempotency_store()
+
+        if not store.add(cache_key, _IN_FLIGHT):
+            cached = _wait_for_response(store, cache_key)
+            if cached is None:
+                return jsonify({'success': False, 'message': 'This request is already being processed.'}), 409
+            body, status, headers = cached
+            response = current_app.response_class(body, status, headers)
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            store.delete(cache_key)
+            raise
+
+        if response.status_code >= 500:
+            store.delete(cache_key)
+        else:
+            store.set(cache_key, (
+                response.get_data(),
+                response.status_code,
+                [(name, value) for name, value in response.headers if name.lower() != 'set-cookie']
+            ))
+        return response
+    return decorated_function
@@ -0,0 +1,145 @@
+"""
+Catalog Sync Service Module
+Full NDJSON catalog dumps, and a change feed for offline catalog replicas: books
+inserted, updated, deactivated or deleted since an opaque keyset cursor over
+(updated_at, id)
+"""
+
+import base64
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import orjson
+from flask import current_app
+from sqlalchemy import select, or_, and_
+
+from models import db, Book, DeletedBook
+from book_payload_service import SHAPES, average_ratings
+
+
+ChangeSet = namedtuple('ChangeSet', 'books removed cursor has_more')
+
+_ORIGIN = (datetime(1970, 1, 1), 0)
+
+
+def encode_cursor(timestamp, book_id):
+    """Opaque cursor for the position just after (timestamp, book_id)"""
+    raw = f'{timestamp.isoformat()}|{book_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Inverse of encode_cursor; an empty cursor means "from the beginning"
+
+    Raises:
+        ValueError: The cursor was not produced by encode_cursor
+    """
+    if not cursor:
+        return _ORIGIN
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, book_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(book_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def _after(timestamp_column, id_column, position):
+    timestamp, row_id = position
+    return or_(timestamp_column > timestamp,
+               and_(timestamp_column == timestamp, id_column > row_id))
+
+
+def changes_since(cursor=None, limit=None, now=None):
+    """
+    Books changed since `cursor`, oldest change first
+
+    Rows newer than CHANGE_FEED_LAG seconds are held back: updated_at is set at
+    flush time, and a transaction that commits late must not land behind a
+    cursor a client has already moved past.
+
+    Args:
+        cursor: Value returned by a previous call, or None for a full sync
+        limit: Maximum changes returned (defaults to CHANGE_FEED_LIMIT)
+        now: Reference time (defaults to utcnow)
+
+    Returns:
+        ChangeSet: active `books`, `removed` ids (deactivated or deleted),
+        the next `cursor` and whether more changes are waiting
+    """
+    position = decode_cursor(cursor)
+    limit = limit or current_app.config.get('CHANGE_FEED_LIMIT', 500)
+    horizon = (now or datetime.utcnow()) - timedelta(seconds=current_app.config.get('CHANGE_FEED_LAG', 5))
+
+    books = Book.query.filter(
+        _after(Book.updated_at, Book.id, position),
+        Book.updated_at <= horizon
+    ).order_by(Book.updated_at, Book.id).limit(limit + 1).all()
+
+    tombstones = db.session.query(DeletedBook.deleted_at, DeletedBook.book_id).filter(
+        _after(DeletedBook.deleted_at, DeletedBook.book_id, position),
+        DeletedBook.deleted_at <= horizon
+    ).order_by(DeletedBook.deleted_at, DeletedBook.book_id).limit(limit + 1).all()
+
+    changes = sorted(
+        [((book.updated_at, book.id), book) for book in books] +
+        [((deleted_at, book_id), None) for deleted_at, book_id in tombstones],
+        key=lambda change: change[0]
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    active, removed = [], []
+    for (timestamp, book_id), book in changes:
+        if book is not None and book.is_active:
+            active.append(book)
+        elif book_id not in removed:
+            removed.append(book_id)
+
+    next_cursor = encode_cursor(*changes[-1][0]) if changes else (cursor or encode_cursor(*_ORIGIN))
+    return ChangeSet(active, removed, next_cursor, has_more)
+
+
+# ==================== FULL DUMP ====================
+
+def iter_catalog_ndjson(department=None, category=None, batch_size=None):
+    """
+    Yield the active catalog as NDJSON, one batch of lines per chunk
+
+    Rows are fetched as plain tuples with yield_per (a server-side cursor on
+    PostgreSQL), so neither the identity map nor the response grows with the
+    catalog. Each batch costs one grouped ratings query.
+
+    Args:
+        department: Optional department filter
+        category: Optional category filter
+        batch_size: Rows per fetch (defaults to CATALOG_DUMP_BATCH_SIZE)
+
+    Yields:
+        bytes
+    """
+    build, _ = SHAPES['detail']
+    books = Book.__table__
+    stmt = select(books).where(books.c.is_active == True).order_by(books.c.id)
+    if department:
+        stmt = stmt.where(books.c.department == department)
+    if category:
+        stmt = stmt.where(books.c.category == category)
+
+    batch_size = batch_size or current_app.config.get('CATALOG_DUMP_BATCH_SIZE', 500)
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    for rows in result.partitions():
+        ratings = average_ratings([row.id for row in rows])
+        yield b''.join(orjson.dumps(build(row, ratings.get(row.id, 0))) + b'\n' for row in rows)
+
+
+def gzip_stream(chunks, level=6):
+    """Compress a byte stream on the fly, emitting gzip output as it is produced"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
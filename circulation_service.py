@@ -0,0 +1,250 @@
+"""
+Circulation Service Module
+Batch check-out and check-in for the circulation desk, and conflict retries
+for circulation writes
+"""
+
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import abort
+from sqlalchemy import update
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import StaleDataError
+
+from models import db, Book, BookCopy, Borrowing, Reservation, Notification
+from fine_service import accrue_fines, unpaid_fines
+from patron_service import get_patron_status
+from reservation_service import return_copy
+from settings_service import loan_days
+
+
+MAX_CONFLICT_RETRIES = 3
+
+
+def retry_on_conflict(view):
+    """
+    Re-run a circulation view when an optimistic version check fails
+
+    Book, Borrowing and Reservation rows carry a version_id; a concurrent
+    writer makes the losing UPDATE raise StaleDataError. The transaction is
+    rolled back and the view re-reads fresh state, up to MAX_CONFLICT_RETRIES
+    times before answering 409 Conflict.
+    """
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        for _ in range(MAX_CONFLICT_RETRIES):
+            try:
+                return view(*args, **kwargs)
+            except StaleDataError:
+                db.session.rollback()
+        abort(409, description='This record was changed by someone else. Please try again.')
+    return decorated_function
+
+
+def _resolve_items(identifiers):
+    """
+    Map each scanned identifier to (book, copy) with two queries
+
+    Barcodes resolve to a specific copy; anything else is looked up as an ISBN.
+    Unknown identifiers map to (None, None).
+    """
+    copies = {copy.barcode: copy for copy in BookCopy.query.options(
+        joinedload(BookCopy.book)
+    ).filter(BookCopy.barcode.in_(identifiers))}
+    isbns = [item for item in identifiers if item not in copies]
+    books = {book.isbn: book for book in Book.query.filter(Book.isbn.in_(isbns))} if isbns else {}
+
+    return {
+        item: (copies[item].book, copies[item]) if item in copies else (books.get(item), None)
+        for item in identifiers
+    }
+
+
+def _result(item, ok, message, book=None, **extra):
+    result = {'item': item, 'success': ok, 'message': message}
+    if book is not None:
+        result.update(book_id=book.id, title=book.title)
+    result.update(extra)
+    return result
+
+
+def batch_checkout(user, identifiers, now=None):
+    """
+    Lend every scanned item to one patron (caller commits)
+
+    Everything is validated up front against the patron's standing, current
+    loans and holds; items that fail are reported and skipped. Copies are
+    picked from one query and claimed with one conditional UPDATE per source
+    status; if a concurrent loan got one first, StaleDataError makes the
+    caller retry (see retry_on_conflict).
+
+    A patron with a ready hold may take a shelf copy instead of the held one;
+    the held copy then goes to the next reservation in line or the shelf.
+
+    Args:
+        user: Patron borrowing the items
+        identifiers: ISBNs and/or copy barcodes
+        now: Reference time (defaults to utcnow)
+
+    Returns:
+        tuple: (per-item results, list of new Borrowing records)
+    """
+    now = now or datetime.utcnow()
+    identifiers = list(dict.fromkeys(identifiers))
+    resolved = _resolve_items(identifiers)
+    patron = get_patron_status(user.id, now)
+
+    book_ids = {book.id for book, _ in resolved.values() if book is not None}
+    on_loan = {row.book_id for row in db.session.query(Borrowing.book_id).filter(
+        Borrowing.user_id == user.id,
+        Borrowing.status == 'borrowed',
+        Borrowing.book_id.in_(book_ids)
+    )} if book_ids else set()
+    reservations = {r.book_id: r for r in Reservation.query.filter(
+        Reservation.user_id == user.id,
+        Reservation.status == 'pending',
+        Reservation.book_id.in_(book_ids)
+    )} if book_ids else {}
+    free_copies = {}
+    for free_copy in BookCopy.query.filter(
+        BookCopy.book_id.in_(book_ids),
+        BookCopy.status.in_(('available', 'on_hold'))
+    ).order_by(BookCopy.id) if book_ids else ():
+        free_copies.setdefault((free_copy.book_id, free_copy.status), []).append(free_copy)
+
+    results, loans, claims = [], [], {}
+    due_date = now + timedelta(days=loan_days())
+    active = patron.active_loans
+
+    for item in identifiers:
+        book, copy = resolved[item]
+        if book is None:
+            results.append(_result(item, False, 'Unknown ISBN or barcode.'))
+            continue
+        if patron.has_fines:
+            results.append(_result(item, False, 'Patron has pending fines.', book))
+            continue
+        if not book.is_active:
+            results.append(_result(item, False, 'This book is not in circulation.', book))
+            continue
+        if book.id in on_loan:
+            results.append(_result(item, False, 'Patron already has this book.', book))
+            continue
+        if active >= patron.borrow_limit:
+            results.append(_result(item, False, f'Borrowing limit reached ({patron.borrow_limit} books).', book))
+            continue
+
+        reservation = reservations.get(book.id)
+        hold = reservation if reservation is not None and reservation.notified \
+            and reservation.expiry_date and reservation.expiry_date >= now else None
+
+        if copy is not None:
+            if copy.status != 'available' and not (hold and copy.status == 'on_hold'):
+                results.append(_result(item, False, f'Copy is {copy.status.replace("_", " ")}.', book))
+                continue
+        elif not hold and not book.is_available():
+            results.append(_result(item, False, 'No copies available.', book))
+            continue
+        else:
+            # Books without copy records stay counter-only
+            candidates = free_copies.get((book.id, 'on_hold' if hold else 'available'))
+            copy = candidates.pop(0) if candidates else None
+        from_shelf = copy.status == 'available' if copy is not None else not hold
+
+        borrowing = Borrowing(user_id=user.id, book_id=book.id, book=book,
+                              borrow_date=now, due_date=due_date)
+        db.session.add(borrowing)
+        if copy is not None:
+            claims.setdefault(copy.status, []).append(copy.id)
+            borrowing.copy_id = copy.id
+        if from_shelf:
+            book.available_copies -= 1
+        if reservation is not None:
+            reservation.status = 'fulfilled'
+        if hold and from_shelf:
+            held = free_copies.get((book.id, 'on_hold'))
+            return_copy(book, held.pop(0) if held else None, now)
+
+        loans.append(borrowing)
+        on_loan.add(book.id)
+        active += 1
+        results.append(_result(item, True, 'Checked out.', book,
+                               barcode=copy.barcode if copy else None,
+                               due_date=due_date.isoformat()))
+
+    for status, copy_ids in claims.items():
+        claimed = db.session.execute(
+            update(BookCopy)
+            .where(BookCopy.id.in_(copy_ids), BookCopy.status == status)
+            .values(status='on_loan')
+            .execution_options(synchronize_session='fetch')
+        ).rowcount
+        if claimed != len(copy_ids):
+            raise StaleDataError('A copy in this batch was lent concurrently')
+
+    return results, loans
+
+
+def batch_checkin(user, identifiers, now=None):
+    """
+    Return every scanned item a patron has on loan (caller commits)
+
+    Fines for the patron's loans are brought up to date first in one pass,
+    and each copy is handed to the next reservation in line.
+
+    Args:
+        user: Patron returning the items
+        identifiers: ISBNs and/or copy barcodes
+        now: Reference time (defaults to utcnow)
+
+    Returns:
+        tuple: (per-item results, list of returned Borrowing records)
+    """
+    now = now or datetime.utcnow()
+    identifiers = list(dict.fromkeys(identifiers))
+    resolved = _resolve_items(identifiers)
+
+    accrue_fines(now=now, user_id=user.id)
+    active = Borrowing.query.options(joinedload(Borrowing.copy)).filter(
+        Borrowing.user_id == user.id,
+        Borrowing.status == 'borrowed'
+    ).all()
+    by_copy = {loan.copy_id: loan for loan in active if loan.copy_id}
+    by_book = {loan.book_id: loan for loan in active}
+    owed = unpaid_fines(user.id)
+
+    results, returned = [], []
+    for item in identifiers:
+        book, copy = resolved[item]
+        if book is None:
+            results.append(_result(item, False, 'Unknown ISBN or barcode.'))
+            continue
+
+        loan = by_copy.get(copy.id) if copy is not None else by_book.get(book.id)
+        if loan is None or loan.status != 'borrowed':
+            results.append(_result(item, False, 'Not on loan to this patron.', book))
+            continue
+
+        loan.return_date = now
+        loan.status = 'returned'
+        return_copy(book, loan.copy, now)
+
+        returned.append(loan)
+        results.append(_result(item, True, 'Checked in.', book, fine=owed.get(loan.id, 0)))
+
+    return results, returned
+
+
+def notify_batch(user, action, loans):
+    """Add one notification summarizing a batch; returns it (caller commits)"""
+    verb = 'borrowed' if action == 'checkout' else 'returned'
+    titles = ', '.join(f'"{loan.book.title}"' for loan in loans)
+    notification = Notification(
+        user_id=user.id,
+        title=f'{len(loans)} Book(s) {verb.capitalize()}',
+        message=f'You have {verb} {titles}.',
+        notification_type='borrow' if action == 'checkout' else 'return'
+    )
+    db.session.add(notification)
+    return notification
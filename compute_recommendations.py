@@ -0,0 +1,14 @@
+"""
+Precompute the "Recommended for You" suggestions on the user dashboard
+Run this nightly via cron job or scheduler (requires numpy and scipy)
+"""
+
+from recommendation_service import compute_recommendations
+
+
+if __name__ == '__main__':
+    from app_new import app
+    
+    with app.app_context():
+        users = compute_recommendations()
+        print(f"✅ Recommendations computed for {users} user(s)")
@@ -32,6 +32,7 @@ class Config:
     # Library settings
     MAX_BORROW_DAYS = 14
     MAX_BOOKS_PER_USER = 5
+    MAX_RENEWALS = 2
     FINE_PER_DAY = 5  # Currency units per day
     RESERVATION_EXPIRY_DAYS = 3
     
@@ -47,6 +48,24 @@ class Config:
     # Cache settings
     CACHE_TYPE = 'simple'
     CACHE_DEFAULT_TIMEOUT = 300
+    LOOKUP_CACHE_TTL = 30  # Seconds between checks of the shared lookup cache version
+    SETTINGS_CACHE_TTL = 30  # Seconds between checks of the shared settings version
+    USER_CACHE_TTL = 60  # Seconds a logged-in user's principal is served from memory
+    BORROWING_ARCHIVE_DAYS = 180  # Settled loans older than this move to borrowing_history
+    IDEMPOTENCY_KEY_TTL = 600  # Seconds a POST response is replayed for a repeated Idempotency-Key
+    BOOK_PAYLOAD_CACHE_TTL = 3600  # Seconds a serialized book fragment is kept (keys include updated_at)
+    BOOK_CARD_CACHE_TTL = 3600  # Seconds a rendered book card is kept (keys include updated_at)
+    PAGE_CACHE_TTL = 300  # Seconds a public page is served to anonymous visitors from the shared cache
+    STATS_MAX_AGE = 60  # Seconds /api/stats answers conditional polls with 304
+    CHANGE_FEED_LAG = 5  # Seconds the catalog change feed trails behind, for in-flight transactions
+    CHANGE_FEED_LIMIT = 500  # Default number of changes per /api/books/changes call
+    CATALOG_DUMP_BATCH_SIZE = 500  # Rows fetched per round trip by /api/books/dump
+    TRENDING_HALF_LIFE_DAYS = 7  # Days for a loan's weight in the trending score to halve
+    RECOMMENDATIONS_PER_USER = 8  # Suggestions stored per user by compute_recommendations.py
+    SHARED_CACHE_TTL = 300  # Seconds derived page data lives in the shared (Redis) cache
+    SHARED_CACHE_L1_TTL = 30  # Seconds a worker keeps its in-memory copy without asking Redis
+    SHARED_CACHE_L1_SIZE = 1000  # Entries in each worker's in-memory LRU
+    SHARED_CACHE_STALE_TTL = 60  # Seconds an expired value may be served while one worker recomputes it
 
 
 class DevelopmentConfig(Config):
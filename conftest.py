@@ -0,0 +1,163 @@
+"""
+Pytest Fixtures - Library Management System
+Shared application, seeded database and SQL statement counting
+"""
+
+import os
+
+# Keep the test database in memory; must be set before config is imported
+os.environ.setdefault('TEST_DATABASE_URL', 'sqlite://')
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app_new import create_app
+from models import db, User, Book, Borrowing, Reservation, Review, Notification
+
+
+BOOKS_PER_CATEGORY = 3
+SEED_CATEGORIES = ['Fiction', 'Science', 'Technology', 'History', 'Comics']
+SEED_DEPARTMENTS = ['CSE', 'ECE', 'MECH']
+
+
+class QueryCounter:
+    """Record every SQL statement sent to an engine while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+        return False
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def report(self):
+        return '\n'.join(f'  {i + 1}. {s}' for i, s in enumerate(self.statements))
+
+
+def seed_books(count, offset=0):
+    """Add `count` active books spread over the seed categories/departments"""
+    books = []
+    for i in range(offset, offset + count):
+        book = Book(
+            isbn=f'978-0-{i:06d}',
+            title=f'Seed Book {i:03d}',
+            author=f'Author {i % 7}',
+            category=SEED_CATEGORIES[i % len(SEED_CATEGORIES)],
+            department=SEED_DEPARTMENTS[i % len(SEED_DEPARTMENTS)],
+            total_copies=3,
+            available_copies=2,
+            description=f'Description for seed book {i}',
+        )
+        db.session.add(book)
+        books.append(book)
+    db.session.flush()
+    return books
+
+
+def seed_circulation(user, books):
+    """Give `user` one active loan, one returned loan, a review and a notification per book"""
+    now = datetime.utcnow()
+    for i, book in enumerate(books):
+        db.session.add(Borrowing(
+            user_id=user.id, book_id=book.id,
+            borrow_date=now - timedelta(days=20),
+            due_date=now - timedelta(days=6) if i % 2 else now + timedelta(days=7),
+            status='borrowed',
+        ))
+        db.session.add(Borrowing(
+            user_id=user.id, book_id=book.id,
+            borrow_date=now - timedelta(days=60),
+            due_date=now - timedelta(days=46),
+            return_date=now - timedelta(days=47),
+            status='returned',
+        ))
+        db.session.add(Reservation(user_id=user.id, book_id=book.id))
+        db.session.add(Review(user_id=user.id, book_id=book.id, rating=(i % 5) + 1,
+                              review_text='Seeded review'))
+        db.session.add(Notification(user_id=user.id, title=f'Notice {i}',
+                                    message='Seeded notification',
+                                    notification_type='general'))
+    db.session.flush()
+
+
+@pytest.fixture
+def app():
+    """Application bound to a fresh in-memory database with seeded data"""
+    app = create_app('testing')
+
+    with app.app_context():
+        student = User(user_id='STU001', email='student@library.com',
+                       full_name='Seed Student', role='student',
+                       department='CSE', is_verified=True, is_active=True)
+        student.set_password('student123')
+        db.session.add(student)
+        db.session.flush()
+
+        books = seed_books(BOOKS_PER_CATEGORY * len(SEED_CATEGORIES))
+        seed_circulation(student, books[:4])
+        db.session.commit()
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client, app):
+    """Log the test client in as the given user_id without going through the form"""
+    def _login(user_id):
+        with app.app_context():
+            user = User.query.filter_by(user_id=user_id).first()
+            pk = user.id
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(pk)
+            sess['_fresh'] = True
+        return pk
+    return _login
+
+
+@pytest.fixture
+def count_queries(app):
+    """Context manager counting SQL statements issued against the app's engine"""
+    @contextmanager
+    def _count():
+        with app.app_context():
+            engine = db.engine
+        with QueryCounter(engine) as counter:
+            yield counter
+    return _count
+
+
+@pytest.fixture
+def assert_max_queries(count_queries):
+    """Fail when the wrapped block issues more than `limit` SQL statements"""
+    @contextmanager
+    def _assert(limit):
+        with count_queries() as counter:
+            yield counter
+        assert counter.count <= limit, (
+            f'Expected at most {limit} queries, got {counter.count}:\n{counter.report()}'
+        )
+    return _assert
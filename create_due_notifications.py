@@ -5,6 +5,7 @@ Run this script daily via cron job or scheduler
 
 from app_new import app, db
 from models import Borrowing, Notification
+from fine_service import accrue_fines, unpaid_fine_amount
 from datetime import datetime, timedelta
 from flask import url_for
 
@@ -14,6 +15,9 @@ def create_due_date_notifications():
         today = datetime.utcnow().date()
         three_days_later = today + timedelta(days=3)
         
+        # Quote fines at the configured rate, less anything already paid
+        accrue_fines()
+        
         # Get active borrowings
         active_borrowings = Borrowing.query.filter_by(status='borrowed').all()
         
@@ -59,7 +63,7 @@ def create_due_date_notifications():
                 
                 if not existing:
                     days_overdue = (today - due_date).days
-                    fine = borrowing.calculate_fine()
+                    fine = unpaid_fine_amount(borrowing)
                     notification = Notification(
                         user_id=borrowing.user_id,
                         title=f'Overdue: {borrowing.book.title}',
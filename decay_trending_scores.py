@@ -0,0 +1,14 @@
+"""
+Decay the trending scores behind the "popular right now" lists
+Run this hourly via cron job or scheduler
+"""
+
+from popularity_service import decay_trending_scores
+
+
+if __name__ == '__main__':
+    from app_new import app
+    
+    with app.app_context():
+        changed = decay_trending_scores()
+        print(f"✅ Trending scores decayed for {changed} book(s)")
@@ -10,6 +10,7 @@ from datetime import datetime, timedelta
 import random
 import string
 from models import db, User, EmailLog
+from fine_service import unpaid_fine_amount
 
 
 def generate_verification_code(length=6):
@@ -256,7 +257,7 @@ def send_overdue_notice(user, borrowing):
     """Send overdue notice with fine calculation"""
     subject = "Book Overdue Notice - Fine Applicable ⚠️"
     
-    fine_amount = borrowing.calculate_fine()
+    fine_amount = unpaid_fine_amount(borrowing)
     
     html_body = render_template(
         'emails/overdue_notice.html',
@@ -0,0 +1,16 @@
+"""
+Expire uncollected reservation holds
+Run this hourly via cron job or scheduler; each expired copy passes to the next patron in line
+"""
+
+from models import db
+from reservation_service import expire_holds
+
+
+if __name__ == '__main__':
+    from app_new import app
+    
+    with app.app_context():
+        expired = expire_holds()
+        db.session.commit()
+        print(f"✅ Reservations expired: {expired} hold(s) released")
@@ -0,0 +1,169 @@
+"""
+Fine Service Module
+Set-based fine accrual into Borrowing.fine_amount with a fine ledger.
+fine_amount is everything accrued on a loan; what is still owed is that minus
+the payments and waivers in the ledger
+"""
+
+from datetime import datetime
+
+from sqlalchemy import select, update, insert, exists, case, func, literal, and_, Integer
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+from models import db, Borrowing, FineLedger, Subscription, SubscriptionPlan
+from settings_service import fine_per_day
+from shared_cache_service import invalidate_tags_on_commit
+
+
+class days_overdue(FunctionElement):
+    """Whole days elapsed from `due` to `now` (floored like timedelta.days), per dialect"""
+    type = Integer()
+    name = 'days_overdue'
+    inherit_cache = True
+
+
+@compiles(days_overdue)
+def _days_overdue_default(element, compiler, **kw):
+    now, due = [compiler.process(arg, **kw) for arg in element.clauses]
+    return f"CAST(FLOOR(EXTRACT(EPOCH FROM ({now} - {due})) / 86400) AS INTEGER)"
+
+
+@compiles(days_overdue, 'sqlite')
+def _days_overdue_sqlite(element, compiler, **kw):
+    now, due = [compiler.process(arg, **kw) for arg in element.clauses]
+    return (f"((CAST(strftime('%s', {now}) AS INTEGER) - "
+            f"CAST(strftime('%s', {due}) AS INTEGER)) / 86400)")
+
+
+@compiles(days_overdue, 'mysql')
+def _days_overdue_mysql(element, compiler, **kw):
+    now, due = [compiler.process(arg, **kw) for arg in element.clauses]
+    return f"TIMESTAMPDIFF(DAY, {due}, {now})"
+
+
+def get_fine_rate():
+    """Fine per overdue day from the `fine_per_day` setting, falling back to config"""
+    return fine_per_day()
+
+
+def settled_amount():
+    """Correlated scalar: payments and waivers recorded against each Borrowing row"""
+    return select(func.coalesce(func.sum(FineLedger.amount), 0))\
+        .where(
+            FineLedger.borrowing_id == Borrowing.id,
+            FineLedger.entry_type.in_(('payment', 'waiver'))
+        )\
+        .scalar_subquery()
+
+
+def unpaid_fine():
+    """SQL expression for the part of each loan's fine not yet paid or waived"""
+    return func.coalesce(Borrowing.fine_amount, 0) - settled_amount()
+
+
+def unpaid_fine_amount(borrowing):
+    """What is still owed on one loan"""
+    if borrowing.fine_paid or not borrowing.fine_amount:
+        return 0
+    return db.session.execute(
+        select(unpaid_fine()).where(Borrowing.id == borrowing.id)
+    ).scalar() or 0
+
+
+def unpaid_fines(user_id, status='borrowed'):
+    """{borrowing id: amount still owed} for a patron's loans in `status`, in one query"""
+    return dict(db.session.execute(
+        select(Borrowing.id, unpaid_fine()).where(
+            Borrowing.user_id == user_id,
+            Borrowing.status == status,
+            Borrowing.fine_paid == False,
+            Borrowing.fine_amount > 0
+        )
+    ).all())
+
+
+def accrue_fines(now=None, user_id=None, borrowing_id=None, rate=None):
+    """
+    Bring fine_amount up to date for overdue loans in two set-based statements
+
+    The increase over the stored amount of every changed loan is appended to
+    the fine ledger first, then fine_amount is updated in one UPDATE. Loans
+    whose fine was already paid keep accruing while they stay out, and the new
+    amount reopens them (fine_paid is cleared). Patrons on a plan with
+    `no_late_fees` accrue nothing.
+
+    Args:
+        now: Reference time (defaults to utcnow)
+        user_id: Limit to one patron's loans
+        borrowing_id: Limit to a single loan
+        rate: Fine per day (defaults to the `fine_per_day` setting)
+
+    Returns:
+        int: Number of loans whose fine changed
+    """
+    now = now or datetime.utcnow()
+    rate = get_fine_rate() if rate is None else rate
+    now_param = literal(now, db.DateTime)
+
+    exempt = exists().where(
+        Subscription.user_id == Borrowing.user_id,
+        Subscription.status == 'active',
+        Subscription.end_date >= now_param,
+        SubscriptionPlan.id == Subscription.plan_id,
+        SubscriptionPlan.no_late_fees == True
+    )
+    accrued = case(
+        (exempt, 0),
+        else_=days_overdue(now_param, Borrowing.due_date) * rate
+    )
+    current = func.coalesce(Borrowing.fine_amount, 0)
+
+    conditions = [
+        Borrowing.status == 'borrowed',
+        Borrowing.due_date < now_param,
+        accrued > current
+    ]
+    if user_id is not None:
+        conditions.append(Borrowing.user_id == user_id)
+    if borrowing_id is not None:
+        conditions.append(Borrowing.id == borrowing_id)
+
+    db.session.execute(
+        insert(FineLedger).from_select(
+            ['borrowing_id', 'user_id', 'entry_type', 'amount', 'created_at'],
+            select(
+                Borrowing.id, Borrowing.user_id, literal('accrual'), accrued - current, now_param
+            ).where(and_(*conditions))
+        )
+    )
+    result = db.session.execute(
+        update(Borrowing)
+        .where(and_(*conditions))
+        .values(fine_amount=accrued, fine_paid=False, version_id=Borrowing.version_id + 1)
+        .execution_options(synchronize_session=False)
+    )
+    # Loaded loans still hold the old amount and version
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, Borrowing):
+            db.session.expire(obj, ['fine_amount', 'fine_paid', 'version_id'])
+    if result.rowcount:
+        invalidate_tags_on_commit('circulation')
+    return result.rowcount
+
+
+def record_fine_payment(borrowing, amount, payment_method=None):
+    """
+    Append a payment to the ledger and mark the loan's fine paid (caller commits)
+
+    fine_amount keeps the total accrued; `amount` should be what was still
+    owed (see unpaid_fine_amount).
+    """
+    borrowing.fine_paid = True
+    db.session.add(FineLedger(
+        borrowing_id=borrowing.id,
+        user_id=borrowing.user_id,
+        entry_type='payment',
+        amount=amount,
+        payment_method=payment_method
+    ))
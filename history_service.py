@@ -0,0 +1,154 @@
+"""
+History Service Module
+Hot/cold split of loans: settled borrowings are archived to borrowing_history,
+and history views read both tables through one union
+"""
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import select, insert, delete, union_all, literal, func, or_
+
+from models import db, Borrowing, BorrowingHistory
+from query_options import loan_list_options
+from shared_cache_service import invalidate_tags
+
+
+ARCHIVABLE_STATUSES = ('returned', 'cancelled')
+
+
+def _loan_union(user_id=None, status=None):
+    """(source, id, borrow_date) rows for live and archived loans"""
+    def part(model, source):
+        stmt = select(
+            literal(source).label('source'),
+            model.id.label('id'),
+            model.borrow_date.label('borrow_date')
+        )
+        if user_id is not None:
+            stmt = stmt.where(model.user_id == user_id)
+        if status:
+            stmt = stmt.where(model.status == status)
+        return stmt
+
+    parts = [part(Borrowing, 'live')]
+    if status not in ('borrowed', 'lost'):
+        parts.append(part(BorrowingHistory, 'archived'))
+    return union_all(*parts).subquery()
+
+
+def _load_loans(rows):
+    """Fetch Borrowing/BorrowingHistory objects for union rows, keeping their order"""
+    ids = {'live': [], 'archived': []}
+    for row in rows:
+        ids[row.source].append(row.id)
+
+    loaded = {}
+    for source, model in (('live', Borrowing), ('archived', BorrowingHistory)):
+        if ids[source]:
+            for loan in model.query.options(*loan_list_options(model)).filter(model.id.in_(ids[source])):
+                loaded[(source, loan.id)] = loan
+    return [loaded[(row.source, row.id)] for row in rows if (row.source, row.id) in loaded]
+
+
+class LoanHistoryPagination(Pagination):
+    """Pagination over live and archived loans, newest first"""
+
+    def _query_items(self):
+        union = self._query_args['union']
+        rows = db.session.execute(
+            select(union.c.source, union.c.id)
+            .order_by(union.c.borrow_date.desc(), union.c.id.desc())
+            .limit(self.per_page)
+            .offset(self._query_offset)
+        ).all()
+        return _load_loans(rows)
+
+    def _query_count(self):
+        union = self._query_args['union']
+        return db.session.execute(select(func.count()).select_from(union)).scalar()
+
+
+def paginate_loan_history(user_id=None, status=None, page=None, per_page=10):
+    """
+    Page through a patron's loans (or everyone's) across both tables
+
+    Args:
+        user_id: User primary key, or None for all patrons
+        status: Optional status filter
+        page: Page number (defaults to the `page` query arg)
+        per_page: Loans per page
+
+    Returns:
+        LoanHistoryPagination
+    """
+    return LoanHistoryPagination(page=page, per_page=per_page,
+                                 union=_loan_union(user_id, status))
+
+
+def recent_loans(user_id, limit=10):
+    """A patron's most recent loans, live or archived"""
+    union = _loan_union(user_id)
+    rows = db.session.execute(
+        select(union.c.source, union.c.id)
+        .order_by(union.c.borrow_date.desc(), union.c.id.desc())
+        .limit(limit)
+    ).all()
+    return _load_loans(rows)
+
+
+def count_loans(user_id):
+    """Number of loans a patron has ever had"""
+    return db.session.execute(select(func.count()).select_from(_loan_union(user_id))).scalar()
+
+
+def archive_borrowings(days=None, batch_size=500, now=None):
+    """
+    Move settled loans older than `days` from borrowings to borrowing_history
+
+    Only returned or cancelled loans with no unpaid fine are moved. Each batch is
+    one INSERT ... SELECT and one DELETE, committed together.
+
+    Args:
+        days: Age in days after return (defaults to BORROWING_ARCHIVE_DAYS)
+        batch_size: Loans moved per transaction
+        now: Reference time (defaults to utcnow)
+
+    Returns:
+        int: Number of loans archived
+    """
+    now = now or datetime.utcnow()
+    if days is None:
+        days = current_app.config.get('BORROWING_ARCHIVE_DAYS', 180)
+    cutoff = now - timedelta(days=days)
+
+    live = Borrowing.__table__
+    columns = [column.name for column in BorrowingHistory.__table__.columns if column.name != 'archived_at']
+
+    archived = 0
+    while True:
+        ids = db.session.execute(
+            select(live.c.id).where(
+                live.c.status.in_(ARCHIVABLE_STATUSES),
+                func.coalesce(live.c.return_date, live.c.created_at) < cutoff,
+                or_(live.c.fine_paid == True, func.coalesce(live.c.fine_amount, 0) == 0)
+            ).order_by(live.c.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        db.session.execute(
+            insert(BorrowingHistory.__table__).from_select(
+                columns + ['archived_at'],
+                select(*[live.c[name] for name in columns], literal(now, db.DateTime))
+                .where(live.c.id.in_(ids))
+            )
+        )
+        db.session.execute(delete(live).where(live.c.id.in_(ids)))
+        db.session.commit()
+        archived += len(ids)
+
+    if archived:
+        invalidate_tags('circulation')
+    return archived
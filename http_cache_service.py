@@ -0,0 +1,101 @@
+"""
+HTTP Cache Service Module
+Conditional GET for read-only APIs: ETag and Last-Modified validators are
+computed cheaply and checked before the view runs, so unchanged polls get a 304
+"""
+
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, request, make_response
+from sqlalchemy import func
+
+from models import db, Book
+
+
+def _http_date(value):
+    """Naive UTC datetime -> aware, second-precision value for Last-Modified"""
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc, microsecond=0)
+
+
+def _not_modified(tag, last_modified):
+    """True if the request's validators match the current representation"""
+    if request.if_none_match:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+        return request.if_none_match.contains_weak(tag)
+    since = request.if_modified_since
+    return since is not None and last_modified is not None and last_modified <= since
+
+
+def conditional(validator, weak=True):
+    """
+    Honour If-None-Match / If-Modified-Since before running a GET view
+
+    Args:
+        validator: Called with the view's kwargs; returns (tag, last_modified)
+                   or None to skip validation (e.g. the resource does not exist)
+        weak: Send a weak ETag (the body is equivalent, not byte-identical)
+
+    Returns:
+        Decorator
+    """
+    def decorator(view):
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            validators = validator(**kwargs)
+            if validators is None:
+                return view(*args, **kwargs)
+
+            tag, last_modified = validators
+            last_modified = _http_date(last_modified)
+            if _not_modified(tag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(tag, weak=weak)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True  # clients may store, but must revalidate
+            return response
+        return decorated_function
+    return decorator
+
+
+# ==================== VALIDATORS ====================
+
+def catalog_version(**kwargs):
+    """Every write to a book moves updated_at; deletes change the count"""
+    latest, count = db.session.query(func.max(Book.updated_at), func.count(Book.id)).one()
+    stamp = latest.timestamp() if latest else 0
+    return f'catalog-{count}-{stamp}', latest
+
+
+def book_version(book_id, **kwargs):
+    """Validators for one book, or None so the view can 404"""
+    latest = db.session.query(Book.updated_at).filter(Book.id == book_id).scalar()
+    if latest is None:
+        return None
+    return f'book-{book_id}-{latest.timestamp()}', latest
+
+
+def lookup_version(**kwargs):
+    """Categories and departments share the lookup cache version counter"""
+    return f"lookups-{current_app.extensions['lookup_cache'].version()}", None
+
+
+def stats_version(**kwargs):
+    """
+    Aggregate statistics are recomputed at most once per STATS_MAX_AGE window
+
+    A counter cheaper than the statistics themselves does not exist, so the tag
+    is the current time bucket: polls within a window get a 304.
+    """
+    max_age = current_app.config.get('STATS_MAX_AGE', 60)
+    bucket = int(time.time() // max_age)
+    return f'stats-{bucket}', datetime.utcfromtimestamp(bucket * max_age)
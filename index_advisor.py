@@ -0,0 +1,457 @@
+"""
+Composite Index Advisor
+Replays a benchmark of real page/API requests, fingerprints every SQL statement,
+runs EXPLAIN on SQLite or PostgreSQL and proposes composite and partial indexes.
+Proposals can be written out as an Alembic migration through Flask-Migrate.
+
+Usage:
+    python index_advisor.py                      # report only
+    python index_advisor.py --write-migration    # also create a revision in migrations/
+"""
+
+import argparse
+import json
+import re
+import uuid
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+from sqlalchemy import event, inspect, literal
+
+from models import db, User
+
+
+# Pages and API calls exercised by the benchmark: (path, user_id or None for anonymous)
+DEFAULT_BENCHMARK = [
+    ('/', None),
+    ('/books/', None),
+    ('/books/?category=Fiction', None),
+    ('/books/1', None),
+    ('/api/books', None),
+    ('/api/search?q=a', None),
+    ('/user/dashboard', 'student'),
+    ('/user/borrowings', 'student'),
+    ('/user/notifications', 'student'),
+    ('/user/fines', 'student'),
+    ('/books/1', 'student'),
+    ('/api/user/borrowings', 'student'),
+    ('/api/user/reservations', 'student'),
+    ('/api/user/stats', 'student'),
+    ('/admin/dashboard', 'admin'),
+    ('/admin/borrowings', 'admin'),
+    ('/admin/borrowings?overdue=yes', 'admin'),
+    ('/api/admin/stats', 'admin'),
+]
+
+# Columns with few distinct values: a constant filter on them suits a partial index
+LOW_CARDINALITY_COLUMNS = {'status', 'is_read', 'is_active', 'notified', 'fine_paid', 'is_verified'}
+
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE')
+
+CapturedStatement = namedtuple('CapturedStatement', 'fingerprint statement parameters')
+IndexProposal = namedtuple('IndexProposal', 'table columns where weight evidence')
+
+
+# ==================== CAPTURE ====================
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),                  # string literals
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),               # numeric literals
+    (re.compile(r'%\(\w+\)s|:\w+|\$\d+'), '?'),            # named/numbered bind params
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?)'),     # IN lists of any length
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def fingerprint(statement):
+    """Normalize a statement so executions differing only in values compare equal"""
+    text = statement.strip()
+    for pattern, replacement in _LITERALS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class StatementLog:
+    """Record every statement sent to an engine while active, grouped by fingerprint"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.samples = OrderedDict()  # fingerprint -> first CapturedStatement
+        self.counts = {}
+        self.bound_values = {}  # fingerprint -> list of parameter tuples
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        key = fingerprint(statement)
+        if key not in self.samples:
+            self.samples[key] = CapturedStatement(key, statement, parameters)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.bound_values.setdefault(key, []).append(parameters)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+        return False
+
+
+def _benchmark_users():
+    """Pick one student and one admin from the database for authenticated requests"""
+    return {
+        'student': User.query.filter(User.role != 'admin').order_by(User.id).first(),
+        'admin': User.query.filter_by(role='admin').order_by(User.id).first(),
+    }
+
+
+def run_benchmark(app, benchmark=None, runs=1):
+    """
+    Replay the benchmark through the test client and capture its SQL
+
+    Everything runs in one transaction that is rolled back afterwards, so
+    pages that write leave the database as it was.
+
+    Args:
+        app: Flask application bound to the database to analyse
+        benchmark: List of (path, 'student' | 'admin' | None)
+        runs: How many times to replay the list
+
+    Returns:
+        StatementLog
+    """
+    benchmark = benchmark or DEFAULT_BENCHMARK
+    with app.app_context():
+        users = {role: user.id for role, user in _benchmark_users().items() if user}
+        engine = db.engine
+
+    client = app.test_client()
+    with _rolled_back(engine), StatementLog(engine) as log:
+        for _ in range(runs):
+            for path, role in benchmark:
+                if role is not None and role not in users:
+                    continue
+                with client.session_transaction() as sess:
+                    sess.clear()
+                    if role is not None:
+                        sess['_user_id'] = str(users[role])
+                        sess['_fresh'] = True
+                client.get(path)
+    return log
+
+
+@contextmanager
+def _rolled_back(engine):
+    """
+    Bind db.session to one connection whose transaction is rolled back on exit
+
+    Some benchmark pages write (the notifications page marks everything read,
+    the fines page commits accruals); their commits only release savepoints.
+    """
+    factory = db.session.session_factory
+    session_class, options = factory.class_, dict(factory.kw)
+    connection = engine.connect()
+    transaction = connection.begin()
+    if engine.dialect.name == 'sqlite':
+        # pysqlite defers BEGIN; without it the first RELEASE SAVEPOINT would commit
+        connection.exec_driver_sql('BEGIN')
+
+    # Flask-SQLAlchemy's get_bind() picks the engine itself, ignoring a `bind` option
+    factory.class_ = type('BenchmarkSession', (session_class,), {
+        'get_bind': lambda self, *args, **kwargs: connection
+    })
+    factory.configure(join_transaction_mode='create_savepoint')
+    try:
+        yield
+    finally:
+        factory.class_, factory.kw = session_class, options
+        transaction.rollback()
+        connection.close()
+
+
+# ==================== EXPLAIN ====================
+
+def explain(connection, statement, parameters):
+    """
+    Return (full_scans, sorts, used_index_columns) for one statement
+
+    full_scans: tables read without an index
+    sorts: True if the plan needs a separate sort step
+    used_index_columns: table -> number of index columns the plan constrains
+    """
+    dialect = connection.dialect.name
+    full_scans, used, sorts = set(), {}, False
+
+    if dialect == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        for row in rows:
+            detail = row[-1]
+            match = re.match(r'(SCAN|SEARCH) (\w+)(?: AS \w+)?(.*)', detail)
+            if match:
+                kind, table, rest = match.groups()
+                if kind == 'SCAN' and 'INDEX' not in rest:
+                    full_scans.add(table)
+                constrained = re.search(r'\((.*)\)', rest)
+                if constrained:
+                    used[table] = max(used.get(table, 0), constrained.group(1).count('?'))
+            elif 'TEMP B-TREE' in detail:
+                sorts = True
+
+    elif dialect == 'postgresql':
+        result = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+        plan = result if isinstance(result, list) else json.loads(result)
+
+        def walk(node):
+            nonlocal sorts
+            kind = node.get('Node Type', '')
+            table = node.get('Relation Name')
+            if kind == 'Seq Scan' and table:
+                full_scans.add(table)
+            elif kind in ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan') and node.get('Index Cond'):
+                if table:  # Bitmap Index Scan nodes carry no relation name
+                    used[table] = max(used.get(table, 0), node['Index Cond'].count(' = '))
+            elif kind in ('Sort', 'Incremental Sort'):
+                sorts = True
+            for child in node.get('Plans', []):
+                walk(child)
+
+        walk(plan[0]['Plan'])
+
+    return full_scans, sorts, used
+
+
+# ==================== PROPOSALS ====================
+
+_ALIAS = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+AS\s+(\w+))?', re.IGNORECASE)
+_PREDICATE = re.compile(r'\b(\w+)\.(\w+)\s*(=|!=|<>|<=|>=|<|>|IN\b|IS\b)', re.IGNORECASE)
+_ORDER_BY = re.compile(r'\bORDER BY\s+(.*?)(?:\bLIMIT\b|\bOFFSET\b|\)|$)', re.IGNORECASE | re.DOTALL)
+
+
+def _where_clause(statement):
+    """Top-level WHERE text (up to GROUP BY / ORDER BY / LIMIT)"""
+    match = re.search(r'\bWHERE\b(.*?)(?:\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|$)',
+                      statement, re.IGNORECASE | re.DOTALL)
+    return match.group(1) if match else ''
+
+
+def _aliases(statement):
+    """alias or table name -> table name"""
+    aliases = {}
+    for table, alias in _ALIAS.findall(statement):
+        aliases[alias or table] = table
+        aliases[table] = table
+    return aliases
+
+
+def analyse_statement(statement):
+    """
+    Per-table filter shape: {table: {'eq': [...], 'range': [...], 'order': [...]}}
+
+    Relies on SQLAlchemy always qualifying columns with their table or alias.
+    """
+    aliases = _aliases(statement)
+    shape = {}
+    for qualifier, column, op in _PREDICATE.findall(_where_clause(statement)):
+        table = aliases.get(qualifier)
+        if table is None:
+            continue
+        entry = shape.setdefault(table, {'eq': [], 'range': [], 'order': []})
+        bucket = 'eq' if op.upper() in ('=', 'IN', 'IS') else 'range'
+        if column not in entry[bucket] and column not in entry['eq']:
+            entry[bucket].append(column)
+
+    order = _ORDER_BY.search(statement)
+    if order:
+        for qualifier, column in re.findall(r'\b(\w+)\.(\w+)', order.group(1)):
+            table = aliases.get(qualifier)
+            if table in shape and column not in shape[table]['order']:
+                shape[table]['order'].append(column)
+    return shape
+
+
+def _constant_columns(log, key, statement, table, columns):
+    """Columns of `table` compared against the same bound value on every execution"""
+    # Map each '?' placeholder to the predicate column of `table` that precedes it
+    aliases = _aliases(statement)
+    positions = []
+    for match in re.finditer(r'\b(\w+)\.(\w+)\s*(?:=|IS)\s*\?|\?', statement):
+        qualifier, column = match.group(1), match.group(2)
+        positions.append(column if qualifier and aliases.get(qualifier) == table else None)
+
+    constant = {}
+    executions = log.bound_values.get(key, [])
+    if not executions or not isinstance(executions[0], (tuple, list)):
+        return constant
+    for index, column in enumerate(positions):
+        if column not in columns or column not in LOW_CARDINALITY_COLUMNS:
+            continue
+        values = {params[index] for params in executions if index < len(params)}
+        if len(values) == 1:
+            constant[column] = values.pop()
+    return constant
+
+
+def _sql_literal(value, dialect):
+    """`value` as a SQL literal for `dialect` (booleans are 1/0 on SQLite, true/false on PostgreSQL)"""
+    return str(literal(value).compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+
+
+def _existing_indexes(engine):
+    """table -> list of column-name tuples for every index (and primary key)"""
+    inspector = inspect(engine)
+    existing = {}
+    for table in inspector.get_table_names():
+        existing[table] = [tuple(index['column_names']) for index in inspector.get_indexes(table)]
+        existing[table].append(tuple(inspector.get_pk_constraint(table)['constrained_columns']))
+    return existing
+
+
+def _covered(existing, table, columns):
+    return any(index[:len(columns)] == tuple(columns) for index in existing.get(table, []))
+
+
+def propose_indexes(app, log, min_count=1):
+    """
+    Turn a captured benchmark into index proposals, heaviest first
+
+    A statement contributes a proposal for a table when its plan scans that
+    table, sorts, or constrains fewer index columns than it filters on.
+    Equality columns lead, followed by one range or ORDER BY column; a low-
+    cardinality column bound to the same value every time becomes the WHERE of
+    a partial index instead.
+
+    Returns:
+        list of IndexProposal
+    """
+    proposals = OrderedDict()
+    with app.app_context():
+        engine = db.engine
+        existing = _existing_indexes(engine)
+        with engine.connect() as connection:
+            for key, sample in log.samples.items():
+                count = log.counts[key]
+                if count < min_count or not sample.statement.lstrip().upper().startswith(EXPLAINABLE):
+                    continue
+                try:
+                    full_scans, sorts, used = explain(connection, sample.statement, sample.parameters)
+                except Exception:
+                    continue
+
+                for table, shape in analyse_statement(sample.statement).items():
+                    columns = list(shape['eq'])
+                    tail = shape['range'][:1] or [c for c in shape['order'] if c not in columns][:1]
+                    needed = len(columns) + len(tail)
+                    if needed == 0:
+                        continue
+                    if table not in full_scans and not sorts and used.get(table, 0) >= needed:
+                        continue
+
+                    constant = _constant_columns(log, key, sample.statement, table, shape['eq'])
+                    where = None
+                    keyed = [c for c in columns if c not in constant]
+                    if constant and keyed + tail:
+                        where = ' AND '.join(f'{c} = {_sql_literal(v, engine.dialect)}'
+                                          for c, v in sorted(constant.items()))
+                        columns = keyed
+                    columns = columns + [c for c in tail if c not in columns]
+
+                    if len(columns) < 2 and where is None:
+                        continue  # single-column indexes already exist on the model
+                    if where is None and _covered(existing, table, columns):
+                        continue
+
+                    slot = (table, tuple(columns), where)
+                    weight, evidence = proposals.get(slot, (0, []))
+                    proposals[slot] = (weight + count, evidence + [sample.statement])
+
+    return sorted(
+        (IndexProposal(table, list(columns), where, weight, evidence)
+         for (table, columns, where), (weight, evidence) in proposals.items()),
+        key=lambda proposal: -proposal.weight
+    )
+
+
+# ==================== MIGRATION ====================
+
+def index_name(proposal):
+    name = f"ix_{proposal.table}_{'_'.join(proposal.columns)}"
+    if proposal.where:
+        name += '_' + '_'.join(re.findall(r"(\w+) = '?(\w+)'?", proposal.where)[0])
+    return name[:63]
+
+
+def render_operations(proposals):
+    """Alembic upgrade/downgrade bodies creating and dropping the proposed indexes"""
+    upgrades, downgrades = [], []
+    for proposal in proposals:
+        name = index_name(proposal)
+        options = ''
+        if proposal.where:
+            where = proposal.where.replace('"', '\\"')
+            options = f', postgresql_where=sa.text("{where}"), sqlite_where=sa.text("{where}")'
+        upgrades.append(f"op.create_index('{name}', '{proposal.table}', {proposal.columns!r}, unique=False{options})")
+        downgrades.append(f"op.drop_index('{name}', table_name='{proposal.table}')")
+    return '\n    '.join(upgrades), '\n    '.join(reversed(downgrades))
+
+
+def write_migration(app, proposals, message='add composite indexes from index advisor', directory=None):
+    """
+    Create an Alembic revision in the Flask-Migrate migrations directory
+
+    Run `flask db init` once first if the project has no migrations directory yet.
+
+    Args:
+        app: Flask application with Flask-Migrate initialised
+        proposals: IndexProposal list to create
+        message: Revision message
+        directory: Migrations directory (defaults to Flask-Migrate's)
+
+    Returns:
+        str: Path of the new revision file
+    """
+    from alembic.script import ScriptDirectory
+
+    upgrades, downgrades = render_operations(proposals)
+    with app.app_context():
+        config = app.extensions['migrate'].migrate.get_config(directory)
+        script = ScriptDirectory.from_config(config)
+        revision = script.generate_revision(
+            uuid.uuid4().hex[:12], message, head='head',
+            upgrades=upgrades, downgrades=downgrades
+        )
+    return revision.path
+
+
+def print_report(proposals):
+    if not proposals:
+        print("✅ No missing composite indexes found for this benchmark")
+        return
+    print(f"📋 {len(proposals)} index proposal(s), heaviest first:\n")
+    for proposal in proposals:
+        partial = f" WHERE {proposal.where}" if proposal.where else ''
+        print(f"  {index_name(proposal)}")
+        print(f"    ON {proposal.table} ({', '.join(proposal.columns)}){partial}")
+        print(f"    executions: {proposal.weight}, statements: {len(proposal.evidence)}")
+        print(f"    e.g. {' '.join(proposal.evidence[0].split())[:160]}\n")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Propose composite indexes from a benchmark run')
+    parser.add_argument('--runs', type=int, default=1, help='times to replay the benchmark')
+    parser.add_argument('--min-count', type=int, default=1, help='ignore statements seen fewer times')
+    parser.add_argument('--write-migration', action='store_true', help='write an Alembic revision')
+    args = parser.parse_args()
+
+    from app_new import app
+
+    log = run_benchmark(app, runs=args.runs)
+    print(f"🔎 Captured {sum(log.counts.values())} statements, {len(log.samples)} distinct\n")
+    proposals = propose_indexes(app, log, min_count=args.min_count)
+    print_report(proposals)
+
+    if args.write_migration and proposals:
+        from alembic.util import CommandError
+        try:
+            path = write_migration(app, proposals)
+            print(f"✅ Migration written: {path}")
+        except CommandError as e:
+            print(f"❌ {e} (run `flask db init` first)")
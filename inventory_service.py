@@ -0,0 +1,180 @@
+"""
+Inventory Service Module
+Copy-level stock: barcoded BookCopy records behind the Book.available_copies counter
+"""
+
+from datetime import datetime
+
+from sqlalchemy import select, update, exists, or_, func
+
+from models import db, Book, BookCopy, Borrowing, Reservation
+from shared_cache_service import invalidate_tags_on_commit
+
+
+CIRCULATING_STATUSES = ('available', 'on_loan', 'on_hold')
+MAX_CLAIM_ATTEMPTS = 5
+
+
+def make_barcode(book_id, sequence):
+    """Barcode for the `sequence`-th copy of a book"""
+    return f'BK{book_id:06d}-{sequence:03d}'
+
+
+def add_copies(book, count, status='available', shelf_location=None, branch=None):
+    """
+    Register `count` new copies of a book and bump its counters (caller commits)
+
+    Args:
+        book: Book the copies belong to (must have an id)
+        count: Number of copies to create
+        status: Initial copy status
+        shelf_location: Defaults to the book's shelf location
+        branch: Holding branch
+
+    Returns:
+        list: The new BookCopy records
+    """
+    last = db.session.query(func.count(BookCopy.id)).filter(BookCopy.book_id == book.id).scalar()
+    copies = [BookCopy(
+        book_id=book.id,
+        barcode=make_barcode(book.id, last + i + 1),
+        shelf_location=shelf_location or book.shelf_location,
+        branch=branch,
+        status=status
+    ) for i in range(count)]
+    db.session.add_all(copies)
+
+    book.total_copies = (book.total_copies or 0) + count
+    if status == 'available':
+        book.available_copies = (book.available_copies or 0) + count
+    return copies
+
+
+def ensure_copies(book):
+    """
+    Materialize copy records for a book that only has counters (caller commits)
+
+    Active loans get an on-loan copy each, held reservations an on-hold copy,
+    and available_copies decides how many are on the shelf.
+
+    Returns:
+        int: Number of copies created (0 if the book already had copies)
+    """
+    if book.copies.first() is not None:
+        return 0
+
+    loans = Borrowing.query.filter_by(book_id=book.id, status='borrowed', copy_id=None).all()
+    holds = Reservation.query.filter_by(book_id=book.id, status='pending', notified=True).count()
+    shelf = max(book.available_copies or 0, 0)
+
+    book.total_copies = 0
+    book.available_copies = 0
+    for loan, copy in zip(loans, add_copies(book, len(loans), status='on_loan')):
+        loan.copy = copy
+    add_copies(book, holds, status='on_hold')
+    add_copies(book, shelf)
+    return len(loans) + holds + shelf
+
+
+def backfill_copies():
+    """Create copy records for every book that has none yet; returns copies created"""
+    created = 0
+    for book in Book.query.filter(~Book.copies.any()):
+        created += ensure_copies(book)
+    return created
+
+
+def set_total_copies(book, new_total):
+    """
+    Add or withdraw shelf copies so the book circulates `new_total` copies (caller commits)
+
+    Returns:
+        bool: False if there are not enough copies on the shelf to withdraw
+    """
+    ensure_copies(book)
+    db.session.flush()
+    diff = new_total - book.total_copies
+    if diff > 0:
+        add_copies(book, diff)
+    elif diff < 0:
+        shelf = BookCopy.query.filter_by(book_id=book.id, status='available')\
+            .order_by(BookCopy.id.desc()).limit(-diff).all()
+        if len(shelf) < -diff:
+            return False
+        for copy in shelf:
+            copy.status = 'withdrawn'
+        book.total_copies -= len(shelf)
+        book.available_copies -= len(shelf)
+    return True
+
+
+def check_out_copy(borrowing, from_hold=False):
+    """
+    Assign a copy of the borrowed book to a loan
+
+    Takes a shelf copy, or the copy set aside for the patron's hold when
+    `from_hold` is true. Books without copy records are left counter-only.
+
+    Returns:
+        BookCopy or None
+    """
+    source = 'on_hold' if from_hold else 'available'
+    for _ in range(MAX_CLAIM_ATTEMPTS):
+        copy_id = db.session.query(BookCopy.id).filter(
+            BookCopy.book_id == borrowing.book_id,
+            BookCopy.status == source
+        ).order_by(BookCopy.id).limit(1).scalar()
+        if copy_id is None:
+            return None
+
+        # Conditional update: a concurrent loan may have taken the same copy
+        claimed = db.session.execute(
+            update(BookCopy)
+            .where(BookCopy.id == copy_id, BookCopy.status == source)
+            .values(status='on_loan')
+            .execution_options(synchronize_session='fetch')
+        ).rowcount
+        if claimed:
+            borrowing.copy_id = copy_id
+            return db.session.get(BookCopy, copy_id)
+    return None
+
+
+def held_copy(book_id):
+    """A copy of the book currently set aside for a reservation, if any"""
+    return BookCopy.query.filter_by(book_id=book_id, status='on_hold').first()
+
+
+def reconcile_available_copies():
+    """
+    Rebuild books.total_copies and available_copies from copy state in one statement
+
+    Books without copy records are left alone.
+
+    Returns:
+        int: Number of books corrected
+    """
+    books = Book.__table__
+    available = select(func.count(BookCopy.id)).where(
+        BookCopy.book_id == books.c.id,
+        BookCopy.status == 'available'
+    ).scalar_subquery()
+    circulating = select(func.count(BookCopy.id)).where(
+        BookCopy.book_id == books.c.id,
+        BookCopy.status.in_(CIRCULATING_STATUSES)
+    ).scalar_subquery()
+
+    result = db.session.execute(
+        books.update()
+        .where(
+            exists().where(BookCopy.book_id == books.c.id),
+            or_(books.c.available_copies != available, books.c.total_copies != circulating)
+        )
+        .values(available_copies=available, total_copies=circulating,
+                version_id=books.c.version_id + 1,
+                # Fragment caches, ETags and the change feed all key on updated_at
+                updated_at=datetime.utcnow())
+    )
+    if result.rowcount:
+        invalidate_tags_on_commit('catalog')
+    return result.rowcount
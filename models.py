@@ -3,9 +3,11 @@ Database Models for Library Management System
 Using SQLAlchemy ORM with relationships
 """
 
+import uuid
 from datetime import datetime, timedelta
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import event, inspect
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
@@ -33,6 +35,7 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     last_login = db.Column(db.DateTime)
+    unread_notifications = db.Column(db.Integer, default=0, nullable=False)  # Denormalized, see Notification events
     
     # Relationships
     borrowings = db.relationship('Borrowing', backref='user', lazy='dynamic')
@@ -52,15 +55,15 @@ class User(UserMixin, db.Model):
     def get_active_borrowings(self):
         return self.borrowings.filter_by(status='borrowed').all()
     
+    def get_patron_status(self):
+        from patron_service import get_patron_status
+        return get_patron_status(self.id)
+    
     def get_total_fine(self):
-        total = 0
-        for borrowing in self.get_active_borrowings():
-            if borrowing.is_overdue():
-                total += borrowing.calculate_fine()
-        return total
+        return self.get_patron_status().outstanding_fine
     
     def can_borrow(self):
-        return len(self.get_active_borrowings()) < 5 and self.get_total_fine() == 0
+        return self.get_patron_status().can_borrow
     
     def __repr__(self):
         return f'<User {self.user_id}>'
@@ -69,6 +72,10 @@ class User(UserMixin, db.Model):
 class Book(db.Model):
     """Book model with comprehensive details"""
     __tablename__ = 'books'
+    __table_args__ = (
+        # Keyset order of the /api/books/changes feed
+        db.Index('ix_books_updated_at_id', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     isbn = db.Column(db.String(20), unique=True, nullable=False, index=True)
@@ -89,9 +96,17 @@ class Book(db.Model):
     added_date = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    version_id = db.Column(db.Integer, nullable=False, default=1)
+    
+    # Leaderboards: all-time loans, and loans decayed by popularity_service
+    borrow_count = db.Column(db.Integer, nullable=False, default=0, index=True)
+    trending_score = db.Column(db.Float, nullable=False, default=0, index=True)
+    
+    __mapper_args__ = {'version_id_col': version_id}
     
     # Relationships
     borrowings = db.relationship('Borrowing', backref='book', lazy='dynamic')
+    copies = db.relationship('BookCopy', backref='book', lazy='dynamic', cascade='all, delete-orphan')
     reservations = db.relationship('Reservation', backref='book', lazy='dynamic')
     reviews = db.relationship('Review', backref='book', lazy='dynamic')
     
@@ -111,13 +126,70 @@ class Book(db.Model):
         return f'<Book {self.title}>'
 
 
+class BookCopy(db.Model):
+    """Physical copy of a book, identified by its barcode"""
+    __tablename__ = 'book_copies'
+    __table_args__ = (
+        # Partial index: only shelf copies are searched when lending
+        db.Index('ix_book_copies_available', 'book_id',
+                 sqlite_where=db.text("status = 'available'"),
+                 postgresql_where=db.text("status = 'available'")),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False, index=True)
+    barcode = db.Column(db.String(30), unique=True, nullable=False, index=True)
+    shelf_location = db.Column(db.String(20))
+    branch = db.Column(db.String(50))
+    condition = db.Column(db.String(20), default='good')  # new, good, fair, damaged
+    status = db.Column(db.String(20), default='available')  # available, on_loan, on_hold, lost, withdrawn
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    borrowings = db.relationship('Borrowing', backref='copy', lazy='dynamic')
+    
+    def __repr__(self):
+        return f'<BookCopy {self.barcode}>'
+
+
+class DeletedBook(db.Model):
+    """Tombstone left by a hard-deleted book so catalog replicas can drop it"""
+    __tablename__ = 'deleted_books'
+    __table_args__ = (
+        db.Index('ix_deleted_books_deleted_at_book_id', 'deleted_at', 'book_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, nullable=False)
+    isbn = db.Column(db.String(20))
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<DeletedBook {self.book_id}>'
+
+
+@event.listens_for(Book, 'after_delete')
+def _book_deleted(mapper, connection, target):
+    connection.execute(DeletedBook.__table__.insert().values(
+        book_id=target.id, isbn=target.isbn, deleted_at=datetime.utcnow()
+    ))
+
+
 class Borrowing(db.Model):
     """Borrowing records with fine calculation"""
     __tablename__ = 'borrowings'
+    __table_args__ = (
+        db.Index('ix_borrowings_user_id_status', 'user_id', 'status'),
+        db.Index('ix_borrowings_book_id_status', 'book_id', 'status'),
+        db.Index('ix_borrowings_status_due_date', 'status', 'due_date'),
+        # Archived loans keep their ids in borrowing_history; never hand them out again
+        {'sqlite_autoincrement': True},
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
+    copy_id = db.Column(db.Integer, db.ForeignKey('book_copies.id'), index=True)
     borrow_date = db.Column(db.DateTime, default=datetime.utcnow)
     due_date = db.Column(db.DateTime, nullable=False)
     return_date = db.Column(db.DateTime)
@@ -127,6 +199,9 @@ class Borrowing(db.Model):
     status = db.Column(db.String(20), default='borrowed')  # borrowed, returned, lost
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    version_id = db.Column(db.Integer, nullable=False, default=1)
+    
+    __mapper_args__ = {'version_id_col': version_id}
     
     def is_overdue(self):
         if self.status == 'borrowed':
@@ -138,11 +213,13 @@ class Borrowing(db.Model):
             return (datetime.utcnow() - self.due_date).days
         return 0
     
-    def calculate_fine(self, fine_per_day=5):
+    def calculate_fine(self, fine_per_day):
+        """Fine accrued so far at `fine_per_day` (see settings_service.fine_per_day)"""
         return self.days_overdue() * fine_per_day
     
     def can_renew(self):
-        return self.status == 'borrowed' and self.renewed_count < 2 and not self.is_overdue()
+        from settings_service import max_renewals
+        return self.status == 'borrowed' and self.renewed_count < max_renewals() and not self.is_overdue()
     
     def renew(self, days=14):
         if self.can_renew():
@@ -155,9 +232,103 @@ class Borrowing(db.Model):
         return f'<Borrowing {self.id}>'
 
 
+# Every new loan counts towards the book's leaderboards. updated_at is kept
+# as is: the counters are not part of any cached book payload.
+@event.listens_for(Borrowing, 'after_insert')
+def _borrowing_inserted(mapper, connection, target):
+    books = Book.__table__
+    connection.execute(
+        books.update()
+        .where(books.c.id == target.book_id)
+        .values(borrow_count=books.c.borrow_count + 1,
+                trending_score=books.c.trending_score + 1,
+                updated_at=books.c.updated_at)
+    )
+
+
+class BorrowingHistory(db.Model):
+    """Settled loans moved out of the hot borrowings table; ids are kept"""
+    __tablename__ = 'borrowing_history'
+    __table_args__ = (
+        db.Index('ix_borrowing_history_user_id_borrow_date', 'user_id', 'borrow_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False, index=True)
+    copy_id = db.Column(db.Integer)
+    borrow_date = db.Column(db.DateTime)
+    due_date = db.Column(db.DateTime, nullable=False)
+    return_date = db.Column(db.DateTime)
+    renewed_count = db.Column(db.Integer, default=0)
+    fine_amount = db.Column(db.Float, default=0)
+    fine_paid = db.Column(db.Boolean, default=False)
+    status = db.Column(db.String(20))  # returned, cancelled
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    book = db.relationship('Book')
+    user = db.relationship('User')
+    
+    # Same read interface as Borrowing for history views
+    def is_overdue(self):
+        return False
+    
+    def days_overdue(self):
+        return 0
+    
+    def can_renew(self):
+        return False
+    
+    def calculate_fine(self, fine_per_day=None):
+        return self.fine_amount or 0
+    
+    def __repr__(self):
+        return f'<BorrowingHistory {self.id}>'
+
+
+class FineLedger(db.Model):
+    """Append-only record of fine accruals, payments and waivers"""
+    __tablename__ = 'fine_ledger'
+    __table_args__ = (
+        db.Index('ix_fine_ledger_user_id_created_at', 'user_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # Not a foreign key: the loan may have moved to borrowing_history
+    borrowing_id = db.Column(db.Integer, nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    entry_type = db.Column(db.String(20), nullable=False)  # accrual, payment, waiver
+    amount = db.Column(db.Float, nullable=False)  # always positive; entry_type gives the direction
+    payment_method = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    borrowing = db.relationship('Borrowing', primaryjoin='foreign(FineLedger.borrowing_id) == Borrowing.id',
+                                backref=db.backref('fine_entries', lazy='dynamic'))
+    archived_borrowing = db.relationship('BorrowingHistory', viewonly=True,
+                                         primaryjoin='foreign(FineLedger.borrowing_id) == BorrowingHistory.id')
+    
+    @property
+    def loan(self):
+        """The loan this entry belongs to, live or archived"""
+        return self.borrowing or self.archived_borrowing
+    
+    @property
+    def paid_date(self):
+        return self.created_at if self.entry_type == 'payment' else None
+    
+    def __repr__(self):
+        return f'<FineLedger {self.entry_type} {self.amount}>'
+
+
 class Reservation(db.Model):
     """Book reservation queue"""
     __tablename__ = 'reservations'
+    __table_args__ = (
+        db.Index('ix_reservations_book_id_status_created_at', 'book_id', 'status', 'created_at'),
+        db.Index('ix_reservations_user_id_status', 'user_id', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -166,6 +337,9 @@ class Reservation(db.Model):
     expiry_date = db.Column(db.DateTime)
     status = db.Column(db.String(20), default='pending')  # pending, fulfilled, cancelled, expired
     notified = db.Column(db.Boolean, default=False)
+    version_id = db.Column(db.Integer, nullable=False, default=1)
+    
+    __mapper_args__ = {'version_id_col': version_id}
     
     def is_expired(self):
         if self.expiry_date:
@@ -196,6 +370,9 @@ class Review(db.Model):
 class Notification(db.Model):
     """User notifications"""
     __tablename__ = 'notifications'
+    __table_args__ = (
+        db.Index('ix_notifications_user_id_is_read_created_at', 'user_id', 'is_read', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -211,6 +388,37 @@ class Notification(db.Model):
         return f'<Notification {self.id}>'
 
 
+# Keep User.unread_notifications in step with ORM-level notification changes.
+# Bulk Query.update()/delete() bypass these events; callers reset the counter
+# themselves and reconcile_notification_counters.py corrects any drift.
+
+def _adjust_unread_notifications(connection, user_id, delta):
+    users = User.__table__
+    connection.execute(
+        users.update()
+        .where(users.c.id == user_id)
+        .values(unread_notifications=users.c.unread_notifications + delta)
+    )
+
+
+@event.listens_for(Notification, 'after_insert')
+def _notification_inserted(mapper, connection, target):
+    if not target.is_read:
+        _adjust_unread_notifications(connection, target.user_id, 1)
+
+
+@event.listens_for(Notification, 'after_update')
+def _notification_updated(mapper, connection, target):
+    if inspect(target).attrs.is_read.history.has_changes():
+        _adjust_unread_notifications(connection, target.user_id, -1 if target.is_read else 1)
+
+
+@event.listens_for(Notification, 'after_delete')
+def _notification_deleted(mapper, connection, target):
+    if not target.is_read:
+        _adjust_unread_notifications(connection, target.user_id, -1)
+
+
 class Category(db.Model):
     """Book categories"""
     __tablename__ = 'categories'
@@ -268,6 +476,9 @@ class Setting(db.Model):
     description = db.Column(db.Text)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Rewritten on every save so each worker's settings snapshot knows to reload
+    VERSION_KEY = 'settings_version'
+    
     @staticmethod
     def get(key, default=None):
         setting = Setting.query.filter_by(key=key).first()
@@ -275,12 +486,28 @@ class Setting(db.Model):
     
     @staticmethod
     def set(key, value, description=None):
-        setting = Setting.query.filter_by(key=key).first()
-        if setting:
-            setting.value = value
-        else:
-            setting = Setting(key=key, value=value, description=description)
-            db.session.add(setting)
+        Setting.set_many({key: value}, {key: description} if description else None)
+    
+    @staticmethod
+    def set_many(values, descriptions=None):
+        """
+        Upsert several settings and move the settings version in one transaction
+        
+        Args:
+            values: Mapping of key -> value
+            descriptions: Optional mapping of key -> description for new keys
+        """
+        descriptions = descriptions or {}
+        keys = list(values) + [Setting.VERSION_KEY]
+        existing = {setting.key: setting for setting in Setting.query.filter(Setting.key.in_(keys))}
+        
+        values = dict(values)
+        values.setdefault(Setting.VERSION_KEY, uuid.uuid4().hex)
+        for key, value in values.items():
+            if key in existing:
+                existing[key].value = value
+            else:
+                db.session.add(Setting(key=key, value=value, description=descriptions.get(key)))
         db.session.commit()
     
     def __repr__(self):
@@ -339,6 +566,20 @@ class Subscription(db.Model):
         return f'<Subscription {self.id}>'
 
 
+class UserRecommendation(db.Model):
+    """Ranked reading suggestions per user, rebuilt by compute_recommendations.py"""
+    __tablename__ = 'user_recommendations'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    rank = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<UserRecommendation {self.user_id}#{self.rank}>'
+
+
 class DigitalBook(db.Model):
     """Digital books with file storage"""
     __tablename__ = 'digital_books'
@@ -452,10 +693,14 @@ class Announcement(db.Model):
 class TransactionVerification(db.Model):
     """Verification codes for book transactions"""
     __tablename__ = 'transaction_verifications'
+    __table_args__ = (
+        db.Index('ix_transaction_verifications_user_id_code', 'user_id', 'verification_code'),
+        db.Index('ix_transaction_verifications_user_id_is_verified', 'user_id', 'is_verified', 'verified_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    borrowing_id = db.Column(db.Integer, db.ForeignKey('borrowings.id'))
+    borrowing_id = db.Column(db.Integer)  # live or archived loan, see FineLedger
     transaction_type = db.Column(db.String(20), nullable=False)  # borrow, renew, return
     verification_code = db.Column(db.String(10), nullable=False)
     is_verified = db.Column(db.Boolean, default=False)
@@ -464,7 +709,15 @@ class TransactionVerification(db.Model):
     verified_at = db.Column(db.DateTime)
     
     user = db.relationship('User', backref='transaction_verifications')
-    borrowing = db.relationship('Borrowing', backref='verifications')
+    borrowing = db.relationship('Borrowing', primaryjoin='foreign(TransactionVerification.borrowing_id) == Borrowing.id',
+                                backref='verifications')
+    archived_borrowing = db.relationship('BorrowingHistory', viewonly=True,
+                                         primaryjoin='foreign(TransactionVerification.borrowing_id) == BorrowingHistory.id')
+    
+    @property
+    def loan(self):
+        """The verified loan, live or archived"""
+        return self.borrowing or self.archived_borrowing
     
     def is_expired(self):
         return datetime.utcnow() > self.expires_at
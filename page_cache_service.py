@@ -0,0 +1,106 @@
+"""
+Page Cache Service Module
+Whole-page caching of public pages for anonymous visitors, keyed by a content
+version, and cached book-card fragments shared by the catalog templates
+"""
+
+from functools import wraps
+
+from flask import current_app, request, session, make_response
+from flask_login import current_user
+from markupsafe import Markup
+
+from cache_service import TTLCache
+from http_cache_service import catalog_version, lookup_version
+from shared_cache_service import shared_cache, cached
+
+
+BOOK_CARD_TEMPLATE = 'components/book_card.html'
+
+
+# ==================== BOOK CARD FRAGMENTS ====================
+
+def book_card(book, variant):
+    """
+    Rendered markup of one book card, cached by (variant, id, updated_at)
+
+    The fragment is rendered without the request's template context, so it
+    cannot pick up anything user-specific. Any write to the book row moves
+    updated_at and makes old fragments unreachable.
+
+    Args:
+        book: Book row or snapshot (updated_at must be loaded)
+        variant: Card layout in components/book_card.html
+
+    Returns:
+        Markup
+    """
+    cache = current_app.extensions['book_card_cache']
+    key = (variant, book.id, book.updated_at)
+    html = cache.get(key)
+    if html is None:
+        html = current_app.jinja_env.get_template(BOOK_CARD_TEMPLATE).render(book=book, variant=variant)
+        cache.set(key, html)
+    return Markup(html)
+
+
+# ==================== ANONYMOUS PAGES ====================
+
+def catalog_page_version():
+    """
+    Public catalog pages change with books (incl. availability) and lookup data
+
+    The catalog validator is itself kept in the shared cache until a catalog
+    write, so a warm anonymous hit runs no SQL at all.
+    """
+    catalog = cached('catalog.version', lambda: catalog_version()[0], tags=('catalog',))
+    return f'{catalog}-{lookup_version()[0]}'
+
+
+def _cacheable_request():
+    # Pending flash messages would be baked into the page and shown to everyone
+    return (request.method == 'GET' and not current_user.is_authenticated
+            and '_flashes' not in session)
+
+
+def anonymous_page(version, ttl=None):
+    """
+    Serve a GET view from the shared cache to anonymous visitors
+
+    Pages are keyed by path, query string and `version()`, so a changed
+    version simply stops matching old entries; they expire after `ttl`
+    seconds (PAGE_CACHE_TTL by default). Logged-in users always get a
+    freshly rendered page.
+
+    Args:
+        version: Callable returning a string that changes with the content
+
+    Returns:
+        Decorator
+    """
+    def decorator(view):
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            if not _cacheable_request():
+                return view(*args, **kwargs)
+
+            key = f'page:{request.full_path}:{version()}'
+            found, body = shared_cache().get(key)
+            if found:
+                return current_app.response_class(body, mimetype='text/html')
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                shared_cache().set(key, response.get_data(),
+                                   ttl or current_app.config.get('PAGE_CACHE_TTL', 300))
+            return response
+        return decorated_function
+    return decorator
+
+
+def init_app(app):
+    """Attach the fragment cache and expose book_card() to templates"""
+    app.extensions['book_card_cache'] = TTLCache(
+        ttl=app.config.get('BOOK_CARD_CACHE_TTL', 3600)
+    )
+    app.jinja_env.globals['book_card'] = book_card
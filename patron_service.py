@@ -0,0 +1,93 @@
+"""
+Patron Service Module
+Borrowing eligibility computed in the database with a single aggregate query.
+Fines are read from Borrowing.fine_amount, kept current by fine_service.accrue_fines,
+less what the fine ledger shows as paid
+"""
+
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import select, func, case, literal, and_
+
+from models import db, Borrowing, Subscription, SubscriptionPlan
+from fine_service import unpaid_fine
+from settings_service import max_books_per_user
+
+
+class PatronStatus(namedtuple('PatronStatus', [
+    'active_loans', 'overdue_loans', 'outstanding_fine', 'borrow_limit', 'no_late_fees',
+    'settled_overdue_loans'
+])):
+    """Snapshot of a patron's circulation standing"""
+    __slots__ = ()
+
+    @property
+    def has_fines(self):
+        # A paid loan that is still overdue accrues again at the next run
+        return self.outstanding_fine > 0 or (self.settled_overdue_loans > 0 and not self.no_late_fees)
+
+    @property
+    def at_limit(self):
+        return self.active_loans >= self.borrow_limit
+
+    @property
+    def can_borrow(self):
+        return not self.at_limit and not self.has_fines
+
+
+def _active_plan_column(column, user_id, now):
+    """Scalar subquery picking `column` from the user's current subscription plan"""
+    return select(column)\
+        .join(Subscription, Subscription.plan_id == SubscriptionPlan.id)\
+        .where(
+            Subscription.user_id == user_id,
+            Subscription.status == 'active',
+            Subscription.end_date >= now
+        )\
+        .order_by(Subscription.end_date.desc())\
+        .limit(1)\
+        .scalar_subquery()
+
+
+def get_patron_status(user_id, now=None):
+    """
+    Active loans, overdue loans, outstanding fine and plan limits in one query
+
+    Args:
+        user_id: User primary key
+        now: Reference time (defaults to utcnow)
+
+    Returns:
+        PatronStatus
+    """
+    now = now or datetime.utcnow()
+    now_param = literal(now, db.DateTime)
+    default_limit = max_books_per_user()
+
+    is_overdue = Borrowing.due_date < now_param
+    stmt = select(
+        func.count(Borrowing.id),
+        func.coalesce(func.sum(case((is_overdue, 1), else_=0)), 0),
+        func.coalesce(func.sum(case(
+            (Borrowing.fine_paid == False, unpaid_fine()), else_=0
+        )), 0),
+        _active_plan_column(SubscriptionPlan.max_books, user_id, now_param),
+        _active_plan_column(SubscriptionPlan.no_late_fees, user_id, now_param),
+        func.coalesce(func.sum(case((and_(is_overdue, Borrowing.fine_paid == True), 1), else_=0)), 0),
+    ).where(
+        Borrowing.user_id == user_id,
+        Borrowing.status == 'borrowed'
+    )
+
+    active, overdue, fines, max_books, no_late_fees, settled_overdue = db.session.execute(stmt).one()
+    no_late_fees = bool(no_late_fees)
+
+    return PatronStatus(
+        active_loans=active,
+        overdue_loans=overdue,
+        outstanding_fine=0 if no_late_fees else fines,
+        borrow_limit=max_books or default_limit,
+        no_late_fees=no_late_fees,
+        settled_overdue_loans=settled_overdue
+    )
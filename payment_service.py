@@ -118,18 +118,25 @@ class PaymentGateway:
         except razorpay.errors.SignatureVerificationError:
             return False
     
-    def update_payment_status(self, transaction_id, status, gateway_response=None):
-        """Update payment status in database"""
-        payment = Payment.query.filter_by(transaction_id=transaction_id).first()
-        if payment:
-            payment.status = status
-            if gateway_response:
-                payment.gateway_response = json.dumps(gateway_response)
-            if status == 'success':
-                payment.sent_at = datetime.utcnow()
-            db.session.commit()
-            return True
-        return False
+    def update_payment_status(self, transaction_id, status, gateway_response=None, from_status=None):
+        """
+        Update payment status in database
+        
+        With `from_status` the update only applies while the payment is still in
+        that status, so exactly one concurrent caller wins the transition.
+        """
+        values = {'status': status}
+        if gateway_response:
+            values['gateway_response'] = json.dumps(gateway_response)
+        if status == 'success':
+            values['sent_at'] = datetime.utcnow()
+        
+        query = Payment.query.filter_by(transaction_id=transaction_id)
+        if from_status is not None:
+            query = query.filter_by(status=from_status)
+        updated = query.update(values, synchronize_session='fetch')
+        db.session.commit()
+        return updated > 0
     
     def get_payment(self, transaction_id):
         """Get payment details"""
@@ -353,19 +360,28 @@ def verify_and_complete_payment(transaction_id, razorpay_order_id, razorpay_paym
     is_valid = gateway.verify_payment(razorpay_order_id, razorpay_payment_id, razorpay_signature)
     
     if is_valid:
-        # Update payment status
-        gateway.update_payment_status(
+        # Update payment status; only the first verification fulfils the payment
+        claimed = gateway.update_payment_status(
             transaction_id,
             'success',
             {
                 'razorpay_order_id': razorpay_order_id,
                 'razorpay_payment_id': razorpay_payment_id
-            }
+            },
+            from_status='pending'
         )
         
         # Get payment details
         payment = gateway.get_payment(transaction_id)
         
+        # A retried verification replays the result without repeating the work
+        if not claimed:
+            return {
+                'success': payment is not None and payment.status == 'success',
+                'message': 'Payment already verified' if payment else 'Payment not found',
+                'payment': payment
+            }
+        
         # Process based on purpose
         if payment.purpose == 'subscription':
             from models import User, Subscription, SubscriptionPlan
@@ -403,8 +419,8 @@ def verify_and_complete_payment(transaction_id, razorpay_order_id, razorpay_paym
             borrowing_id = int(payment.reference_id.split('_')[1])
             borrowing = Borrowing.query.get(borrowing_id)
             if borrowing:
-                borrowing.fine_paid = True
-                borrowing.fine_amount = payment.amount
+                from fine_service import record_fine_payment
+                record_fine_payment(borrowing, payment.amount, payment.payment_method)
                 db.session.commit()
         
         # Send payment receipt
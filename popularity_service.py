@@ -0,0 +1,75 @@
+"""
+Popularity Service Module
+Maintained book leaderboards: an all-time borrow counter and a trending score
+that every loan bumps by one and a periodic batch decays exponentially, so
+top-K lists are index scans instead of Borrowing GROUP BY scans
+"""
+
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import case
+
+from models import db, Book, Setting
+from shared_cache_service import invalidate_tags
+
+
+DECAYED_AT_KEY = 'trending_decayed_at'
+
+# Scores below this are rounded to zero so idle books drop off the index
+TRENDING_FLOOR = 0.01
+
+
+def top_borrowed(limit=10):
+    """Active books with the most loans of all time"""
+    return Book.query.filter(Book.is_active == True, Book.borrow_count > 0)\
+        .order_by(Book.borrow_count.desc(), Book.id).limit(limit).all()
+
+
+def trending(limit=10):
+    """Active books borrowed most in recent weeks, weighted towards recent loans"""
+    return Book.query.filter(Book.is_active == True, Book.trending_score > 0)\
+        .order_by(Book.trending_score.desc(), Book.id).limit(limit).all()
+
+
+def decay_factor(elapsed_seconds, half_life_days=None):
+    """Multiplier applied to trending scores after `elapsed_seconds`"""
+    if half_life_days is None:
+        half_life_days = current_app.config.get('TRENDING_HALF_LIFE_DAYS', 7)
+    return 0.5 ** (elapsed_seconds / (half_life_days * 86400))
+
+
+def decay_trending_scores(now=None):
+    """
+    Decay every trending score for the time since the previous run (commits)
+
+    One set-based UPDATE scales all non-zero scores, so the cost does not
+    depend on how many loans there were. Loans since the previous run carry
+    their full weight; running hourly keeps that granularity small.
+
+    Args:
+        now: Reference time (defaults to utcnow)
+
+    Returns:
+        int: Number of books whose score changed
+    """
+    now = now or datetime.utcnow()
+    previous = Setting.get(DECAYED_AT_KEY)
+
+    changed = 0
+    if previous:
+        factor = decay_factor((now - datetime.fromisoformat(previous)).total_seconds())
+        books = Book.__table__
+        decayed = books.c.trending_score * factor
+        changed = db.session.execute(
+            books.update()
+            .where(books.c.trending_score > 0)
+            .values(trending_score=case((decayed < TRENDING_FLOOR, 0), else_=decayed),
+                    updated_at=books.c.updated_at)
+        ).rowcount
+
+    # The first run only records the starting point
+    Setting.set_many({DECAYED_AT_KEY: now.isoformat()})
+    if changed:
+        invalidate_tags('catalog')
+    return changed
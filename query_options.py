@@ -0,0 +1,47 @@
+"""
+Query Options Module
+Reusable loader options for list views, so a page of rows costs a fixed number of queries
+"""
+
+from sqlalchemy.orm import joinedload, selectinload, load_only
+
+from models import Book, User
+
+
+# Columns list views show for a loan's or reservation's book and patron
+BOOK_SUMMARY = (Book.title, Book.author, Book.isbn, Book.cover_image)
+USER_SUMMARY = (User.user_id, User.full_name, User.email)
+
+
+def book_summary(relationship, loader=joinedload):
+    """Eager-load a many-to-one `book` relationship with only the summary columns"""
+    return loader(relationship).options(load_only(*BOOK_SUMMARY))
+
+
+def user_summary(relationship, loader=joinedload):
+    """Eager-load a many-to-one `user` relationship with only the summary columns"""
+    return loader(relationship).options(load_only(*USER_SUMMARY))
+
+
+def loan_list_options(model, with_user=False, loader=joinedload):
+    """
+    Loader options for lists of Borrowing, BorrowingHistory or Reservation rows
+
+    Args:
+        model: Mapped class with `book` and `user` relationships
+        with_user: Also load the patron (admin lists)
+        loader: joinedload for paginated lists, selectinload for full exports,
+                where the same books and patrons repeat across many rows
+
+    Returns:
+        list: Options for Query.options()
+    """
+    options = [book_summary(model.book, loader)]
+    if with_user:
+        options.append(user_summary(model.user, loader))
+    return options
+
+
+def export_options(model):
+    """Loader options for exporting every row of a loan table"""
+    return loan_list_options(model, with_user=True, loader=selectinload)
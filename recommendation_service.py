@@ -0,0 +1,188 @@
+"""
+Recommendation Service Module
+Per-user reading suggestions computed offline with NumPy and SciPy sparse
+matrices from loans, reviews and reading progress, stored ranked in user_recommendations so the dashboard reads
+them with one indexed query
+"""
+
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select, union_all, delete, insert
+
+from models import (db, Book, Borrowing, BorrowingHistory, Review, ReadingProgress,
+                    DigitalBook, User, UserRecommendation)
+
+
+# Interaction weights
+BORROW_WEIGHT = 1.0
+REVIEW_NEUTRAL = 2.5  # ratings above count in favour of a book, below against
+READING_WEIGHT = 0.5  # doubled for a book read to the end
+
+# Blend of the signals in the final score (each signal is scaled to 0..1 per user)
+CO_BORROW_WEIGHT = 0.5
+CATEGORY_WEIGHT = 0.25
+DEPARTMENT_WEIGHT = 0.2
+POPULARITY_WEIGHT = 0.05
+
+
+def recommended_books(user_id):
+    """Stored suggestions for a user, best first"""
+    return Book.query.join(UserRecommendation, UserRecommendation.book_id == Book.id)\
+        .filter(UserRecommendation.user_id == user_id, Book.is_active == True)\
+        .order_by(UserRecommendation.rank).all()
+
+
+def _interactions(np):
+    """(user ids, book ids, weights) arrays for every loan, review and reading session"""
+    loans = db.session.execute(union_all(
+        select(Borrowing.user_id, Borrowing.book_id),
+        select(BorrowingHistory.user_id, BorrowingHistory.book_id)
+    )).all()
+    reviews = db.session.execute(select(Review.user_id, Review.book_id, Review.rating)).all()
+    reading = db.session.execute(
+        select(ReadingProgress.user_id, DigitalBook.book_id, ReadingProgress.percentage)
+        .join(DigitalBook, DigitalBook.id == ReadingProgress.digital_book_id)
+    ).all()
+
+    def columns(rows, width):
+        return np.array(rows, dtype=np.float64).reshape(-1, width).T
+
+    loan_users, loan_books = columns(loans, 2)
+    review_users, review_books, ratings = columns(reviews, 3)
+    reading_users, reading_books, percentages = columns([
+        (user_id, book_id, percentage or 0) for user_id, book_id, percentage in reading
+    ], 3)
+
+    return (
+        np.concatenate([loan_users, review_users, reading_users]).astype(np.int64),
+        np.concatenate([loan_books, review_books, reading_books]).astype(np.int64),
+        np.concatenate([
+            np.full(len(loan_users), BORROW_WEIGHT),
+            (ratings - REVIEW_NEUTRAL) / REVIEW_NEUTRAL,
+            READING_WEIGHT * (1 + np.clip(percentages, 0, 100) / 100),
+        ]).astype(np.float32)
+    )
+
+
+def _positions(np, sorted_ids, ids):
+    """Index of each id in sorted_ids, and a mask of the ids that were found"""
+    positions = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return positions, sorted_ids[positions] == ids
+
+
+def _scale_rows(np, matrix):
+    """Scale each row to a maximum of 1; all-zero rows stay zero"""
+    peak = matrix.max(axis=1, keepdims=True)
+    return np.divide(matrix, peak, out=np.zeros_like(matrix), where=peak > 0)
+
+
+def compute_recommendations(limit=None, chunk_size=500, now=None):
+    """
+    Rebuild user_recommendations for every active user (commits per chunk)
+
+    Each unseen active book is scored per user from:
+      - co-borrowing: how often it was borrowed, reviewed or read by the same
+        people as the user's own books (item-item co-occurrence)
+      - the user's category and department tastes, seeded with their own
+        department
+      - a small all-time popularity prior, so new users still get suggestions
+
+    Interactions and the co-occurrence matrix are SciPy CSR matrices, so
+    memory grows with the number of interactions rather than users x books.
+    Only the dense score block of `chunk_size` users is materialized at a time.
+
+    Args:
+        limit: Suggestions per user (defaults to RECOMMENDATIONS_PER_USER)
+        chunk_size: Users scored and written per transaction
+        now: Timestamp stored with the suggestions (defaults to utcnow)
+
+    Returns:
+        int: Number of users given suggestions
+    """
+    import numpy as np
+    from scipy import sparse
+
+    limit = limit or current_app.config.get('RECOMMENDATIONS_PER_USER', 8)
+    now = now or datetime.utcnow()
+
+    books = db.session.execute(
+        select(Book.id, Book.category, Book.department, Book.borrow_count)
+        .where(Book.is_active == True).order_by(Book.id)
+    ).all()
+    users = db.session.execute(
+        select(User.id, User.department).where(User.is_active == True).order_by(User.id)
+    ).all()
+    if not books or not users:
+        return 0
+
+    book_ids = np.array([book.id for book in books], dtype=np.int64)
+    user_ids = np.array([user.id for user in users], dtype=np.int64)
+    categories, book_category = np.unique([book.category or '' for book in books], return_inverse=True)
+    departments, book_department = np.unique([book.department or '' for book in books], return_inverse=True)
+    popularity = np.log1p(np.array([book.borrow_count or 0 for book in books], dtype=np.float32))
+    popularity /= max(float(popularity.max()), 1.0)
+
+    # Interactions as matrix positions; inactive users and books drop out
+    interaction_users, interaction_books, weights = _interactions(np)
+    rows, user_found = _positions(np, user_ids, interaction_users)
+    cols, book_found = _positions(np, book_ids, interaction_books)
+    keep = user_found & book_found
+    rows, cols, weights = rows[keep], cols[keep], weights[keep]
+
+    # Taste profiles: net interaction weight per category and per department
+    category_taste = np.zeros((len(user_ids), len(categories)), dtype=np.float32)
+    np.add.at(category_taste, (rows, book_category[cols]), weights)
+    department_taste = np.zeros((len(user_ids), len(departments)), dtype=np.float32)
+    np.add.at(department_taste, (rows, book_department[cols]), weights)
+    own, own_found = _positions(np, departments, np.array([user.department or '' for user in users]))
+    department_taste[np.nonzero(own_found)[0], own[own_found]] += BORROW_WEIGHT
+    category_taste = _scale_rows(np, np.clip(category_taste, 0, None))
+    department_taste = _scale_rows(np, np.clip(department_taste, 0, None))
+
+    # User x book interactions (duplicates summed) and the item-item co-occurrence
+    # between liked books
+    history = sparse.csr_matrix((weights, (rows, cols)), shape=(len(user_ids), len(book_ids)))
+    history.sum_duplicates()
+    liked = (history > 0).astype(np.float32)
+    co_occurrence = (liked.T @ liked).tocsr()
+    co_occurrence.setdiag(0)
+    co_occurrence.eliminate_zeros()
+
+    count = min(limit, len(book_ids))
+    stored = 0
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        scores = (CATEGORY_WEIGHT * category_taste[chunk][:, book_category]
+                  + DEPARTMENT_WEIGHT * department_taste[chunk][:, book_department]
+                  + POPULARITY_WEIGHT * popularity)
+        if co_occurrence.nnz:
+            scores += CO_BORROW_WEIGHT * _scale_rows(np, (liked[chunk] @ co_occurrence).toarray())
+        # Never suggest what the user already borrowed, reviewed or read
+        scores[history[chunk].nonzero()] = -np.inf
+
+        top = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        chunk_user_ids = user_ids[chunk]
+        suggestions = [
+            {'user_id': int(user_id), 'rank': rank, 'book_id': int(book_ids[col]),
+             'score': float(score), 'computed_at': now}
+            for user_id, user_cols, user_scores in zip(chunk_user_ids, top, top_scores)
+            for rank, (col, score) in enumerate(
+                [(col, score) for col, score in zip(user_cols, user_scores) if score > 0], start=1
+            )
+        ]
+
+        db.session.execute(delete(UserRecommendation).where(
+            UserRecommendation.user_id.in_(chunk_user_ids.tolist())
+        ))
+        if suggestions:
+            db.session.execute(insert(UserRecommendation), suggestions)
+        db.session.commit()
+        stored += len({suggestion['user_id'] for suggestion in suggestions})
+
+    return stored
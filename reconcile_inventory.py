@@ -0,0 +1,19 @@
+"""
+Reconcile book availability counters with copy-level inventory
+Run this periodically (e.g. nightly via cron) to correct any drift; books that
+only have counters get copy records first
+"""
+
+from models import db
+from inventory_service import backfill_copies, reconcile_available_copies
+
+
+if __name__ == '__main__':
+    from app_new import app
+    
+    with app.app_context():
+        created = backfill_copies()
+        corrected = reconcile_available_copies()
+        db.session.commit()
+        print(f"✅ Copy records created: {created}")
+        print(f"✅ Availability reconciled: {corrected} book(s) corrected")
@@ -0,0 +1,33 @@
+"""
+Reconcile the denormalized unread-notification counters
+Run this periodically (e.g. nightly via cron) to correct any drift
+"""
+
+from sqlalchemy import func
+
+from models import db, User, Notification
+
+
+def reconcile_unread_notifications():
+    """Recompute users.unread_notifications from the notifications table in one statement"""
+    users = User.__table__
+    unread = db.session.query(func.count(Notification.id)).filter(
+        Notification.user_id == users.c.id,
+        Notification.is_read == False
+    ).scalar_subquery()
+    
+    result = db.session.execute(
+        users.update()
+        .where(users.c.unread_notifications != unread)
+        .values(unread_notifications=unread)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+if __name__ == '__main__':
+    from app_new import app
+    
+    with app.app_context():
+        corrected = reconcile_unread_notifications()
+        print(f"✅ Unread notification counters reconciled: {corrected} user(s) corrected")
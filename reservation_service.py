@@ -0,0 +1,170 @@
+"""
+Reservation Service Module
+Per-book reservation queue with priority tiers, copy handoff on return and hold expiry
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, exists, case
+
+from models import db, Book, Reservation, Notification, Subscription, SubscriptionPlan
+from inventory_service import held_copy
+from shared_cache_service import invalidate_tags_on_commit
+
+
+HOLD_DAYS = 3
+MAX_CLAIM_ATTEMPTS = 5
+
+
+def _priority_tier(now):
+    """1 for patrons on an active plan with priority_reservation, else 0"""
+    return case((exists().where(
+        Subscription.user_id == Reservation.user_id,
+        Subscription.status == 'active',
+        Subscription.end_date >= now,
+        SubscriptionPlan.id == Subscription.plan_id,
+        SubscriptionPlan.priority_reservation == True
+    ), 1), else_=0)
+
+
+def waiting_queue(book_id, now=None):
+    """
+    Pending reservations still waiting for a copy, in service order
+
+    Priority members come first; within a tier it is first come, first served.
+
+    Args:
+        book_id: Book primary key
+        now: Reference time (defaults to utcnow)
+
+    Returns:
+        Query of Reservation
+    """
+    now = now or datetime.utcnow()
+    return Reservation.query.filter(
+        Reservation.book_id == book_id,
+        Reservation.status == 'pending',
+        Reservation.notified == False
+    ).order_by(_priority_tier(now).desc(), Reservation.created_at, Reservation.id)
+
+
+def _claim_next(book, now):
+    """Put the next waiting reservation on hold; None if the queue is empty"""
+    for _ in range(MAX_CLAIM_ATTEMPTS):
+        candidate_id = waiting_queue(book.id, now).with_entities(Reservation.id).limit(1).scalar()
+        if candidate_id is None:
+            return None
+
+        # Conditional update: a concurrent return may have claimed the same row
+        claimed = db.session.execute(
+            update(Reservation)
+            .where(
+                Reservation.id == candidate_id,
+                Reservation.status == 'pending',
+                Reservation.notified == False
+            )
+            .values(notified=True, expiry_date=now + timedelta(days=HOLD_DAYS),
+                    version_id=Reservation.version_id + 1)
+            .execution_options(synchronize_session='fetch')
+        ).rowcount
+        if claimed:
+            reservation = db.session.get(Reservation, candidate_id)
+            db.session.add(Notification(
+                user_id=reservation.user_id,
+                title='Book Available!',
+                message=f'The book "{book.title}" is now available for pickup. '
+                        f'It is held for you for {HOLD_DAYS} days.',
+                notification_type='reservation',
+                related_id=reservation.id
+            ))
+            return reservation
+    return None
+
+
+def return_copy(book, copy=None, now=None):
+    """
+    Hand a returned copy to the next patron in line, or put it back on the shelf
+
+    A held copy is not counted in available_copies, so nobody else can borrow
+    it while the hold lasts. The caller commits.
+
+    Args:
+        book: Book the copy belongs to
+        copy: The physical BookCopy, when the book has copy records
+        now: Reference time (defaults to utcnow)
+
+    Returns:
+        Reservation now holding the copy, or None if it went back on the shelf
+    """
+    now = now or datetime.utcnow()
+    reservation = _claim_next(book, now)
+    if reservation is None:
+        book.available_copies += 1
+    if copy is not None:
+        copy.status = 'available' if reservation is None else 'on_hold'
+    return reservation
+
+
+def get_active_hold(user_id, book_id, now=None):
+    """The patron's unexpired hold on a copy of this book, if any"""
+    now = now or datetime.utcnow()
+    return Reservation.query.filter(
+        Reservation.user_id == user_id,
+        Reservation.book_id == book_id,
+        Reservation.status == 'pending',
+        Reservation.notified == True,
+        Reservation.expiry_date >= now
+    ).first()
+
+
+def withdraw_reservation(reservation, now=None):
+    """Cancel a reservation, passing a held copy on to the next in line (caller commits)"""
+    was_holding = reservation.status == 'pending' and reservation.notified
+    reservation.status = 'cancelled'
+    if was_holding:
+        return_copy(reservation.book, held_copy(reservation.book_id), now)
+
+
+def expire_holds(now=None):
+    """
+    Expire holds that were not collected in time and cascade each copy onward
+
+    Args:
+        now: Reference time (defaults to utcnow)
+
+    Returns:
+        int: Number of holds expired
+    """
+    now = now or datetime.utcnow()
+    stale = db.session.execute(
+        select(Reservation.id, Reservation.user_id, Reservation.book_id).where(
+            Reservation.status == 'pending',
+            Reservation.notified == True,
+            Reservation.expiry_date < now
+        )
+    ).all()
+    if not stale:
+        return 0
+
+    db.session.execute(
+        update(Reservation)
+        .where(Reservation.id.in_([row.id for row in stale]))
+        .values(status='expired', version_id=Reservation.version_id + 1)
+        .execution_options(synchronize_session='fetch')
+    )
+    invalidate_tags_on_commit('circulation')
+
+    books = {book.id: book for book in Book.query.filter(
+        Book.id.in_({row.book_id for row in stale})
+    )}
+    for row in stale:
+        book = books[row.book_id]
+        db.session.add(Notification(
+            user_id=row.user_id,
+            title='Reservation Expired',
+            message=f'Your hold on "{book.title}" expired because it was not collected in time.',
+            notification_type='reservation',
+            related_id=row.id
+        ))
+        return_copy(book, held_copy(book.id), now)
+    return len(stale)
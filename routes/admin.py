@@ -6,12 +6,25 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from functools import wraps
 from datetime import datetime, timedelta
-from sqlalchemy import func, desc
+from sqlalchemy import func
+from sqlalchemy.orm.exc import StaleDataError
 import csv
 import io
 
-from models import db, User, Book, Borrowing, Reservation, Review, Category, Department, Notification, ActivityLog, Setting
+from models import db, User, Book, Borrowing, BorrowingHistory, Reservation, Review, Category, Department, Notification, ActivityLog, Setting
 from email_service import send_email
+from cache_service import invalidate_lookups, invalidate_user
+from fine_service import accrue_fines, unpaid_fine_amount
+from reservation_service import return_copy
+from inventory_service import add_copies, set_total_copies
+from circulation_service import batch_checkout, batch_checkin, notify_batch, retry_on_conflict
+from history_service import recent_loans, count_loans
+from query_options import loan_list_options, export_options
+from cache_service import snapshot, PRINCIPAL_EXCLUDED_COLUMNS
+from shared_cache_service import cached
+from settings_service import get_settings, renewal_days
+from popularity_service import top_borrowed
+from book_payload_service import average_ratings
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -28,11 +41,8 @@ def admin_required(f):
     return decorated_function
 
 
-@admin_bp.route('/')
-@admin_bp.route('/dashboard')
-@admin_required
-def dashboard():
-    """Admin dashboard with analytics"""
+def _dashboard_data():
+    """Dashboard statistics, top books and new users, as plain snapshots"""
     # Get statistics
     stats = {
         'total_books': Book.query.count(),
@@ -46,24 +56,35 @@ def dashboard():
         'total_fines': db.session.query(func.sum(Borrowing.fine_amount)).scalar() or 0,
     }
     
-    # Recent activities
-    recent_borrowings = Borrowing.query.order_by(Borrowing.borrow_date.desc()).limit(10).all()
-    
     # Top borrowed books
-    top_books = db.session.query(
-        Book, func.count(Borrowing.id).label('borrow_count')
-    ).join(Borrowing).group_by(Book.id)\
-        .order_by(desc('borrow_count')).limit(5).all()
+    top_books = top_borrowed(5)
     
     # Recent user registrations
     recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
     
+    return dict(
+        stats=stats,
+        top_books=[(snapshot(book), book.borrow_count) for book in top_books],
+        recent_users=[snapshot(user, exclude=PRINCIPAL_EXCLUDED_COLUMNS) for user in recent_users]
+    )
+
+
+@admin_bp.route('/')
+@admin_bp.route('/dashboard')
+@admin_required
+def dashboard():
+    """Admin dashboard with analytics"""
+    # Aggregates are shared across workers and dropped when their tables change
+    data = cached('admin.dashboard', _dashboard_data, ttl=60, tags=('catalog', 'circulation', 'users'))
+    
+    # Recent activities
+    recent_borrowings = Borrowing.query.options(*loan_list_options(Borrowing, with_user=True))\
+        .order_by(Borrowing.borrow_date.desc()).limit(10).all()
+    
     return render_template('admin/dashboard.html',
-                          stats=stats,
                           recent_borrowings=recent_borrowings,
-                          top_books=top_books,
-                          recent_users=recent_users,
-                          datetime=datetime)
+                          datetime=datetime,
+                          **data)
 
 
 # ==================== BOOK MANAGEMENT ====================
@@ -132,8 +153,8 @@ def add_book():
             publication_year=publication_year,
             category=category,
             department=department,
-            total_copies=total_copies,
-            available_copies=total_copies,
+            total_copies=0,
+            available_copies=0,
             shelf_location=shelf_location,
             description=description,
             language=language,
@@ -141,6 +162,8 @@ def add_book():
         )
         
         db.session.add(book)
+        db.session.flush()
+        add_copies(book, total_copies)
         db.session.commit()
         
         flash('Book added successfully!', 'success')
@@ -160,6 +183,10 @@ def edit_book(book_id):
     book = Book.query.get_or_404(book_id)
     
     if request.method == 'POST':
+        # Reject the edit if the book changed since the form was loaded
+        if request.form.get('version_id', book.version_id, type=int) != book.version_id:
+            return _book_edit_conflict(book_id)
+        
         book.title = request.form.get('title', '').strip()
         book.author = request.form.get('author', '').strip()
         book.publisher = request.form.get('publisher', '').strip()
@@ -167,18 +194,22 @@ def edit_book(book_id):
         book.category = request.form.get('category', '')
         book.department = request.form.get('department', '')
         
-        new_total = request.form.get('total_copies', 1, type=int)
-        diff = new_total - book.total_copies
-        book.total_copies = new_total
-        book.available_copies = max(0, book.available_copies + diff)
-        
         book.shelf_location = request.form.get('shelf_location', '').strip()
         book.description = request.form.get('description', '').strip()
         book.language = request.form.get('language', 'English')
         book.pages = request.form.get('pages', type=int)
         book.is_active = request.form.get('is_active') == 'on'
         
-        db.session.commit()
+        # set_total_copies() flushes, so a concurrent edit can surface there too
+        try:
+            new_total = request.form.get('total_copies', 1, type=int)
+            if not set_total_copies(book, new_total):
+                db.session.rollback()
+                flash('Cannot remove copies that are on loan or on hold.', 'danger')
+                return redirect(url_for('admin.edit_book', book_id=book.id))
+            db.session.commit()
+        except StaleDataError:
+            return _book_edit_conflict(book_id)
         flash('Book updated successfully!', 'success')
         return redirect(url_for('admin.books'))
     
@@ -190,6 +221,20 @@ def edit_book(book_id):
                           departments=departments)
 
 
+def _book_edit_conflict(book_id):
+    """Re-render the edit form with the current values and a 409 status"""
+    db.session.rollback()
+    flash('This book was changed by someone else while you were editing. '
+          'Review the current values and save again.', 'warning')
+    book = Book.query.get_or_404(book_id)
+    categories = Category.query.filter_by(is_active=True).all()
+    departments = Department.query.filter_by(is_active=True).all()
+    return render_template('admin/books/edit.html',
+                          book=book,
+                          categories=categories,
+                          departments=departments), 409
+
+
 @admin_bp.route('/books/<int:book_id>/delete', methods=['POST'])
 @admin_required
 def delete_book(book_id):
@@ -248,15 +293,15 @@ def user_detail(user_id):
     """View user details"""
     user = User.query.get_or_404(user_id)
     
-    borrowings = Borrowing.query.filter_by(user_id=user.id)\
-        .order_by(Borrowing.borrow_date.desc()).limit(10).all()
+    borrowings = recent_loans(user.id, limit=10)
     
     # Calculate user statistics
     user_stats = {
-        'total_borrowed': Borrowing.query.filter_by(user_id=user.id).count(),
+        'total_borrowed': count_loans(user.id),
         'active_borrowed': Borrowing.query.filter_by(user_id=user.id, status='borrowed').count(),
         'active_reservations': Reservation.query.filter_by(user_id=user.id, status='pending').count(),
-        'total_fines': db.session.query(func.sum(Borrowing.fine_amount)).filter_by(user_id=user.id).scalar() or 0,
+        'total_fines': (db.session.query(func.sum(Borrowing.fine_amount)).filter_by(user_id=user.id).scalar() or 0) +
+                       (db.session.query(func.sum(BorrowingHistory.fine_amount)).filter_by(user_id=user.id).scalar() or 0),
         'reviews_count': Review.query.filter_by(user_id=user.id).count(),
     }
     
@@ -278,6 +323,7 @@ def toggle_user_status(user_id):
     
     user.is_active = not user.is_active
     db.session.commit()
+    invalidate_user(user.id)
     
     status = 'activated' if user.is_active else 'deactivated'
     flash(f'User {user.user_id} has been {status}.', 'success')
@@ -298,6 +344,7 @@ def change_user_role(user_id):
     if new_role in ['student', 'faculty', 'admin']:
         user.role = new_role
         db.session.commit()
+        invalidate_user(user.id)
         flash(f'User role changed to {new_role}.', 'success')
     
     return redirect(url_for('admin.user_detail', user_id=user_id))
@@ -334,10 +381,12 @@ def delete_user(user_id):
         Review.query.filter_by(user_id=user.id).delete()
         Reservation.query.filter_by(user_id=user.id).delete()
         Borrowing.query.filter_by(user_id=user.id).delete()
+        BorrowingHistory.query.filter_by(user_id=user.id).delete()
         
         # Delete user
         db.session.delete(user)
         db.session.commit()
+        invalidate_user(user_id)
         
         return jsonify({'success': True, 'message': f'User {user.user_id} deleted successfully.'})
     except Exception as e:
@@ -359,6 +408,7 @@ def suspend_user(user_id):
     
     user.is_active = False
     db.session.commit()
+    invalidate_user(user.id)
     
     # Send email notification to user
     try:
@@ -402,6 +452,7 @@ def activate_user(user_id):
     
     user.is_active = True
     db.session.commit()
+    invalidate_user(user.id)
     
     # Send email notification to user
     try:
@@ -448,7 +499,7 @@ def borrowings():
     status = request.args.get('status', '')
     overdue = request.args.get('overdue', '')
     
-    query = Borrowing.query
+    query = Borrowing.query.options(*loan_list_options(Borrowing, with_user=True))
     
     if status:
         query = query.filter_by(status=status)
@@ -488,6 +539,7 @@ def borrowings():
 
 @admin_bp.route('/borrowings/<int:borrowing_id>/mark-returned', methods=['POST'])
 @admin_required
+@retry_on_conflict
 def mark_returned(borrowing_id):
     """Mark a book as returned"""
     borrowing = Borrowing.query.get_or_404(borrowing_id)
@@ -495,15 +547,15 @@ def mark_returned(borrowing_id):
     if borrowing.status != 'borrowed':
         return jsonify({'success': False, 'message': 'This borrowing is not active.'}), 400
     
-    # Calculate fine
-    fine = borrowing.calculate_fine()
+    # Settle the fine accrued up to now
+    accrue_fines(borrowing_id=borrowing.id)
+    fine = unpaid_fine_amount(borrowing)
     
     borrowing.return_date = datetime.utcnow()
-    borrowing.fine_amount = fine
     borrowing.status = 'returned'
     
-    # Update book availability
-    borrowing.book.available_copies += 1
+    # Hold the copy for the next reservation in line, or put it back on the shelf
+    return_copy(borrowing.book, borrowing.copy)
     
     db.session.commit()
     
@@ -572,6 +624,7 @@ def return_borrowing(borrowing_id):
 
 @admin_bp.route('/borrowings/<int:borrowing_id>/renew', methods=['POST'])
 @admin_required
+@retry_on_conflict
 def renew_borrowing(borrowing_id):
     """Renew a borrowing for additional days"""
     borrowing = Borrowing.query.get_or_404(borrowing_id)
@@ -583,8 +636,8 @@ def renew_borrowing(borrowing_id):
     if borrowing.is_overdue():
         return jsonify({'success': False, 'message': 'Cannot renew overdue borrowings. Please return and clear fines first.'}), 400
     
-    # Extend due date by 14 days
-    borrowing.due_date = borrowing.due_date + timedelta(days=14)
+    # Extend due date by one renewal period
+    borrowing.due_date = borrowing.due_date + timedelta(days=renewal_days())
     db.session.commit()
     
     # Generate verification code
@@ -628,6 +681,7 @@ def renew_borrowing(borrowing_id):
 
 @admin_bp.route('/borrowings/<int:borrowing_id>/cancel', methods=['POST'])
 @admin_required
+@retry_on_conflict
 def cancel_borrowing(borrowing_id):
     """Cancel a borrowing"""
     borrowing = Borrowing.query.get_or_404(borrowing_id)
@@ -636,7 +690,7 @@ def cancel_borrowing(borrowing_id):
         return jsonify({'success': False, 'message': 'This borrowing is already returned.'}), 400
     
     borrowing.status = 'cancelled'
-    borrowing.book.available_copies += 1
+    return_copy(borrowing.book, borrowing.copy)
     
     db.session.commit()
     
@@ -669,6 +723,80 @@ def cancel_borrowing(borrowing_id):
     return jsonify({'success': True, 'message': 'Borrowing cancelled successfully.'})
 
 
+@admin_bp.route('/circulation/batch', methods=['POST'])
+@admin_required
+@retry_on_conflict
+def circulation_batch():
+    """Check out or check in a batch of scanned ISBNs/barcodes for one patron"""
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    items = [str(item).strip() for item in data.get('items') or [] if str(item).strip()]
+    
+    if action not in ('checkout', 'checkin'):
+        return jsonify({'success': False, 'message': "Action must be 'checkout' or 'checkin'."}), 400
+    if not items:
+        return jsonify({'success': False, 'message': 'No items to process.'}), 400
+    
+    user = User.query.filter_by(user_id=data.get('user_id')).first()
+    if not user:
+        return jsonify({'success': False, 'message': 'Patron not found.'}), 404
+    if action == 'checkout' and not user.is_active:
+        return jsonify({'success': False, 'message': 'Patron account is inactive.'}), 400
+    
+    if action == 'checkout':
+        results, loans = batch_checkout(user, items)
+    else:
+        results, loans = batch_checkin(user, items)
+    
+    if loans:
+        notify_batch(user, action, loans)
+    db.session.commit()
+    
+    # One email for the whole batch
+    if loans:
+        try:
+            verb = 'Borrowed' if action == 'checkout' else 'Returned'
+            if action == 'checkout':
+                details = [loan.due_date.strftime('%B %d, %Y') for loan in loans]
+            else:
+                # What is still owed, as in the JSON results (not the total ever accrued)
+                details = [f'₹{result["fine"]}' if result['fine'] else '-'
+                           for result in results if result['success']]
+            rows = ''.join(
+                f'<tr><td style="padding: 5px;">{loan.book.title}</td><td style="padding: 5px;">{detail}</td></tr>'
+                for loan, detail in zip(loans, details)
+            )
+            subject = f"{len(loans)} Book(s) {verb}"
+            html_body = f"""
+            <html>
+            <body style="font-family: Arial, sans-serif; padding: 20px;">
+                <h2 style="color: #667eea;">Books {verb}</h2>
+                <p>Dear {user.full_name},</p>
+                <p>The following books were {verb.lower()} at the circulation desk:</p>
+                <table style="background: #f8f9fa; padding: 20px; border-radius: 10px; margin: 20px 0;">
+                    <tr><th style="text-align: left; padding: 5px;">Title</th><th style="text-align: left; padding: 5px;">{'Due Date' if action == 'checkout' else 'Fine'}</th></tr>
+                    {rows}
+                </table>
+                <p>Thank you for using Digital Learning Library!</p>
+                <hr style="border: none; border-top: 1px solid #ddd; margin: 30px 0;">
+                <p style="color: #999; font-size: 12px;">Digital Learning Library<br>3-4, Police Station Road<br>+91 9392513416</p>
+            </body>
+            </html>
+            """
+            text_body = f"Books {verb}:\n\n" + '\n'.join(loan.book.title for loan in loans)
+            send_email(subject, user.email, text_body, html_body)
+        except Exception as e:
+            print(f"Error sending email: {e}")
+    
+    processed = sum(1 for result in results if result['success'])
+    return jsonify({
+        'success': processed > 0,
+        'processed': processed,
+        'failed': len(results) - processed,
+        'results': results
+    })
+
+
 # ==================== CATEGORIES & DEPARTMENTS ====================
 
 @admin_bp.route('/categories', methods=['GET', 'POST'])
@@ -686,6 +814,7 @@ def categories():
             category = Category(name=name, description=description, icon=icon)
             db.session.add(category)
             db.session.commit()
+            invalidate_lookups()
             flash('Category added successfully!', 'success')
     
     categories = Category.query.all()
@@ -707,6 +836,7 @@ def departments():
             dept = Department(code=code, name=name, description=description)
             db.session.add(dept)
             db.session.commit()
+            invalidate_lookups()
             flash('Department added successfully!', 'success')
     
     departments = Department.query.all()
@@ -715,26 +845,31 @@ def departments():
 
 # ==================== SETTINGS ====================
 
+# Settings the admin form may change; anything else posted is ignored
+EDITABLE_SETTINGS = {
+    'library_name', 'admin_email', 'library_address',
+    'max_books_per_user', 'max_borrow_days', 'max_renewals', 'renewal_period',
+    'fine_per_day', 'max_fine', 'enable_fines',
+    'enable_email_notifications', 'send_overdue_reminders', 'send_due_soon_reminders',
+    'reminder_days_before',
+}
+
 @admin_bp.route('/settings', methods=['GET', 'POST'])
 @admin_required
 def settings():
     """System settings"""
     if request.method == 'POST':
-        for key in request.form:
-            if key.startswith('setting_'):
-                setting_key = key.replace('setting_', '')
-                Setting.set(setting_key, request.form.get(key))
+        # One transaction (and one version bump) for the whole form
+        posted = {
+            key[len('setting_'):] if key.startswith('setting_') else key: value
+            for key, value in request.form.items()
+        }
+        Setting.set_many({key: value for key, value in posted.items() if key in EDITABLE_SETTINGS})
         
         flash('Settings updated successfully!', 'success')
         return redirect(url_for('admin.settings'))
     
-    # Convert settings list to dictionary for template
-    settings_list = Setting.query.all()
-    settings_dict = {}
-    for setting in settings_list:
-        settings_dict[setting.key] = setting.value
-    
-    return render_template('admin/settings.html', settings=settings_dict)
+    return render_template('admin/settings.html', settings=get_settings())
 
 
 # ==================== REPORTS ====================
@@ -762,7 +897,8 @@ def export_report(report_type):
     
     elif report_type == 'borrowings':
         writer.writerow(['User', 'Book', 'Borrow Date', 'Due Date', 'Status', 'Fine'])
-        borrowings = Borrowing.query.all()
+        borrowings = Borrowing.query.options(*export_options(Borrowing)).all() + \
+            BorrowingHistory.query.options(*export_options(BorrowingHistory)).all()
         for b in borrowings:
             writer.writerow([b.user.user_id, b.book.title,
                            b.borrow_date.strftime('%Y-%m-%d'),
@@ -890,16 +1026,12 @@ def analytics():
         department_borrowings.append(borrow_count)
     
     # Popular books
-    popular_books = db.session.query(
-        Book, func.count(Borrowing.id).label('borrow_count')
-    ).join(Borrowing).group_by(Book.id)\
-        .order_by(desc('borrow_count')).limit(10).all()
+    popular_books = top_borrowed(10)
     
     # Add average rating to popular books
-    for book, count in popular_books:
-        avg_rating = db.session.query(func.avg(Review.rating)).filter_by(book_id=book.id).scalar() or 0
-        book.avg_rating = round(avg_rating, 1)
-        book.borrow_count = count
+    ratings = average_ratings([book.id for book in popular_books])
+    for book in popular_books:
+        book.avg_rating = round(ratings.get(book.id) or 0, 1)
     
     # Recent activities
     recent_activities = []
@@ -937,7 +1069,7 @@ def analytics():
                           department_labels=json.dumps(department_labels),
                           department_users=json.dumps(department_users),
                           department_borrowings=json.dumps(department_borrowings),
-                          popular_books=[(b, c) for b, c in popular_books],
+                          popular_books=popular_books,
                           recent_activities=recent_activities,
                           subscription_stats=subscription_stats,
                           datetime=datetime)
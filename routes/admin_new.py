@@ -10,6 +10,8 @@ from datetime import datetime, timedelta
 from sqlalchemy import func
 
 from models import db, User, Book, Borrowing, Reservation, Review, Category, Department, Setting
+from cache_service import invalidate_lookups, invalidate_user
+from settings_service import fine_per_day
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -54,10 +56,8 @@ def dashboard():
     
     # Popular books
     popular_books = db.session.query(
-        Book.id, Book.title, Book.author, func.count(Borrowing.id).label('borrow_count')
-    ).join(Borrowing).group_by(Book.id, Book.title, Book.author).order_by(
-        func.count(Borrowing.id).desc()
-    ).limit(5).all()
+        Book.id, Book.title, Book.author, Book.borrow_count
+    ).filter(Book.borrow_count > 0).order_by(Book.borrow_count.desc(), Book.id).limit(5).all()
     
     return render_template('admin/dashboard.html',
                           stats=stats,
@@ -120,6 +120,7 @@ def toggle_user(user_id):
     user = User.query.get_or_404(user_id)
     user.is_active = not user.is_active
     db.session.commit()
+    invalidate_user(user.id)
     
     status = 'activated' if user.is_active else 'deactivated'
     flash(f'User {status} successfully!', 'success')
@@ -269,7 +270,7 @@ def process_return(borrowing_id):
     borrowing.status = 'returned'
     
     if borrowing.is_overdue():
-        borrowing.fine_amount = borrowing.calculate_fine()
+        borrowing.fine_amount = borrowing.calculate_fine(fine_per_day())
     
     borrowing.book.available_copies += 1
     
@@ -314,6 +315,7 @@ def add_category():
     category = Category(name=name, description=description, icon=icon)
     db.session.add(category)
     db.session.commit()
+    invalidate_lookups()
     
     flash('Category added successfully!', 'success')
     return redirect(url_for('admin.categories'))
@@ -2,12 +2,20 @@
 API Routes - RESTful API endpoints for the library system
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, stream_with_context
 from flask_login import login_required, current_user
 from datetime import datetime
-from sqlalchemy import or_
+from sqlalchemy import or_, func
+from sqlalchemy.orm import load_only
 
 from models import db, Book, Borrowing, Reservation, User, Notification
+from query_options import loan_list_options
+from book_payload_service import (book_fragments, book_fragment, json_response, list_response,
+                                  parse_fields, parse_ids, sparse_columns, sparse_fragments)
+from http_cache_service import conditional, catalog_version, book_version, lookup_version, stats_version
+from cache_service import get_active_categories, get_active_departments
+from catalog_sync_service import changes_since, iter_catalog_ndjson, gzip_stream
+from fine_service import unpaid_fines
 
 api_bp = Blueprint('api', __name__)
 
@@ -15,15 +23,33 @@ api_bp = Blueprint('api', __name__)
 # ==================== BOOK APIs ====================
 
 @api_bp.route('/books')
+@conditional(catalog_version)
 def get_books():
-    """Get all books with filters"""
+    """Get all books with filters, ?fields= projections and ?ids= batch fetches"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 12, type=int)
     category = request.args.get('category', '')
     department = request.args.get('department', '')
     search = request.args.get('search', '')
     
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        ids = parse_ids(request.args.get('ids'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def payloads(items):
+        # Sparse fieldsets are serialized uncached; full summaries come from the fragment cache
+        return sparse_fragments(items, fields) if fields else book_fragments(items, 'summary')
+    
     query = Book.query.filter_by(is_active=True)
+    if fields:
+        query = query.options(load_only(*sparse_columns(fields)))
+    
+    if ids is not None:
+        found = {book.id: book for book in query.filter(Book.id.in_(ids))}
+        return list_response('books', payloads([found[i] for i in ids if i in found]),
+                             missing=[i for i in ids if i not in found])
     
     if category:
         query = query.filter_by(category=category)
@@ -41,48 +67,46 @@ def get_books():
     
     books = query.paginate(page=page, per_page=per_page)
     
-    return jsonify({
-        'books': [{
-            'id': book.id,
-            'isbn': book.isbn,
-            'title': book.title,
-            'author': book.author,
-            'category': book.category,
-            'department': book.department,
-            'available': book.available_copies > 0,
-            'available_copies': book.available_copies,
-            'cover_image': book.cover_image,
-            'rating': book.get_average_rating()
-        } for book in books.items],
-        'total': books.total,
-        'pages': books.pages,
-        'current_page': page
-    })
+    return list_response('books', payloads(books.items),
+                         total=books.total, pages=books.pages, current_page=page)
 
 
 @api_bp.route('/books/<int:book_id>')
+@conditional(book_version)
 def get_book(book_id):
     """Get a single book by ID"""
     book = Book.query.get_or_404(book_id)
     
-    return jsonify({
-        'id': book.id,
-        'isbn': book.isbn,
-        'title': book.title,
-        'author': book.author,
-        'publisher': book.publisher,
-        'publication_year': book.publication_year,
-        'category': book.category,
-        'department': book.department,
-        'language': book.language,
-        'pages': book.pages,
-        'total_copies': book.total_copies,
-        'available_copies': book.available_copies,
-        'shelf_location': book.shelf_location,
-        'description': book.description,
-        'cover_image': book.cover_image,
-        'rating': book.get_average_rating()
-    })
+    return json_response(book_fragment(book, 'detail'))
+
+
+@api_bp.route('/books/changes')
+def get_book_changes():
+    """Catalog change feed for offline replicas: /api/books/changes?since=<cursor>"""
+    limit = min(request.args.get('limit', 500, type=int), 1000)
+    try:
+        changes = changes_since(request.args.get('since'), limit=max(limit, 1))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    return list_response('books', book_fragments(changes.books, 'summary'),
+                         removed=changes.removed, cursor=changes.cursor, has_more=changes.has_more)
+
+
+@api_bp.route('/books/dump')
+def dump_books():
+    """Stream the whole active catalog as NDJSON, gzipped if the client accepts it"""
+    chunks = iter_catalog_ndjson(
+        department=request.args.get('department') or None,
+        category=request.args.get('category') or None
+    )
+    headers = {'Vary': 'Accept-Encoding'}
+    if 'gzip' in request.accept_encodings:
+        chunks = gzip_stream(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    
+    return current_app.response_class(stream_with_context(chunks),
+                                      mimetype='application/x-ndjson', headers=headers)
 
 
 @api_bp.route('/search')
@@ -107,7 +131,6 @@ def search():
     ).limit(limit).all()
     
     # Get unique authors matching search
-    from sqlalchemy import func, distinct
     authors_query = db.session.query(
         Book.author,
         func.count(Book.id).label('book_count')
@@ -123,25 +146,69 @@ def search():
         Category.name.ilike(search_term)
     ).limit(5).all()
     
-    return jsonify({
-        'books': [{
-            'id': book.id,
-            'title': book.title,
-            'author': book.author,
-            'category': book.category.name if book.category else 'General',
-            'isbn': book.isbn,
-            'available_copies': book.available_copies,
-            'cover_image': book.cover_image or 'default_book.png'
-        } for book in books],
-        'authors': [{
+    # Book counts for all matching categories in one grouped query
+    category_counts = dict(db.session.query(
+        Book.category, func.count(Book.id)
+    ).filter(
+        Book.is_active == True,
+        Book.category.in_([cat.name for cat in categories])
+    ).group_by(Book.category).all()) if categories else {}
+    
+    return list_response('books', book_fragments(books, 'search'),
+        authors=[{
             'name': author,
             'book_count': count
         } for author, count in authors_query],
-        'categories': [{
+        categories=[{
             'id': cat.id,
             'name': cat.name,
-            'book_count': Book.query.filter_by(category_id=cat.id, is_active=True).count()
+            'book_count': category_counts.get(cat.name, 0)
         } for cat in categories]
+    )
+
+
+@api_bp.route('/categories')
+@conditional(lookup_version)
+def get_categories():
+    """Active categories, from the lookup cache"""
+    return jsonify({
+        'categories': [{
+            'id': cat.id,
+            'name': cat.name,
+            'description': cat.description,
+            'icon': cat.icon
+        } for cat in get_active_categories()]
+    })
+
+
+@api_bp.route('/departments')
+@conditional(lookup_version)
+def get_departments():
+    """Active departments, from the lookup cache"""
+    return jsonify({
+        'departments': [{
+            'id': dept.id,
+            'code': dept.code,
+            'name': dept.name,
+            'description': dept.description
+        } for dept in get_active_departments()]
+    })
+
+
+@api_bp.route('/stats')
+@conditional(stats_version)
+def get_stats():
+    """Public library statistics"""
+    return jsonify({
+        'total_books': Book.query.filter_by(is_active=True).count(),
+        'available_books': Book.query.filter(
+            Book.is_active == True,
+            Book.available_copies > 0
+        ).count(),
+        'total_users': User.query.filter_by(is_active=True).count(),
+        'active_borrowings': Borrowing.query.filter_by(status='borrowed').count(),
+        'categories': len(get_active_categories()),
+        'departments': len(get_active_departments())
     })
 
 
@@ -153,10 +220,11 @@ def get_user_borrowings():
     """Get current user's borrowings"""
     status = request.args.get('status', 'borrowed')
     
-    borrowings = Borrowing.query.filter_by(
+    borrowings = Borrowing.query.options(*loan_list_options(Borrowing)).filter_by(
         user_id=current_user.id,
         status=status
     ).all()
+    owed = unpaid_fines(current_user.id, status)
     
     return jsonify([{
         'id': b.id,
@@ -169,7 +237,7 @@ def get_user_borrowings():
         'due_date': b.due_date.isoformat(),
         'is_overdue': b.is_overdue(),
         'days_overdue': b.days_overdue(),
-        'fine': b.calculate_fine(),
+        'fine': owed.get(b.id, 0),
         'can_renew': b.can_renew()
     } for b in borrowings])
 
@@ -178,7 +246,7 @@ def get_user_borrowings():
 @login_required
 def get_user_reservations():
     """Get current user's reservations"""
-    reservations = Reservation.query.filter_by(
+    reservations = Reservation.query.options(*loan_list_options(Reservation)).filter_by(
         user_id=current_user.id,
         status='pending'
     ).all()
@@ -233,22 +301,15 @@ def mark_notification_read(notification_id):
 def get_user_stats():
     """Get current user's statistics"""
     total_borrowed = Borrowing.query.filter_by(user_id=current_user.id).count()
-    currently_borrowed = Borrowing.query.filter_by(
-        user_id=current_user.id,
-        status='borrowed'
-    ).count()
-    overdue = Borrowing.query.filter(
-        Borrowing.user_id == current_user.id,
-        Borrowing.status == 'borrowed',
-        Borrowing.due_date < datetime.utcnow()
-    ).count()
+    patron = current_user.get_patron_status()
     
     return jsonify({
         'total_borrowed': total_borrowed,
-        'currently_borrowed': currently_borrowed,
-        'overdue': overdue,
-        'total_fine': current_user.get_total_fine(),
-        'can_borrow': current_user.can_borrow()
+        'currently_borrowed': patron.active_loans,
+        'overdue': patron.overdue_loans,
+        'total_fine': patron.outstanding_fine,
+        'can_borrow': patron.can_borrow,
+        'borrow_limit': patron.borrow_limit
     })
 
 
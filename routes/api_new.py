@@ -7,6 +7,9 @@ from flask import Blueprint, jsonify, request
 from flask_login import login_required, current_user
 
 from models import db, Book, User, Borrowing, Reservation, Category, Department
+from query_options import loan_list_options
+from book_payload_service import book_fragment, json_response
+from http_cache_service import conditional, book_version, lookup_version, stats_version
 
 api_bp = Blueprint('api', __name__)
 
@@ -40,28 +43,16 @@ def api_search():
 
 
 @api_bp.route('/books/<int:book_id>')
+@conditional(book_version)
 def api_book_detail(book_id):
     """Get book details"""
     book = Book.query.get_or_404(book_id)
     
-    return jsonify({
-        'id': book.id,
-        'isbn': book.isbn,
-        'title': book.title,
-        'author': book.author,
-        'publisher': book.publisher,
-        'publication_year': book.publication_year,
-        'category': book.category,
-        'department': book.department,
-        'description': book.description,
-        'total_copies': book.total_copies,
-        'available_copies': book.available_copies,
-        'average_rating': book.get_average_rating(),
-        'cover_image': book.cover_image
-    })
+    return json_response(book_fragment(book, 'legacy_detail'))
 
 
 @api_bp.route('/categories')
+@conditional(lookup_version)
 def api_categories():
     """Get all categories"""
     categories = Category.query.filter_by(is_active=True).all()
@@ -77,6 +68,7 @@ def api_categories():
 
 
 @api_bp.route('/departments')
+@conditional(lookup_version)
 def api_departments():
     """Get all departments"""
     departments = Department.query.filter_by(is_active=True).all()
@@ -95,7 +87,7 @@ def api_departments():
 @login_required
 def api_user_borrowings():
     """Get user's borrowings"""
-    borrowings = Borrowing.query.filter_by(
+    borrowings = Borrowing.query.options(*loan_list_options(Borrowing)).filter_by(
         user_id=current_user.id
     ).order_by(Borrowing.borrow_date.desc()).all()
     
@@ -118,7 +110,7 @@ def api_user_borrowings():
 @login_required
 def api_user_reservations():
     """Get user's reservations"""
-    reservations = Reservation.query.filter_by(
+    reservations = Reservation.query.options(*loan_list_options(Reservation)).filter_by(
         user_id=current_user.id
     ).order_by(Reservation.created_at.desc()).all()
     
@@ -134,6 +126,7 @@ def api_user_reservations():
 
 
 @api_bp.route('/stats')
+@conditional(stats_version)
 def api_stats():
     """Get library statistics"""
     stats = {
@@ -10,10 +10,33 @@ import os
 
 from models import db, Book, Borrowing, Reservation, Review, Category, Department, Notification
 from email_service import send_email
+from cache_service import idempotent
+from reservation_service import get_active_hold, withdraw_reservation
+from inventory_service import check_out_copy
+from circulation_service import retry_on_conflict
+from shared_cache_service import cached
+from settings_service import loan_days
 
 books_bp = Blueprint('books', __name__)
 
 
+def _catalog_facets():
+    """Distinct departments and categories of active books"""
+    all_departments = db.session.query(Book.department)\
+        .filter(Book.is_active == True, Book.department != None, Book.department != '')\
+        .distinct()\
+        .order_by(Book.department)\
+        .all()
+    
+    all_categories = db.session.query(Book.category)\
+        .filter(Book.is_active == True, Book.category != None, Book.category != '')\
+        .distinct()\
+        .order_by(Book.category)\
+        .all()
+    
+    return [dept[0] for dept in all_departments], [cat[0] for cat in all_categories]
+
+
 @books_bp.route('/')
 def index():
     """Browse all books with filters"""
@@ -56,20 +79,8 @@ def index():
     # Calculate available count
     available_count = sum(1 for book in all_books if book.is_available())
     
-    # Get filter options - get unique values from database
-    all_departments = db.session.query(Book.department)\
-        .filter(Book.is_active == True, Book.department != None, Book.department != '')\
-        .distinct()\
-        .order_by(Book.department)\
-        .all()
-    departments = [dept[0] for dept in all_departments]
-    
-    all_categories = db.session.query(Book.category)\
-        .filter(Book.is_active == True, Book.category != None, Book.category != '')\
-        .distinct()\
-        .order_by(Book.category)\
-        .all()
-    categories = [cat[0] for cat in all_categories]
+    # Filter options (facets), shared across workers until the catalog changes
+    departments, categories = cached('books.facets', _catalog_facets, tags=('catalog',))
     
     # Create a simple object to mimic pagination for template compatibility
     class BooksList:
@@ -139,21 +150,27 @@ def detail(book_id):
 
 @books_bp.route('/<int:book_id>/borrow', methods=['POST'])
 @login_required
+@idempotent
+@retry_on_conflict
 def borrow(book_id):
     """Borrow a book"""
     book = Book.query.get_or_404(book_id)
     
+    # A copy held for this patron's reservation is already off the shelf
+    hold = get_active_hold(current_user.id, book_id)
+    
     # Check if book is available
-    if not book.is_available():
+    if not hold and not book.is_available():
         flash('This book is currently not available.', 'danger')
         return redirect(url_for('books.detail', book_id=book_id))
     
     # Check if user can borrow
-    if not current_user.can_borrow():
-        if current_user.get_total_fine() > 0:
+    patron = current_user.get_patron_status()
+    if not patron.can_borrow:
+        if patron.has_fines:
             flash('Please clear your pending fines before borrowing.', 'warning')
         else:
-            flash('You have reached the maximum borrowing limit (5 books).', 'warning')
+            flash(f'You have reached the maximum borrowing limit ({patron.borrow_limit} books).', 'warning')
         return redirect(url_for('books.detail', book_id=book_id))
     
     # Check if user already has this book
@@ -168,25 +185,31 @@ def borrow(book_id):
         return redirect(url_for('books.detail', book_id=book_id))
     
     # Create borrowing record
-    due_date = datetime.utcnow() + timedelta(days=14)
+    due_date = datetime.utcnow() + timedelta(days=loan_days())
     borrowing = Borrowing(
         user_id=current_user.id,
         book_id=book_id,
         due_date=due_date
     )
     
-    # Update book availability
-    book.available_copies -= 1
-    
-    # Cancel any pending reservation by this user
-    reservation = Reservation.query.filter_by(
-        user_id=current_user.id,
-        book_id=book_id,
-        status='pending'
-    ).first()
+    if hold:
+        hold.status = 'fulfilled'
+    else:
+        # Update book availability
+        book.available_copies -= 1
+        
+        # Cancel any pending reservation by this user
+        reservation = Reservation.query.filter_by(
+            user_id=current_user.id,
+            book_id=book_id,
+            status='pending'
+        ).first()
+        
+        if reservation:
+            reservation.status = 'fulfilled'
     
-    if reservation:
-        reservation.status = 'fulfilled'
+    # Lend a specific copy (the held one when collecting a reservation)
+    check_out_copy(borrowing, from_hold=hold is not None)
     
     db.session.add(borrowing)
     db.session.commit()
@@ -252,6 +275,7 @@ def borrow(book_id):
 
 @books_bp.route('/<int:book_id>/reserve', methods=['POST'])
 @login_required
+@idempotent
 def reserve(book_id):
     """Reserve a book"""
     book = Book.query.get_or_404(book_id)
@@ -319,6 +343,7 @@ def reserve(book_id):
 
 @books_bp.route('/<int:book_id>/cancel-reservation', methods=['POST'])
 @login_required
+@retry_on_conflict
 def cancel_reservation(book_id):
     """Cancel a reservation"""
     reservation = Reservation.query.filter_by(
@@ -327,7 +352,7 @@ def cancel_reservation(book_id):
         status='pending'
     ).first_or_404()
     
-    reservation.status = 'cancelled'
+    withdraw_reservation(reservation)
     db.session.commit()
     
     flash('Reservation cancelled successfully.', 'info')
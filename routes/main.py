@@ -3,22 +3,23 @@ Main Routes - Home, About, Contact pages
 """
 
 from flask import Blueprint, render_template, request, flash, redirect, url_for
-from models import db, Book, Category, Department, Borrowing
+from models import db, Book, Category, Department
+from cache_service import snapshot
+from shared_cache_service import cached
+from page_cache_service import anonymous_page, catalog_page_version
+from popularity_service import trending
 
 main_bp = Blueprint('main', __name__)
 
 
-@main_bp.route('/')
-def index():
-    """Homepage with featured books and statistics"""
+def _home_page_data():
+    """Featured and popular books, statistics and category counts, as plain snapshots"""
     # Get featured/latest books
     featured_books = Book.query.filter_by(is_active=True)\
         .order_by(Book.added_date.desc()).limit(8).all()
     
-    # Get popular books (most borrowed)
-    popular_books = db.session.query(Book, db.func.count(Borrowing.id).label('borrow_count'))\
-        .join(Borrowing).group_by(Book.id)\
-        .order_by(db.desc('borrow_count')).limit(4).all()
+    # Get popular books (most borrowed lately), from the maintained trending score
+    popular_books = trending(4)
     
     # Get statistics
     stats = {
@@ -35,11 +36,22 @@ def index():
         .filter(Category.is_active == True)\
         .group_by(Category.id).all()
     
-    return render_template('main/index.html',
-                          featured_books=featured_books,
-                          popular_books=popular_books,
-                          stats=stats,
-                          categories_with_count=categories_with_count)
+    return dict(
+        featured_books=[snapshot(book) for book in featured_books],
+        popular_books=[(snapshot(book), book.borrow_count) for book in popular_books],
+        stats=stats,
+        categories_with_count=[(snapshot(category), count) for category, count in categories_with_count]
+    )
+
+
+@main_bp.route('/')
+@anonymous_page(catalog_page_version)
+def index():
+    """Homepage with featured books and statistics"""
+    # Shared across workers; dropped when books, loans or categories change
+    data = cached('main.index', _home_page_data, tags=('catalog', 'circulation'))
+    
+    return render_template('main/index.html', **data)
 
 
 @main_bp.route('/about')
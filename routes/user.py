@@ -4,12 +4,20 @@ User Routes - Dashboard, Profile, Borrowings, History
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
-from datetime import datetime, timedelta
+from datetime import datetime
 from werkzeug.utils import secure_filename
 import os
 
-from models import db, User, Book, Borrowing, Reservation, Review, Notification
+from models import db, User, Book, Borrowing, Reservation, Review, Notification, FineLedger
 from email_service import send_email
+from cache_service import invalidate_user, idempotent
+from fine_service import accrue_fines, record_fine_payment, unpaid_fine, unpaid_fine_amount, unpaid_fines
+from reservation_service import return_copy
+from circulation_service import retry_on_conflict
+from history_service import paginate_loan_history, count_loans
+from query_options import loan_list_options
+from settings_service import renewal_days, max_renewals
+from recommendation_service import recommended_books
 
 user_bp = Blueprint('user', __name__)
 
@@ -19,38 +27,42 @@ user_bp = Blueprint('user', __name__)
 def dashboard():
     """User dashboard"""
     # Get active borrowings
-    borrowings = Borrowing.query.filter_by(
+    borrowings = Borrowing.query.options(*loan_list_options(Borrowing)).filter_by(
         user_id=current_user.id,
         status='borrowed'
     ).order_by(Borrowing.due_date).all()
     
     # Get pending reservations
-    reservations = Reservation.query.filter_by(
+    reservations = Reservation.query.options(*loan_list_options(Reservation)).filter_by(
         user_id=current_user.id,
         status='pending'
     ).order_by(Reservation.created_at.desc()).all()
     
-    # Calculate total fines
-    total_fine = current_user.get_total_fine()
+    # Loan counts and fines in one aggregate query
+    patron = current_user.get_patron_status()
     
     # Get recent notifications
     notifications = Notification.query.filter_by(
         user_id=current_user.id
     ).order_by(Notification.created_at.desc()).limit(5).all()
     
+    # Suggestions precomputed by compute_recommendations.py
+    recommendations = recommended_books(current_user.id)
+    
     # Statistics
     stats = {
-        'total_borrowed': Borrowing.query.filter_by(user_id=current_user.id).count(),
-        'currently_borrowed': len(borrowings),
-        'overdue': sum(1 for b in borrowings if b.is_overdue()),
+        'total_borrowed': count_loans(current_user.id),
+        'currently_borrowed': patron.active_loans,
+        'overdue': patron.overdue_loans,
         'reservations': len(reservations)
     }
     
     return render_template('user/dashboard.html',
                           borrowings=borrowings,
                           reservations=reservations,
-                          total_fine=total_fine,
+                          total_fine=patron.outstanding_fine,
                           notifications=notifications,
+                          recommendations=recommendations,
                           stats=stats)
 
 
@@ -106,6 +118,7 @@ def profile():
         
         try:
             db.session.commit()
+            invalidate_user(current_user.id)
             flash('Profile updated successfully!', 'success')
         except Exception as e:
             db.session.rollback()
@@ -125,13 +138,8 @@ def borrowings():
     page = request.args.get('page', 1, type=int)
     status = request.args.get('status', '')
     
-    query = Borrowing.query.filter_by(user_id=current_user.id)
-    
-    if status:
-        query = query.filter_by(status=status)
-    
-    borrowings = query.order_by(Borrowing.borrow_date.desc())\
-        .paginate(page=page, per_page=10)
+    # Live and archived loans, newest first
+    borrowings = paginate_loan_history(current_user.id, status, page=page, per_page=10)
     
     return render_template('user/borrowings.html',
                           borrowings=borrowings,
@@ -140,6 +148,7 @@ def borrowings():
 
 @user_bp.route('/borrowings/<int:borrowing_id>/return', methods=['POST'])
 @login_required
+@retry_on_conflict
 def return_book(borrowing_id):
     """Return a borrowed book"""
     borrowing = Borrowing.query.filter_by(
@@ -148,35 +157,16 @@ def return_book(borrowing_id):
         status='borrowed'
     ).first_or_404()
     
-    # Calculate fine if overdue
-    fine = borrowing.calculate_fine()
+    # Settle the fine accrued up to now
+    accrue_fines(borrowing_id=borrowing.id)
+    fine = unpaid_fine_amount(borrowing)
     
     # Update borrowing
     borrowing.return_date = datetime.utcnow()
-    borrowing.fine_amount = fine
     borrowing.status = 'returned'
     
-    # Update book availability
-    book = borrowing.book
-    book.available_copies += 1
-    
-    # Check for pending reservations
-    next_reservation = Reservation.query.filter_by(
-        book_id=book.id,
-        status='pending'
-    ).order_by(Reservation.created_at).first()
-    
-    if next_reservation:
-        # Notify the user
-        notification = Notification(
-            user_id=next_reservation.user_id,
-            title='Book Available!',
-            message=f'The book "{book.title}" is now available for pickup.',
-            notification_type='reservation'
-        )
-        next_reservation.expiry_date = datetime.utcnow() + timedelta(days=3)
-        next_reservation.notified = True
-        db.session.add(notification)
+    # Hold the copy for the next reservation in line, or put it back on the shelf
+    return_copy(borrowing.book, borrowing.copy)
     
     db.session.commit()
     
@@ -190,6 +180,8 @@ def return_book(borrowing_id):
 
 @user_bp.route('/borrowings/<int:borrowing_id>/renew', methods=['POST'])
 @login_required
+@idempotent
+@retry_on_conflict
 def renew_book(borrowing_id):
     """Renew a borrowed book"""
     borrowing = Borrowing.query.filter_by(
@@ -198,7 +190,7 @@ def renew_book(borrowing_id):
         status='borrowed'
     ).first_or_404()
     
-    if borrowing.renew():
+    if borrowing.renew(days=renewal_days()):
         db.session.commit()
         
         # Create notification with action URL
@@ -230,7 +222,7 @@ def renew_book(borrowing_id):
                     <h3 style="color: #333; margin-top: 0;">{borrowing.book.title}</h3>
                     <p style="margin: 5px 0;"><strong>Author:</strong> {borrowing.book.author}</p>
                     <p style="margin: 5px 0;"><strong>New Due Date:</strong> <span style="color: #28a745; font-weight: bold;">{borrowing.due_date.strftime('%B %d, %Y')}</span></p>
-                    <p style="margin: 5px 0;"><strong>Renewals Used:</strong> {borrowing.renewed_count} of 2</p>
+                    <p style="margin: 5px 0;"><strong>Renewals Used:</strong> {borrowing.renewed_count} of {max_renewals()}</p>
                 </div>
                 <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 20px; border-radius: 10px; margin: 20px 0; text-align: center;">
                     <p style="color: white; margin: 5px 0; font-size: 14px;">Transaction Verification Code</p>
@@ -240,7 +232,7 @@ def renew_book(borrowing_id):
                 <p><strong>Important:</strong></p>
                 <ul>
                     <li>Please return the book by the new due date</li>
-                    <li>Maximum 2 renewals allowed per book</li>
+                    <li>Maximum {max_renewals()} renewals allowed per book</li>
                     <li>Late fee: ₹5 per day after due date</li>
                     <li>Keep this verification code for your records</li>
                 </ul>
@@ -259,7 +251,7 @@ def renew_book(borrowing_id):
     else:
         if borrowing.is_overdue():
             flash('Cannot renew overdue books. Please return the book first.', 'danger')
-        elif borrowing.renewed_count >= 2:
+        elif borrowing.renewed_count >= max_renewals():
             flash('Maximum renewal limit reached.', 'warning')
         else:
             flash('Unable to renew this book.', 'danger')
@@ -293,7 +285,9 @@ def notifications():
     # Mark as read
     Notification.query.filter_by(user_id=current_user.id, is_read=False)\
         .update({'is_read': True})
+    current_user.unread_notifications = 0
     db.session.commit()
+    invalidate_user(current_user.id)
     
     return render_template('user/notifications.html', notifications=notifications)
 
@@ -322,8 +316,10 @@ def mark_all_notifications_read():
         user_id=current_user.id,
         is_read=False
     ).update({'is_read': True})
+    current_user.unread_notifications = 0
     
     db.session.commit()
+    invalidate_user(current_user.id)
     
     flash('All notifications marked as read.', 'success')
     return redirect(url_for('user.notifications'))
@@ -399,35 +395,34 @@ def delete_review(review_id):
 @login_required
 def fines():
     """User's fines history"""
+    # Bring this user's accrued fines up to date
+    if accrue_fines(user_id=current_user.id):
+        db.session.commit()
+    
     # Get outstanding fines (not paid)
-    outstanding_borrowings = Borrowing.query.filter(
+    outstanding_borrowings = Borrowing.query.options(*loan_list_options(Borrowing))\
+        .add_columns(unpaid_fine()).filter(
         Borrowing.user_id == current_user.id,
-        Borrowing.return_date == None,
-        Borrowing.due_date < datetime.utcnow()
-    ).all()
+        Borrowing.status == 'borrowed',
+        Borrowing.fine_paid == False,
+        Borrowing.fine_amount > 0
+    ).order_by(Borrowing.due_date).all()
     
-    # Calculate outstanding fines
-    outstanding_fines = []
-    total_fines = 0
-    for borrowing in outstanding_borrowings:
-        days_overdue = (datetime.utcnow().date() - borrowing.due_date.date()).days
-        fine_amount = days_overdue * 5  # ₹5 per day
-        outstanding_fines.append({
-            'borrowing': borrowing,
-            'days_overdue': days_overdue,
-            'amount': fine_amount,
-            'id': borrowing.id
-        })
-        total_fines += fine_amount
-    
-    # Get paid fines history
-    paid_fines_history = Borrowing.query.filter(
-        Borrowing.user_id == current_user.id,
-        Borrowing.fine_amount > 0,
-        Borrowing.fine_paid == True
-    ).order_by(Borrowing.return_date.desc()).all()
+    outstanding_fines = [{
+        'borrowing': borrowing,
+        'days_overdue': borrowing.days_overdue(),
+        'amount': owed,
+        'id': borrowing.id
+    } for borrowing, owed in outstanding_borrowings]
+    total_fines = sum(fine['amount'] for fine in outstanding_fines)
     
-    paid_fines = sum([b.fine_amount for b in paid_fines_history])
+    # Get paid fines history from the ledger
+    paid_fines_history = FineLedger.query.filter_by(
+        user_id=current_user.id,
+        entry_type='payment'
+    ).order_by(FineLedger.created_at.desc()).all()
+    
+    paid_fines = sum(entry.amount for entry in paid_fines_history)
     all_time_fines = total_fines + paid_fines
     
     return render_template('user/fines.html',
@@ -440,6 +435,8 @@ def fines():
 
 @user_bp.route('/fines/<int:fine_id>/pay', methods=['POST'])
 @login_required
+@idempotent
+@retry_on_conflict
 def pay_fine(fine_id):
     """Pay a single fine"""
     borrowing = Borrowing.query.filter_by(
@@ -449,24 +446,20 @@ def pay_fine(fine_id):
     
     payment_method = request.form.get('payment_method', 'cash')
     
-    # Calculate fine
-    if borrowing.return_date is None and borrowing.due_date < datetime.utcnow():
-        days_overdue = (datetime.utcnow().date() - borrowing.due_date.date()).days
-        fine_amount = days_overdue * 5
-        
-        borrowing.fine_amount = fine_amount
-        borrowing.fine_paid = True
+    # Make sure the amount is current before charging it
+    accrue_fines(borrowing_id=borrowing.id)
+    
+    fine_amount = unpaid_fine_amount(borrowing) if borrowing.status == 'borrowed' else 0
+    if fine_amount > 0:
         
         # In a real application, integrate with payment gateway here
         # For now, we'll mark it as paid
-        
+        record_fine_payment(borrowing, fine_amount, payment_method)
         db.session.commit()
         
         flash(f'Fine of ₹{fine_amount} paid successfully via {payment_method.upper()}.', 'success')
-        db.session.commit()
-        
-        flash(f'Fine of ₹{fine_amount} paid successfully.', 'success')
     else:
+        db.session.commit()
         flash('No fine to pay for this borrowing.', 'info')
     
     return redirect(url_for('user.fines'))
@@ -474,24 +467,26 @@ def pay_fine(fine_id):
 
 @user_bp.route('/fines/pay-all', methods=['POST'])
 @login_required
+@idempotent
+@retry_on_conflict
 def pay_all_fines():
     """Pay all outstanding fines"""
     payment_method = request.form.get('payment_method', 'cash')
     
+    accrue_fines(user_id=current_user.id)
+    
     outstanding_borrowings = Borrowing.query.filter(
         Borrowing.user_id == current_user.id,
-        Borrowing.return_date == None,
-        Borrowing.due_date < datetime.utcnow()
+        Borrowing.status == 'borrowed',
+        Borrowing.fine_paid == False,
+        Borrowing.fine_amount > 0
     ).all()
     
+    owed = unpaid_fines(current_user.id)
     total_paid = 0
     for borrowing in outstanding_borrowings:
-        days_overdue = (datetime.utcnow().date() - borrowing.due_date.date()).days
-        fine_amount = days_overdue * 5
-        
-        borrowing.fine_amount = fine_amount
-        borrowing.fine_paid = True
-        total_paid += fine_amount
+        total_paid += owed.get(borrowing.id, 0)
+        record_fine_payment(borrowing, owed.get(borrowing.id, 0), payment_method)
     
     db.session.commit()
     
@@ -592,7 +587,7 @@ def verify_transaction_code():
     db.session.commit()
     
     # Get transaction details
-    borrowing = verification.borrowing
+    borrowing = verification.loan
     transaction_type = verification.transaction_type.title()
     
     flash(f'✓ Verification successful! {transaction_type} transaction for "{borrowing.book.title}" has been verified.', 'success')
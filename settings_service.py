@@ -0,0 +1,131 @@
+"""
+Settings Service Module
+Per-worker snapshot of the settings table. The snapshot is loaded in one query
+and reloaded only when the shared settings version row changes, so business
+rules can read settings on every request without touching the database.
+"""
+
+import time
+from threading import Lock
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Setting
+
+
+class SettingsSnapshot:
+    """
+    All settings as a dict, reloaded when Setting.VERSION_KEY changes
+
+    Each worker compares its copy's version with the database at most once
+    every `check_interval` seconds. Commits made by this worker expire the
+    snapshot immediately.
+    """
+
+    def __init__(self, check_interval=30):
+        self.check_interval = check_interval
+        self._lock = Lock()
+        self._values = None
+        self._checked_at = 0
+
+    def _load(self):
+        # The version row is loaded with the rest, so a reload costs one query
+        self._values = dict(db.session.query(Setting.key, Setting.value).all())
+        self._checked_at = time.monotonic()
+
+    def values(self):
+        with self._lock:
+            if self._values is None:
+                self._load()
+            elif time.monotonic() - self._checked_at >= self.check_interval:
+                version = db.session.query(Setting.value).filter_by(key=Setting.VERSION_KEY).scalar()
+                if version != self._values.get(Setting.VERSION_KEY):
+                    self._load()
+                else:
+                    self._checked_at = time.monotonic()
+            return self._values
+
+    def expire(self):
+        with self._lock:
+            self._values = None
+
+
+def init_app(app):
+    """Attach an empty settings snapshot; it loads on first use"""
+    app.extensions['settings_cache'] = SettingsSnapshot(
+        check_interval=app.config.get('SETTINGS_CACHE_TTL', 30)
+    )
+
+
+def get_settings():
+    """Every setting as a key -> value dict, shared by the worker: do not modify"""
+    return current_app.extensions['settings_cache'].values()
+
+
+def get_setting(key, default=None, cast=None):
+    """
+    One setting from the snapshot
+
+    Args:
+        key: Setting key
+        default: Returned when the key is missing or cannot be converted
+        cast: Optional callable (e.g. int) applied to the stored string
+    """
+    value = get_settings().get(key)
+    if value is None or value == '':
+        return default
+    if cast is None:
+        return value
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return default
+
+
+# ==================== BUSINESS RULES ====================
+
+def loan_days():
+    """Length of a loan, in days"""
+    return get_setting('max_borrow_days', current_app.config.get('MAX_BORROW_DAYS', 14), int)
+
+
+def renewal_days():
+    """Days a renewal adds to the loan; one loan period until an admin sets it"""
+    return get_setting('renewal_period', loan_days(), int)
+
+
+def max_renewals():
+    """Times a patron may renew the same loan"""
+    return get_setting('max_renewals', current_app.config.get('MAX_RENEWALS', 2), int)
+
+
+def max_books_per_user():
+    """Concurrent loans allowed to patrons without a plan limit"""
+    return get_setting('max_books_per_user', current_app.config.get('MAX_BOOKS_PER_USER', 5), int)
+
+
+def fine_per_day():
+    """Fine charged per overdue day"""
+    return get_setting('fine_per_day', float(current_app.config.get('FINE_PER_DAY', 5)), float)
+
+
+# ==================== LOCAL INVALIDATION ====================
+
+@event.listens_for(Session, 'after_flush')
+def _note_settings_change(session, flush_context):
+    if any(isinstance(obj, Setting) for obj in list(session.new) + list(session.dirty) + list(session.deleted)):
+        session.info['settings_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _expire_snapshot(session):
+    if session.info.pop('settings_changed', False) and has_app_context() \
+            and 'settings_cache' in current_app.extensions:
+        current_app.extensions['settings_cache'].expire()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_settings_change(session):
+    session.info.pop('settings_changed', None)
@@ -0,0 +1,493 @@
+"""
+Shared Cache Service Module
+Two-level cache for derived page data: a per-worker LRU (L1) in front of Redis
+(L2), with tag-based invalidation broadcast to every worker over Redis pub/sub,
+single-flight recomputation and probabilistic early refresh.
+Without a Redis URL the cache runs L1-only.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import pickle
+import random
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-flight falls back to per-process locks
+    fcntl = None
+
+from models import db, Book, BookCopy, Borrowing, Reservation, Review, User, Category, Department
+
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = 'cache-invalidation'
+
+# Committing a change to one of these models invalidates every entry with the tag
+MODEL_TAGS = {
+    Book: ('catalog',),
+    BookCopy: ('catalog',),
+    Review: ('catalog',),
+    Category: ('catalog',),
+    Department: ('catalog',),
+    Borrowing: ('circulation',),
+    Reservation: ('circulation',),
+    User: ('users',),
+}
+
+
+class LRUCache:
+    """Per-worker least-recently-used cache; entries carry an expiry and tags"""
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, tags, value)
+
+    def get(self, key):
+        """Return (found, value)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if time.monotonic() >= entry[0]:
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry[2]
+
+    def set(self, key, value, ttl, tags=()):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, frozenset(tags), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_tags(self, tags):
+        """Drop every entry carrying any of `tags`"""
+        tags = set(tags)
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[1] & tags]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+Entry = namedtuple('Entry', 'value tags expires_at delta')
+
+
+class TieredCache:
+    """
+    L1 LRU per worker, backed by Redis shared by all workers.
+
+    Values are pickled into Redis with their tags; each tag keeps a Redis set of
+    the keys that carry it. Invalidating a tag deletes those keys and publishes
+    the tag so every worker drops its L1 copies. Redis errors degrade to L1-only
+    behaviour instead of failing the request.
+
+    get_or_set() protects expensive loaders from stampedes: entries are refreshed
+    early with probability rising towards expiry (XFetch), only the worker
+    holding the key's single-flight lock recomputes, and the others keep serving
+    the stale copy for up to `stale_ttl` seconds.
+    """
+
+    def __init__(self, redis_client=None, namespace='library', default_ttl=300,
+                 l1_maxsize=1000, l1_ttl=30, stale_ttl=60, lock_timeout=10):
+        self.redis = redis_client
+        self.namespace = namespace
+        self.default_ttl = default_ttl
+        self.l1_ttl = l1_ttl
+        self.stale_ttl = stale_ttl
+        self.lock_timeout = lock_timeout
+        self.l1 = LRUCache(l1_maxsize)
+        self.worker_id = uuid.uuid4().hex
+        self._listener_pid = None
+
+    def _key(self, key):
+        return f'{self.namespace}:{key}'
+
+    def _tag_key(self, tag):
+        return f'{self.namespace}:tag:{tag}'
+
+    def _read(self, key):
+        """Entry for `key` (possibly past its logical expiry) or None"""
+        found, entry = self.l1.get(key)
+        if found or self.redis is None:
+            return entry
+
+        self._ensure_listener()
+        try:
+            raw = self.redis.get(self._key(key))
+        except Exception as e:
+            logger.warning('Shared cache read failed: %s', e)
+            return None
+        if raw is None:
+            return None
+        entry = pickle.loads(raw)
+        self._write_l1(key, entry)
+        return entry
+
+    def _write_l1(self, key, entry):
+        remaining = entry.expires_at + self.stale_ttl - time.time()
+        if remaining > 0:
+            self.l1.set(key, entry, min(remaining, self.l1_ttl), entry.tags)
+
+    def _write(self, key, entry, ttl):
+        self._write_l1(key, entry)
+        if self.redis is None:
+            return
+
+        self._ensure_listener()
+        try:
+            # Kept past its logical expiry so other workers can serve it while one refreshes
+            self.redis.set(self._key(key), pickle.dumps(entry), ex=ttl + self.stale_ttl)
+            for tag in entry.tags:
+                self.redis.sadd(self._tag_key(tag), self._key(key))
+                self.redis.expire(self._tag_key(tag), max(ttl, self.default_ttl) + self.stale_ttl)
+        except Exception as e:
+            logger.warning('Shared cache write failed: %s', e)
+
+    def get(self, key):
+        """Return (found, value); expired entries count as missing"""
+        entry = self._read(key)
+        if entry is None or time.time() >= entry.expires_at:
+            return False, None
+        return True, entry.value
+
+    def set(self, key, value, ttl=None, tags=(), delta=0):
+        ttl = ttl or self.default_ttl
+        self._write(key, Entry(value, tuple(tags), time.time() + ttl, delta), ttl)
+
+    def _compute(self, key, loader, ttl, tags):
+        started = time.time()
+        value = loader()
+        self.set(key, value, ttl, tags, delta=time.time() - started)
+        return value
+
+    def get_or_set(self, key, loader, ttl=None, tags=(), beta=1.0):
+        """
+        Cached value for `key`, computing and storing `loader()` when needed
+
+        Args:
+            key: Cache key
+            loader: Callable producing the value
+            ttl: Seconds the value is fresh (defaults to default_ttl)
+            tags: Invalidation tags
+            beta: Early-refresh eagerness; >1 refreshes earlier, 0 disables it
+        """
+        entry = self._read(key)
+        if entry is not None:
+            if not should_refresh(entry.expires_at, entry.delta, beta):
+                return entry.value
+            # Expiring or expired: one worker refreshes, the rest serve the stale copy
+            with self.single_flight(key, blocking=False) as leader:
+                if leader:
+                    return self._compute(key, loader, ttl, tags)
+            return entry.value
+
+        # Nothing to serve: wait for whoever is already computing, then re-read
+        with self.single_flight(key, blocking=True) as leader:
+            if leader:
+                found, value = self.get(key)
+                if found:
+                    return value
+            return self._compute(key, loader, ttl, tags)
+
+    @contextmanager
+    def single_flight(self, key, blocking=True):
+        """
+        Per-key lock shared by all workers: a Redis SET NX key, or a file lock
+        on this host when there is no Redis
+
+        Yields:
+            bool: True if this caller holds the lock. A blocking caller that
+            times out after `lock_timeout` seconds gets False.
+        """
+        if self.redis is not None:
+            lock = RedisLock(self.redis, self._key(f'lock:{key}'), self.lock_timeout)
+        else:
+            lock = FileLock(f'{self.namespace}:{key}')
+        acquired = lock.acquire(blocking, self.lock_timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
+
+    def delete(self, key):
+        self.l1.delete(key)
+        if self.redis is not None:
+            try:
+                self.redis.delete(self._key(key))
+            except Exception as e:
+                logger.warning('Shared cache delete failed: %s', e)
+
+    def invalidate_tags(self, *tags):
+        """Drop every entry with any of `tags`, in Redis and in every worker's L1"""
+        self.l1.delete_tags(tags)
+        if self.redis is None or not tags:
+            return
+        try:
+            for tag in tags:
+                keys = self.redis.smembers(self._tag_key(tag))
+                if keys:
+                    self.redis.delete(*keys)
+                self.redis.delete(self._tag_key(tag))
+            self.redis.publish(self._key(INVALIDATION_CHANNEL), json.dumps({
+                'origin': self.worker_id, 'tags': list(tags)
+            }))
+        except Exception as e:
+            logger.warning('Shared cache invalidation failed: %s', e)
+
+    def handle_message(self, message):
+        """Apply an invalidation broadcast from another worker"""
+        if message.get('type') != 'message':
+            return
+        payload = json.loads(message['data'])
+        if payload.get('origin') != self.worker_id:
+            self.l1.delete_tags(payload.get('tags', ()))
+
+    def _ensure_listener(self):
+        """Start the pub/sub listener once per process (threads do not survive a fork)"""
+        if self._listener_pid == os.getpid() or not hasattr(self.redis, 'pubsub'):
+            return
+        self._listener_pid = os.getpid()
+        threading.Thread(target=self._listen, name='cache-invalidation', daemon=True).start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._key(INVALIDATION_CHANNEL))
+                # Broadcasts may have been missed while (re)connecting
+                self.l1.clear()
+                for message in pubsub.listen():
+                    self.handle_message(message)
+            except Exception as e:
+                logger.warning('Cache invalidation listener reconnecting: %s', e)
+                time.sleep(1)
+
+
+# ==================== STAMPEDE PROTECTION ====================
+
+LOCK_POLL_INTERVAL = 0.05
+
+
+def should_refresh(expires_at, delta, beta=1.0, now=None):
+    """
+    Probabilistic early expiration (XFetch)
+
+    Returns True once expired, and before that with a probability that grows as
+    expiry nears and with how long the value took to compute (`delta` seconds).
+    """
+    now = time.time() if now is None else now
+    return now - delta * beta * math.log(1.0 - random.random()) >= expires_at
+
+
+class RedisLock:
+    """SET NX lock with an expiry, so a crashed holder cannot block the key forever"""
+
+    def __init__(self, redis_client, name, ttl):
+        self.redis = redis_client
+        self.name = name
+        self.ttl = ttl
+        self.token = uuid.uuid4().hex
+
+    def acquire(self, blocking, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                if self.redis.set(self.name, self.token, nx=True, ex=self.ttl):
+                    return True
+            except Exception as e:
+                logger.warning('Single-flight lock unavailable: %s', e)
+                return False
+            if not blocking or time.monotonic() >= deadline:
+                return False
+            time.sleep(LOCK_POLL_INTERVAL)
+
+    def release(self):
+        try:
+            # Only delete our own lock; it may have expired and been taken over
+            if self.redis.get(self.name) in (self.token, self.token.encode()):
+                self.redis.delete(self.name)
+        except Exception as e:
+            logger.warning('Single-flight unlock failed: %s', e)
+
+
+class RedisStore:
+    """
+    TTLCache-compatible store kept only in Redis, for values every worker must
+    see at once (no L1 copy); add() is an atomic SET NX. When Redis fails the
+    operation falls back to the per-worker `fallback` cache.
+    """
+
+    def __init__(self, redis_client, prefix, ttl, fallback):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.fallback = fallback
+
+    def _key(self, key):
+        return f'{self.prefix}:{key}'
+
+    def get(self, key):
+        try:
+            raw = self.redis.get(self._key(key))
+        except Exception as e:
+            logger.warning('Shared store read failed: %s', e)
+            return self.fallback.get(key)
+        return None if raw is None else pickle.loads(raw)
+
+    def set(self, key, value):
+        try:
+            self.redis.set(self._key(key), pickle.dumps(value), ex=self.ttl)
+        except Exception as e:
+            logger.warning('Shared store write failed: %s', e)
+            self.fallback.set(key, value)
+
+    def add(self, key, value):
+        """Set `key` only if it is absent; returns True if it was set"""
+        try:
+            return bool(self.redis.set(self._key(key), pickle.dumps(value), nx=True, ex=self.ttl))
+        except Exception as e:
+            logger.warning('Shared store write failed: %s', e)
+            return self.fallback.add(key, value)
+
+    def delete(self, key):
+        try:
+            self.redis.delete(self._key(key))
+        except Exception as e:
+            logger.warning('Shared store delete failed: %s', e)
+        self.fallback.delete(key)
+
+
+_process_locks = {}
+_process_locks_guard = threading.Lock()
+
+
+class FileLock:
+    """
+    flock()-based lock shared by the worker processes of one host; where flock
+    is unavailable it only covers the threads of this process
+    """
+
+    def __init__(self, name):
+        digest = hashlib.sha1(name.encode()).hexdigest()
+        self.path = os.path.join(tempfile.gettempdir(), f'library-cache-{digest}.lock')
+        self._file = None
+        self._lock = None
+
+    def acquire(self, blocking, timeout):
+        if fcntl is None:
+            with _process_locks_guard:
+                self._lock = _process_locks.setdefault(self.path, threading.Lock())
+            return self._lock.acquire(blocking, timeout if blocking else -1)
+
+        self._file = open(self.path, 'a')
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if not blocking or time.monotonic() >= deadline:
+                    self._file.close()
+                    return False
+                time.sleep(LOCK_POLL_INTERVAL)
+
+    def release(self):
+        if self._lock is not None:
+            self._lock.release()
+            return
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+def _redis_client(url):
+    """Redis client for `url`; fakeredis:// selects the optional in-process stand-in"""
+    if not url:
+        return None
+    if url.startswith('fakeredis://'):
+        try:
+            import fakeredis
+        except ImportError:
+            logger.warning('fakeredis is not installed; shared cache runs L1-only')
+            return None
+        return fakeredis.FakeRedis()
+
+    import redis
+    return redis.Redis.from_url(url, socket_timeout=0.5)
+
+
+def init_app(app):
+    """Attach the shared cache; Redis is used when CACHE_TYPE is 'redis'"""
+    url = app.config.get('CACHE_REDIS_URL') if app.config.get('CACHE_TYPE') == 'redis' else None
+    app.extensions['shared_cache'] = TieredCache(
+        _redis_client(url),
+        namespace=app.config.get('SHARED_CACHE_NAMESPACE', 'library'),
+        default_ttl=app.config.get('SHARED_CACHE_TTL', 300),
+        l1_maxsize=app.config.get('SHARED_CACHE_L1_SIZE', 1000),
+        l1_ttl=app.config.get('SHARED_CACHE_L1_TTL', 30),
+        stale_ttl=app.config.get('SHARED_CACHE_STALE_TTL', 60)
+    )
+
+
+def shared_cache():
+    return current_app.extensions['shared_cache']
+
+
+def cached(key, loader, ttl=None, tags=()):
+    """Value for `key` from the shared cache, built by `loader()` on a miss"""
+    return shared_cache().get_or_set(key, loader, ttl, tags)
+
+
+def invalidate_tags(*tags):
+    """Call after writes the ORM events below cannot see (bulk/Core updates)"""
+    if has_app_context() and 'shared_cache' in current_app.extensions:
+        shared_cache().invalidate_tags(*tags)
+
+
+def invalidate_tags_on_commit(*tags):
+    """invalidate_tags() once the current transaction commits; dropped on rollback"""
+    db.session.info.setdefault('cache_tags', set()).update(tags)
+
+
+# ==================== ORM-DRIVEN INVALIDATION ====================
+
+@event.listens_for(Session, 'after_flush')
+def _collect_tags(session, flush_context):
+    tags = session.info.setdefault('cache_tags', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        tags.update(MODEL_TAGS.get(type(obj), ()))
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        invalidate_tags(*tags)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_tags(session):
+    session.info.pop('cache_tags', None)
@@ -0,0 +1,91 @@
+"""
+Book Payload Cache Tests
+Cached per-book JSON fragments and their invalidation through updated_at
+"""
+
+from sqlalchemy import func, Numeric
+
+import book_payload_service
+from models import db, Book, Review, User
+
+
+class DecimalAverages:
+    """`func` whose avg() comes back as Decimal, as AVG() does on PostgreSQL"""
+
+    def __getattr__(self, name):
+        if name == 'avg':
+            return lambda column: func.avg(column, type_=Numeric(asdecimal=True))
+        return getattr(func, name)
+
+
+def test_list_is_assembled_from_cached_fragments(client, count_queries):
+    first = client.get('/api/books?per_page=5')
+    with count_queries() as warm:
+        second = client.get('/api/books?per_page=5')
+
+    assert first.get_json() == second.get_json()
+    body = second.get_json()
+    assert len(body['books']) == 5 and body['total'] == 15 and body['current_page'] == 1
+    assert set(body['books'][0]) >= {'id', 'title', 'available', 'rating'}
+    assert not any('reviews' in statement for statement in warm.statements)
+
+
+def test_review_and_edit_refresh_the_fragment(app, client):
+    before = client.get('/api/books/1').get_json()
+
+    with app.app_context():
+        student = User.query.filter_by(user_id='STU001').first()
+        db.session.add(Review(user_id=student.id, book_id=1, rating=5))
+        db.session.commit()
+    rated = client.get('/api/books/1').get_json()
+    assert rated['rating'] > before['rating']
+
+    with app.app_context():
+        db.session.get(Book, 1).available_copies -= 1
+        db.session.commit()
+    assert client.get('/api/books/1').get_json()['available_copies'] == before['available_copies'] - 1
+
+
+def test_search_keeps_its_own_shape(client):
+    body = client.get('/api/search?q=Seed').get_json()
+    assert body['books'][0]['category']
+    assert 'rating' not in body['books'][0]
+    assert 'authors' in body and 'categories' in body
+
+
+def test_sparse_fields_skip_unrequested_columns(client, count_queries):
+    with count_queries() as sparse:
+        body = client.get('/api/books?fields=id,title,available&per_page=3').get_json()
+
+    assert body['books'][0] == {'id': 1, 'title': 'Seed Book 000', 'available': True}
+    assert body['total'] == 15
+    assert not any('reviews' in statement for statement in sparse.statements)
+    page_query = next(statement for statement in sparse.statements if 'LIMIT' in statement)
+    assert 'books.description' not in page_query and 'books.title' in page_query
+
+    assert client.get('/api/books?fields=id,password').status_code == 400
+
+
+def test_batch_by_ids_keeps_request_order(client, count_queries):
+    with count_queries() as batch:
+        body = client.get('/api/books?ids=9,1,5,9999&fields=id,available_copies').get_json()
+
+    assert [book['id'] for book in body['books']] == [9, 1, 5]
+    assert body['missing'] == [9999]
+    assert batch.count == 2  # catalog validator + one projected SELECT
+
+    assert client.get('/api/books?ids=1,x').status_code == 400
+
+
+def test_decimal_averages_serialize(app, client, monkeypatch):
+    monkeypatch.setattr(book_payload_service, 'func', DecimalAverages())
+    with app.app_context():
+        student = User.query.filter_by(user_id='STU001').first()
+        db.session.add(Review(user_id=student.id, book_id=1, rating=4))
+        db.session.commit()
+
+    rating = client.get('/api/books/1').get_json()['rating']
+    assert isinstance(rating, float) and rating > 0
+    assert client.get('/api/books?per_page=2').get_json()['books'][0]['rating'] == rating
+    assert client.get('/api/books?ids=1&fields=id,rating').get_json()['books'] == [{'id': 1, 'rating': rating}]
+    assert b'"rating"' in client.get('/api/books/dump').data
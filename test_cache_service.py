@@ -0,0 +1,73 @@
+"""
+Cache Service Tests
+Per-worker lookup and user principal caches and their invalidation
+"""
+
+from cache_service import (
+    LOOKUP_VERSION_KEY, VersionedCache, get_active_categories, get_active_departments,
+    invalidate_lookups, invalidate_user, load_principal
+)
+from models import db, Category, User
+
+
+def test_lookups_served_without_queries(app, count_queries):
+    with app.test_request_context():
+        with count_queries() as counter:
+            categories = get_active_categories()
+            departments = get_active_departments()
+
+    assert counter.count == 0
+    assert 'Fiction' in [c.name for c in categories]
+    assert 'CSE' in [d.code for d in departments]
+
+
+def test_bump_invalidates_every_worker(app):
+    with app.test_request_context():
+        other_worker = VersionedCache(LOOKUP_VERSION_KEY, check_interval=0)
+        other_worker.get('categories', lambda: ['stale'])
+
+        db.session.add(Category(name='Poetry'))
+        db.session.commit()
+        invalidate_lookups()
+
+        assert 'Poetry' in [c.name for c in get_active_categories()]
+        assert other_worker.get('categories', lambda: ['fresh']) == ['fresh']
+
+
+def test_cached_principal_skips_user_select(client, login, count_queries):
+    login('STU001')
+    client.get('/user/dashboard')
+
+    with count_queries() as counter:
+        response = client.get('/user/dashboard')
+
+    assert response.status_code == 200
+    assert b'Seed Student' in response.data
+    assert not any('FROM users' in s and 'WHERE users.id' in s for s in counter.statements)
+
+
+def test_profile_update_invalidates_principal(app, client, login):
+    login('STU001')
+    client.get('/user/dashboard')
+
+    client.post('/user/profile', data={
+        'full_name': 'Renamed Student', 'email': 'student@library.com',
+        'phone': '', 'department': 'ECE', 'address': ''
+    })
+    response = client.get('/user/dashboard')
+
+    assert b'Renamed Student' in response.data
+    with app.app_context():
+        assert User.query.filter_by(user_id='STU001').first().department == 'ECE'
+
+
+def test_role_change_invalidates_principal(app, client, login):
+    student_pk = login('STU001')
+    client.get('/user/dashboard')
+
+    with app.test_request_context():
+        user = db.session.get(User, student_pk)
+        user.role = 'faculty'
+        db.session.commit()
+        invalidate_user(student_pk)
+        assert load_principal(student_pk).role == 'faculty'
@@ -0,0 +1,93 @@
+"""
+Catalog Change Feed Tests
+Keyset cursors over books.updated_at, deactivations and hard-delete tombstones
+"""
+
+import gzip
+import json
+
+import pytest
+
+from models import db, Book
+from inventory_service import ensure_copies, reconcile_available_copies
+
+
+@pytest.fixture
+def feed(app, client):
+    app.config['CHANGE_FEED_LAG'] = 0
+
+    def _feed(since='', limit=500):
+        response = client.get(f'/api/books/changes?since={since}&limit={limit}')
+        assert response.status_code == 200
+        return response.get_json()
+    return _feed
+
+
+def test_full_sync_then_deltas(app, feed):
+    first = feed(limit=10)
+    assert len(first['books']) == 10 and first['has_more']
+    rest = feed(first['cursor'])
+    assert len(rest['books']) == 5 and not rest['has_more']
+    assert feed(rest['cursor'])['books'] == []
+
+    with app.app_context():
+        db.session.get(Book, 2).available_copies = 0
+        db.session.get(Book, 3).is_active = False
+        db.session.delete(db.session.get(Book, 14))
+        db.session.commit()
+
+    delta = feed(rest['cursor'])
+    assert [book['id'] for book in delta['books']] == [2]
+    assert delta['books'][0]['available'] is False
+    assert sorted(delta['removed']) == [3, 14]
+    assert feed(delta['cursor']) == {'books': [], 'removed': [], 'cursor': delta['cursor'], 'has_more': False}
+
+
+def test_reconciled_counters_reach_the_feed(app, feed):
+    with app.app_context():
+        ensure_copies(db.session.get(Book, 5))
+        db.session.commit()
+    cursor = feed()['cursor']
+
+    with app.app_context():
+        db.session.execute(Book.__table__.update().where(Book.__table__.c.id == 5).values(available_copies=9))
+        db.session.commit()
+        assert reconcile_available_copies() == 1
+        db.session.commit()
+
+    delta = feed(cursor)
+    assert [book['id'] for book in delta['books']] == [5]
+    assert delta['books'][0]['available_copies'] != 9
+
+
+def test_recent_changes_wait_for_the_lag(app, client, feed):
+    cursor = feed()['cursor']
+    app.config['CHANGE_FEED_LAG'] = 60
+    with app.app_context():
+        db.session.get(Book, 5).title = 'Just Edited'
+        db.session.commit()
+    assert client.get(f'/api/books/changes?since={cursor}').get_json()['books'] == []
+
+
+def test_bad_cursor_is_rejected(client):
+    assert client.get('/api/books/changes?since=not-a-cursor').status_code == 400
+
+
+def test_dump_streams_ndjson(app, client, count_queries):
+    app.config['CATALOG_DUMP_BATCH_SIZE'] = 4
+    with count_queries() as dumped:
+        response = client.get('/api/books/dump')
+        lines = response.get_data().splitlines()
+    assert response.mimetype == 'application/x-ndjson'
+    assert len(lines) == 15
+    assert json.loads(lines[0])['id'] == 1
+    assert not any('count(' in statement.lower() for statement in dumped.statements)
+
+    fiction = client.get('/api/books/dump?category=Fiction').get_data().splitlines()
+    assert 0 < len(fiction) < 15
+
+
+def test_dump_can_be_gzipped(client):
+    response = client.get('/api/books/dump', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert len(gzip.decompress(response.get_data()).splitlines()) == 15
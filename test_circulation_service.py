@@ -0,0 +1,123 @@
+"""
+Circulation Desk Tests
+Batch check-out/check-in with per-item results and one notification per batch
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, User, Book, BookCopy, Borrowing, FineLedger, Notification, Reservation
+from fine_service import accrue_fines
+from inventory_service import ensure_copies
+
+
+@pytest.fixture
+def desk(app):
+    """Patron STU009 with no loans; Seed Book 011 has barcoded copies"""
+    with app.app_context():
+        user = User(user_id='STU009', email='stu009@library.com', full_name='Desk Patron',
+                    role='student', is_verified=True, is_active=True)
+        user.set_password('student123')
+        db.session.add(user)
+        ensure_copies(Book.query.filter_by(title='Seed Book 011').first())
+        db.session.commit()
+        return {
+            'isbn': Book.query.filter_by(title='Seed Book 010').first().isbn,
+            'barcode': BookCopy.query.order_by(BookCopy.id).first().barcode,
+            'user_pk': user.id,
+        }
+
+
+def _batch(client, action, items, user_id='STU009'):
+    return client.post('/admin/circulation/batch',
+                       json={'action': action, 'user_id': user_id, 'items': items}).get_json()
+
+
+def test_batch_checkout_and_checkin(app, client, login, desk):
+    login('ADMIN001')
+    data = _batch(client, 'checkout', [desk['isbn'], desk['barcode'], 'NO-SUCH-ITEM', desk['isbn']])
+
+    assert data['processed'] == 2
+    assert [r['success'] for r in data['results']] == [True, True, False]
+    assert data['results'][1]['barcode'] == desk['barcode']
+
+    with app.app_context():
+        assert Borrowing.query.filter_by(user_id=desk['user_pk'], status='borrowed').count() == 2
+        assert BookCopy.query.filter_by(barcode=desk['barcode']).one().status == 'on_loan'
+        assert Notification.query.filter_by(user_id=desk['user_pk']).count() == 1
+
+    data = _batch(client, 'checkin', [desk['barcode'], desk['isbn']])
+
+    assert data['processed'] == 2
+    with app.app_context():
+        assert Borrowing.query.filter_by(user_id=desk['user_pk'], status='borrowed').count() == 0
+        assert BookCopy.query.filter_by(barcode=desk['barcode']).one().status == 'available'
+        assert Book.query.filter_by(isbn=desk['isbn']).one().available_copies == 2
+        assert Notification.query.filter_by(user_id=desk['user_pk']).count() == 2
+
+
+def test_batch_respects_borrowing_limit(app, client, login, desk):
+    login('ADMIN001')
+    isbns = [f'978-0-{i:06d}' for i in range(5, 12)]
+    data = _batch(client, 'checkout', isbns)
+
+    assert data['processed'] == 5
+    assert 'limit' in data['results'][-1]['message']
+
+
+def test_batch_rejects_bad_requests(client, login, desk):
+    login('ADMIN001')
+    assert _batch(client, 'lend', ['x'])['success'] is False
+    assert _batch(client, 'checkout', ['x'], user_id='NOBODY')['message'] == 'Patron not found.'
+
+
+@pytest.mark.filterwarnings('error::sqlalchemy.exc.SAWarning')
+def test_patron_with_a_hold_may_take_a_shelf_copy(app, client, login, desk, count_queries):
+    with app.app_context():
+        book = Book.query.filter_by(title='Seed Book 011').first()
+        held, shelf = BookCopy.query.filter_by(book_id=book.id).order_by(BookCopy.id).limit(2).all()
+        held.status = 'on_hold'
+        book.available_copies -= 1
+        db.session.add(Reservation(user_id=desk['user_pk'], book_id=book.id, notified=True,
+                                   expiry_date=datetime.utcnow() + timedelta(days=2)))
+        db.session.commit()
+        held_id, shelf_barcode, available = held.id, shelf.barcode, book.available_copies
+        isbns = [f'978-0-{i:06d}' for i in (5, 6, 7)]
+        for other in Book.query.filter(Book.isbn.in_(isbns)):
+            ensure_copies(other)
+        db.session.commit()
+
+    login('ADMIN001')
+    with count_queries() as counter:
+        data = _batch(client, 'checkout', [shelf_barcode] + isbns)
+
+    assert [r['success'] for r in data['results']] == [True] * 4
+    assert all(r['barcode'] for r in data['results'])
+    # One claim for all four shelf copies, one release of the held copy
+    assert sum(s.startswith('UPDATE book_copies') for s in counter.statements) == 2
+    with app.app_context():
+        book = Book.query.filter_by(title='Seed Book 011').first()
+        assert BookCopy.query.filter_by(barcode=shelf_barcode).one().status == 'on_loan'
+        assert db.session.get(BookCopy, held_id).status == 'available'
+        assert book.available_copies == available
+        assert Reservation.query.filter_by(user_id=desk['user_pk']).one().status == 'fulfilled'
+
+
+def test_checkin_email_shows_what_is_still_owed(app, client, login, monkeypatch):
+    sent = []
+    monkeypatch.setattr('routes.admin.send_email', lambda subject, to, text, html: sent.append(html))
+    with app.app_context():
+        loan = Borrowing.query.filter(Borrowing.status == 'borrowed',
+                                      Borrowing.due_date < datetime.utcnow()).first()
+        accrue_fines(borrowing_id=loan.id)
+        db.session.add(FineLedger(borrowing_id=loan.id, user_id=loan.user_id,
+                                  entry_type='waiver', amount=10))
+        db.session.commit()
+        isbn, owed = loan.book.isbn, loan.fine_amount - 10
+
+    login('ADMIN001')
+    data = _batch(client, 'checkin', [isbn], user_id='STU001')
+
+    assert data['results'][0]['fine'] == owed
+    assert f'₹{owed}<' in sent[0] and f'₹{owed + 10}<' not in sent[0]
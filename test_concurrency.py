@@ -0,0 +1,82 @@
+"""
+Optimistic Concurrency Tests
+version_id checks on circulation rows, conflict retries and admin edit conflicts
+"""
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm.exc import StaleDataError
+
+from models import db, Book
+from circulation_service import retry_on_conflict
+
+
+def _concurrent_bump(book_id):
+    """Simulate another worker committing a change to the book row"""
+    db.session.execute(
+        text('UPDATE books SET version_id = version_id + 1 WHERE id = :id'), {'id': book_id}
+    )
+
+
+def test_stale_write_is_rejected(app):
+    with app.app_context():
+        book = db.session.get(Book, 1)
+        _concurrent_bump(book.id)
+
+        book.available_copies -= 1
+        with pytest.raises(StaleDataError):
+            db.session.commit()
+
+
+def test_circulation_write_retries_after_conflict(app):
+    attempts = []
+
+    @retry_on_conflict
+    def take_copy():
+        book = db.session.get(Book, 1)
+        if not attempts:
+            _concurrent_bump(book.id)
+        attempts.append(book.version_id)
+        book.available_copies -= 1
+        db.session.commit()
+        return book.available_copies
+
+    with app.test_request_context():
+        assert take_copy() == 1
+        assert len(attempts) == 2
+
+
+def test_admin_edit_with_stale_version_conflicts(app, client, login):
+    login('ADMIN001')
+    with app.app_context():
+        version = db.session.get(Book, 1).version_id
+
+    response = client.post('/admin/books/1/edit', data={
+        'title': 'Renamed', 'author': 'Someone', 'total_copies': 2, 'version_id': version - 1,
+    })
+
+    assert response.status_code == 409
+    with app.app_context():
+        assert db.session.get(Book, 1).title != 'Renamed'
+
+
+def test_admin_edit_conflict_during_copy_update(app, client, login, monkeypatch):
+    import routes.admin
+    real_set_total_copies = routes.admin.set_total_copies
+
+    def set_total_copies(book, new_total):
+        _concurrent_bump(book.id)  # another admin commits right after the version check
+        return real_set_total_copies(book, new_total)
+
+    monkeypatch.setattr(routes.admin, 'set_total_copies', set_total_copies)
+    login('ADMIN001')
+    with app.app_context():
+        version = db.session.get(Book, 1).version_id
+
+    response = client.post('/admin/books/1/edit', data={
+        'title': 'Renamed', 'author': 'Someone', 'total_copies': 3, 'version_id': version,
+    })
+
+    assert response.status_code == 409
+    with app.app_context():
+        assert db.session.get(Book, 1).title != 'Renamed'
@@ -0,0 +1,115 @@
+"""
+Fine Service Tests
+Set-based accrual, plan exemptions and the fine ledger
+"""
+
+from datetime import datetime, timedelta
+
+from models import db, User, Borrowing, FineLedger, Subscription, SubscriptionPlan, Setting
+from fine_service import accrue_fines, unpaid_fine_amount
+from patron_service import get_patron_status
+
+
+def _overdue_loans():
+    return Borrowing.query.filter(
+        Borrowing.status == 'borrowed',
+        Borrowing.due_date < datetime.utcnow()
+    ).all()
+
+
+def test_accrual_updates_column_and_ledger(app, count_queries):
+    with app.app_context():
+        Setting.set('fine_per_day', '2.5')
+
+        with count_queries() as counter:
+            changed = accrue_fines()
+        db.session.commit()
+
+        assert changed == 2
+        assert counter.count == 3  # rate lookup, ledger insert, update
+        for loan in _overdue_loans():
+            assert loan.fine_amount == loan.days_overdue() * 2.5
+        assert FineLedger.query.filter_by(entry_type='accrual').count() == 2
+
+        # Nothing changed since the last run: no new ledger rows
+        assert accrue_fines() == 0
+        assert FineLedger.query.count() == 2
+
+
+def test_no_late_fees_plan_is_exempt(app):
+    with app.app_context():
+        user = User.query.filter_by(user_id='STU001').first()
+        plan = SubscriptionPlan(name='VIP', price_monthly=1, price_yearly=10, no_late_fees=True)
+        db.session.add(plan)
+        db.session.flush()
+        db.session.add(Subscription(user_id=user.id, plan_id=plan.id, duration_months=1,
+                                    amount_paid=1, end_date=datetime.utcnow() + timedelta(days=30)))
+        db.session.commit()
+
+        assert accrue_fines() == 0
+        assert all(loan.fine_amount == 0 for loan in _overdue_loans())
+
+
+def test_pay_all_fines_records_payments(app, client, login):
+    login('STU001')
+    client.post('/user/fines/pay-all', data={'payment_method': 'upi'})
+
+    with app.app_context():
+        loans = _overdue_loans()
+        payments = FineLedger.query.filter_by(entry_type='payment').all()
+        assert all(loan.fine_paid for loan in loans)
+        assert sum(p.amount for p in payments) == sum(loan.fine_amount for loan in loans) > 0
+        assert {p.payment_method for p in payments} == {'upi'}
+
+
+def test_paid_loans_keep_accruing_while_overdue(app, client, login):
+    login('STU001')
+    client.post('/user/fines/pay-all', data={'payment_method': 'cash'})
+
+    with app.app_context():
+        user = User.query.filter_by(user_id='STU001').first()
+        loan = _overdue_loans()[0]
+        paid = loan.fine_amount
+        assert loan.fine_paid and unpaid_fine_amount(loan) == 0
+        # Paying does not clear the patron while the book is still out
+        assert get_patron_status(user.id).has_fines
+
+        assert accrue_fines(now=loan.due_date + timedelta(days=loan.days_overdue() + 2)) == 2
+        db.session.commit()
+
+        loan = db.session.get(Borrowing, loan.id)
+        assert not loan.fine_paid
+        assert unpaid_fine_amount(loan) == loan.fine_amount - paid == 10
+        assert all(entry.amount > 0 for entry in FineLedger.query)
+
+
+def test_overdue_notice_quotes_the_configured_rate(app, monkeypatch):
+    import email_service
+    sent = []
+    monkeypatch.setattr(email_service, 'render_template', lambda template, **context: '')
+    monkeypatch.setattr(email_service, 'send_email', lambda subject, to, text, html: sent.append(text))
+    with app.app_context():
+        Setting.set('fine_per_day', '2')
+        accrue_fines()
+        db.session.commit()
+        loan = _overdue_loans()[0]
+
+        email_service.send_overdue_notice(loan.user, loan)
+
+        assert loan.fine_amount == loan.days_overdue() * 2
+        assert f'₹{loan.fine_amount}' in sent[0]
+
+
+def test_api_borrowings_report_what_is_still_owed(app, client, login):
+    with app.app_context():
+        accrue_fines()
+        loan = _overdue_loans()[0]
+        db.session.add(FineLedger(borrowing_id=loan.id, user_id=loan.user_id,
+                                  entry_type='waiver', amount=10))
+        db.session.commit()
+        loan_id, owed = loan.id, loan.fine_amount - 10
+
+    login('STU001')
+    fines = {b['id']: b['fine'] for b in client.get('/api/user/borrowings').get_json()}
+
+    assert fines[loan_id] == owed
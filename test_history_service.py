@@ -0,0 +1,88 @@
+"""
+Borrowing History Tests
+Archiving settled loans and reading live + archived loans together
+"""
+
+from datetime import datetime, timedelta
+
+from models import db, User, Borrowing, BorrowingHistory, FineLedger
+from history_service import archive_borrowings, paginate_loan_history, count_loans
+
+
+def _student():
+    return User.query.filter_by(user_id='STU001').first()
+
+
+def test_archive_moves_settled_loans(app):
+    with app.app_context():
+        user = _student()
+        unpaid = Borrowing.query.filter_by(user_id=user.id, status='returned').first()
+        unpaid.fine_amount = 15
+        db.session.add(FineLedger(borrowing_id=unpaid.id, user_id=user.id,
+                                  entry_type='accrual', amount=15))
+        paid = Borrowing.query.filter(Borrowing.status == 'returned', Borrowing.id != unpaid.id).first()
+        paid.fine_amount, paid.fine_paid = 10, True
+        db.session.add(FineLedger(borrowing_id=paid.id, user_id=user.id,
+                                  entry_type='payment', amount=10))
+        db.session.commit()
+        paid_id = paid.id
+
+        assert archive_borrowings(days=30, batch_size=2) == 3
+        assert archive_borrowings(days=30) == 0
+
+        assert Borrowing.query.filter_by(status='returned').count() == 1
+        assert BorrowingHistory.query.count() == 3
+        ledger = FineLedger.query.filter_by(entry_type='payment').one()
+        assert ledger.loan.id == paid_id
+        assert ledger.loan.book.title.startswith('Seed Book')
+
+
+def test_recent_loans_are_kept(app):
+    with app.app_context():
+        assert archive_borrowings(days=60) == 0
+        assert archive_borrowings(days=30, now=datetime.utcnow() - timedelta(days=20)) == 0
+
+
+def test_history_reads_both_tables(app, client, login):
+    with app.app_context():
+        archive_borrowings(days=30)
+        user = _student()
+        assert count_loans(user.id) == 8
+
+        with app.test_request_context('/user/borrowings'):
+            page = paginate_loan_history(user.id, per_page=5)
+            assert page.total == 8
+            assert len(page.items) == 5
+            assert [type(loan) for loan in page.items] == [Borrowing] * 4 + [BorrowingHistory]
+            dates = [loan.borrow_date for loan in page.items]
+            assert dates == sorted(dates, reverse=True)
+
+            archived = paginate_loan_history(user.id, status='returned')
+            assert [type(loan) for loan in archived.items] == [BorrowingHistory] * 4
+
+    login('STU001')
+    response = client.get('/user/borrowings?status=returned')
+    assert response.status_code == 200
+    assert response.data.count(b'Seed Book') >= 4
+
+
+def test_ids_of_archived_loans_are_not_reused(app):
+    with app.app_context():
+        user = _student()
+        newest = Borrowing.query.order_by(Borrowing.id.desc()).first()
+        newest.status = 'returned'
+        newest.return_date = datetime.utcnow() - timedelta(days=60)
+        db.session.commit()
+        archived_id, book_id = newest.id, newest.book_id
+        archive_borrowings(days=30)
+
+        loan = Borrowing(user_id=user.id, book_id=book_id, status='returned',
+                         due_date=datetime.utcnow() - timedelta(days=70),
+                         return_date=datetime.utcnow() - timedelta(days=60))
+        db.session.add(loan)
+        db.session.commit()
+        loan_id = loan.id
+        assert loan_id > archived_id
+
+        archive_borrowings(days=30)
+        assert db.session.get(BorrowingHistory, loan_id) is not None
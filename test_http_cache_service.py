@@ -0,0 +1,43 @@
+"""
+Conditional GET Tests
+ETag / Last-Modified validators and 304 short-circuits on the read-only APIs
+"""
+
+from models import db, Book
+
+
+def test_book_list_revalidates_without_the_main_query(app, client, count_queries):
+    first = client.get('/api/books')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert first.headers['Last-Modified']
+
+    with count_queries() as polled:
+        response = client.get('/api/books', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert polled.count == 1
+
+    with app.app_context():
+        db.session.get(Book, 3).available_copies -= 1
+        db.session.commit()
+    changed = client.get('/api/books', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+
+def test_book_detail_honours_if_modified_since(client):
+    first = client.get('/api/books/1')
+    response = client.get('/api/books/1', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert response.status_code == 304
+    assert client.get('/api/books/9999').status_code == 404
+
+
+def test_lookups_and_stats_are_conditional(client, count_queries):
+    for url in ('/api/categories', '/api/departments', '/api/stats'):
+        first = client.get(url)
+        assert first.status_code == 200
+        with count_queries() as polled:
+            response = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+        assert response.status_code == 304
+        assert polled.count == 0
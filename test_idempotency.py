@@ -0,0 +1,78 @@
+"""
+Idempotency Key Tests
+Repeated circulation POSTs replay the stored response instead of redoing the work
+"""
+
+from cache_service import TTLCache
+from models import db, Borrowing, Book
+from test_shared_cache_service import StandInRedis
+
+
+def _loans(book_id):
+    return Borrowing.query.filter_by(book_id=book_id).count()
+
+
+def test_repeated_key_replays_response(app, client, login, count_queries):
+    login('STU001')
+    headers = {'Idempotency-Key': 'borrow-10-once'}
+
+    first = client.post('/books/10/borrow', headers=headers)
+    with count_queries() as counter:
+        second = client.post('/books/10/borrow', headers=headers)
+
+    assert second.status_code == first.status_code
+    assert second.headers['Location'] == first.headers['Location']
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert counter.count <= 1  # at most the user load
+    with app.app_context():
+        assert _loans(10) == 1
+        assert db.session.get(Book, 10).available_copies == 1
+
+
+def test_keys_are_scoped_to_the_url(app, client, login):
+    login('STU001')
+    client.post('/books/10/borrow', data={'idempotency_key': 'same'})
+    response = client.post('/books/11/reserve', data={'idempotency_key': 'same'})
+
+    assert 'Idempotent-Replayed' not in response.headers
+
+
+def test_requests_without_a_key_run_normally(app, client, login):
+    login('STU001')
+    client.post('/books/10/borrow')
+    response = client.post('/books/10/borrow')
+
+    assert 'Idempotent-Replayed' not in response.headers
+    with app.app_context():
+        assert _loans(10) == 1
+
+
+def test_keys_are_shared_between_workers_through_redis(app, client, login):
+    app.extensions['shared_cache'].redis = StandInRedis()
+    login('STU001')
+    headers = {'Idempotency-Key': 'borrow-10-shared'}
+
+    first = client.post('/books/10/borrow', headers=headers)
+    # The retry lands on another worker with an empty local cache
+    app.extensions['idempotency_cache'] = TTLCache(ttl=600)
+    second = client.post('/books/10/borrow', headers=headers)
+
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert second.headers['Location'] == first.headers['Location']
+    with app.app_context():
+        assert _loans(10) == 1
+
+
+def test_full_local_cache_keeps_in_flight_markers(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr('cache_service.time.monotonic', lambda: clock[0])
+    cache = TTLCache(ttl=10, maxsize=3)
+    cache.add('old', 'in-flight')
+    clock[0] = 5
+    cache.add('a', 'in-flight')
+    cache.add('b', 'in-flight')
+    clock[0] = 11  # only 'old' has expired
+
+    assert cache.add('c', 'in-flight')
+    assert cache.get('old') is None
+    assert [cache.get(key) for key in 'abc'] == ['in-flight'] * 3
@@ -0,0 +1,66 @@
+"""
+Index Advisor Tests
+Statement fingerprints, EXPLAIN-driven proposals and migration output
+"""
+
+from flask_migrate import init
+from sqlalchemy import text, func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, Borrowing, Notification
+from index_advisor import (fingerprint, analyse_statement, run_benchmark, propose_indexes, write_migration,
+                           _sql_literal)
+
+
+def test_fingerprint_ignores_values():
+    first = fingerprint("SELECT * FROM books WHERE books.id IN (1, 2, 3) AND books.title = 'A'")
+    second = fingerprint("SELECT *  FROM books\n WHERE books.id IN (7) AND books.title = 'It''s'")
+    assert first == second == 'SELECT * FROM books WHERE books.id IN (?) AND books.title = ?'
+
+
+def test_analyse_statement_resolves_aliases():
+    shape = analyse_statement(
+        'SELECT b.id FROM borrowings AS b JOIN books AS books_1 ON books_1.id = b.book_id '
+        'WHERE b.user_id = ? AND b.status = ? AND b.due_date < ? ORDER BY b.borrow_date DESC'
+    )
+    assert shape['borrowings'] == {'eq': ['user_id', 'status'], 'range': ['due_date'], 'order': ['borrow_date']}
+
+
+def test_partial_index_literals_follow_the_dialect():
+    assert _sql_literal(True, postgresql.dialect()) == 'true'
+    assert _sql_literal(True, sqlite.dialect()) == '1'
+    assert _sql_literal("it's", postgresql.dialect()) == "'it''s'"
+
+
+def test_missing_index_is_proposed(app, tmp_path):
+    with app.app_context():
+        db.session.execute(text('DROP INDEX ix_borrowings_status_due_date'))
+        db.session.commit()
+
+    log = run_benchmark(app, [('/admin/borrowings?overdue=yes', 'admin')])
+    proposals = propose_indexes(app, log)
+    overdue = [p for p in proposals if p.table == 'borrowings' and p.columns[-1] == 'due_date']
+    assert overdue and overdue[0].where == "status = 'borrowed'"
+
+    directory = str(tmp_path / 'migrations')
+    with app.app_context():
+        init(directory=directory)
+    path = write_migration(app, overdue, directory=directory)
+    script = open(path).read()
+    assert "op.create_index('ix_borrowings_due_date_status_borrowed', 'borrowings', ['due_date']" in script
+    assert "sqlite_where=sa.text(\"status = 'borrowed'\")" in script
+    assert "op.drop_index('ix_borrowings_due_date_status_borrowed'" in script
+
+
+def test_benchmark_leaves_the_database_unchanged(app):
+    with app.app_context():
+        unread = Notification.query.filter_by(is_read=False).count()
+        fines = db.session.query(func.sum(Borrowing.fine_amount)).scalar()
+        assert unread
+
+    log = run_benchmark(app, [('/user/notifications', 'student'), ('/user/fines', 'student')])
+    assert any(statement.startswith('UPDATE') for statement in log.samples)
+
+    with app.app_context():
+        assert Notification.query.filter_by(is_read=False).count() == unread
+        assert db.session.query(func.sum(Borrowing.fine_amount)).scalar() == fines
@@ -0,0 +1,100 @@
+"""
+Inventory Service Tests
+Copy records, copy-level lending and counter reconciliation
+"""
+
+from models import db, Book, BookCopy, Borrowing
+from inventory_service import ensure_copies, set_total_copies, reconcile_available_copies
+
+
+def _book(title):
+    return Book.query.filter_by(title=title).first()
+
+
+def _statuses(book):
+    return sorted(copy.status for copy in book.copies)
+
+
+def test_ensure_copies_materializes_counters(app):
+    with app.app_context():
+        book = _book('Seed Book 000')
+        loan = Borrowing.query.filter_by(book_id=book.id, status='borrowed').one()
+
+        assert ensure_copies(book) == 3
+        db.session.commit()
+
+        assert _statuses(book) == ['available', 'available', 'on_loan']
+        assert loan.copy.status == 'on_loan'
+        assert (book.total_copies, book.available_copies) == (3, 2)
+        assert ensure_copies(book) == 0
+
+
+def test_borrow_and_return_move_a_copy(app, client, login):
+    with app.app_context():
+        book = _book('Seed Book 010')
+        ensure_copies(book)
+        db.session.commit()
+        book_id = book.id
+
+    login('STU001')
+    client.post(f'/books/{book_id}/borrow')
+
+    with app.app_context():
+        loan = Borrowing.query.filter_by(book_id=book_id, status='borrowed').one()
+        assert loan.copy.barcode.startswith(f'BK{book_id:06d}-')
+        assert loan.copy.status == 'on_loan'
+        loan_id = loan.id
+
+    client.post(f'/user/borrowings/{loan_id}/return')
+
+    with app.app_context():
+        book = db.session.get(Book, book_id)
+        assert _statuses(book) == ['available', 'available']
+        assert book.available_copies == 2
+
+
+def test_total_copies_only_shrinks_from_the_shelf(app):
+    with app.app_context():
+        book = _book('Seed Book 000')
+
+        assert not set_total_copies(book, 0)
+        db.session.rollback()
+
+        assert set_total_copies(book, 1)
+        db.session.commit()
+        assert _statuses(book) == ['on_loan', 'withdrawn', 'withdrawn']
+        assert (book.total_copies, book.available_copies) == (1, 0)
+
+
+def test_reconcile_rebuilds_counters_from_copies(app):
+    with app.app_context():
+        book = _book('Seed Book 000')
+        ensure_copies(book)
+        book.available_copies = 9
+        book.total_copies = 1
+        db.session.commit()
+
+        assert reconcile_available_copies() == 1
+        db.session.commit()
+        db.session.expire_all()
+        assert (book.total_copies, book.available_copies) == (3, 2)
+        assert reconcile_available_copies() == 0
+        assert BookCopy.query.count() == 3
+
+
+def test_admin_can_delete_a_book_with_copies(app, client, login):
+    login('ADMIN001')
+    client.post('/admin/books/add', data={
+        'isbn': '978-9-999999', 'title': 'Short-Lived Book', 'author': 'Someone', 'total_copies': 2
+    })
+    with app.app_context():
+        book = Book.query.filter_by(isbn='978-9-999999').one()
+        book_id = book.id
+        assert book.copies.count() == 2
+
+    response = client.post(f'/admin/books/{book_id}/delete')
+    assert response.status_code == 302
+
+    with app.app_context():
+        assert db.session.get(Book, book_id) is None
+        assert BookCopy.query.filter_by(book_id=book_id).count() == 0
@@ -0,0 +1,55 @@
+"""
+Notification Counter Tests
+Denormalized User.unread_notifications maintenance and reconciliation
+"""
+
+from models import db, User, Notification
+from reconcile_notification_counters import reconcile_unread_notifications
+
+
+def _unread(user_id='STU001'):
+    db.session.expire_all()
+    return User.query.filter_by(user_id=user_id).first().unread_notifications
+
+
+def test_counter_follows_insert_read_and_delete(app):
+    with app.app_context():
+        assert _unread() == 4
+
+        user = User.query.filter_by(user_id='STU001').first()
+        notification = Notification(user_id=user.id, title='New', message='Hello')
+        db.session.add(notification)
+        db.session.commit()
+        assert _unread() == 5
+
+        notification.is_read = True
+        db.session.commit()
+        assert _unread() == 4
+
+        db.session.delete(notification)
+        db.session.commit()
+        assert _unread() == 4
+
+        unread = Notification.query.filter_by(user_id=user.id, is_read=False).first()
+        db.session.delete(unread)
+        db.session.commit()
+        assert _unread() == 3
+
+
+def test_notifications_page_resets_counter(app, client, login):
+    login('STU001')
+    client.get('/user/notifications')
+
+    with app.app_context():
+        assert _unread() == 0
+
+
+def test_reconcile_corrects_drift(app):
+    with app.app_context():
+        user = User.query.filter_by(user_id='STU001').first()
+        user.unread_notifications = 42
+        db.session.commit()
+
+        assert reconcile_unread_notifications() == 1
+        assert _unread() == 4
+        assert reconcile_unread_notifications() == 0
@@ -0,0 +1,54 @@
+"""
+Page Cache Tests
+Anonymous whole-page caching and cached book-card fragments
+"""
+
+from models import db, Book
+
+
+def test_anonymous_home_page_is_served_from_cache(app, client, login, count_queries):
+    first = client.get('/')
+    with count_queries() as warm:
+        second = client.get('/')
+    assert warm.count == 0
+    assert second.data == first.data
+
+    # A catalog change moves the version the page is keyed by
+    with app.app_context():
+        book = Book.query.filter_by(title='Seed Book 007').first()
+        book.title = 'Renamed Seed Book'
+        db.session.commit()
+    assert b'Renamed Seed Book' in client.get('/').data
+
+    # Logged-in visitors always get a freshly rendered page
+    login('STU001')
+    with count_queries() as personal:
+        client.get('/')
+    assert personal.count > 0
+
+
+def test_pending_flash_is_not_cached(client):
+    client.get('/')
+    with client.session_transaction() as sess:
+        sess['_flashes'] = [('info', 'Only for this visitor')]
+
+    assert b'Only for this visitor' in client.get('/').data
+    assert b'Only for this visitor' not in client.get('/').data
+
+
+def test_book_cards_are_rendered_once_per_version(app, client):
+    cache = app.extensions['book_card_cache']
+    client.get('/books/')
+    with app.app_context():
+        book = Book.query.filter_by(title='Seed Book 003').first()
+        key = ('row', book.id, book.updated_at)
+    assert b'Seed Book 003' in cache.get(key).encode()
+
+    with app.app_context():
+        book = db.session.get(Book, key[1])
+        book.author = 'Corrected Author'
+        db.session.commit()
+        new_key = ('row', book.id, book.updated_at)
+
+    assert b'Corrected Author' in client.get('/books/').data
+    assert 'Corrected Author' in cache.get(new_key)
@@ -0,0 +1,68 @@
+"""
+Patron Service Tests
+Single-query eligibility: loan counts, fines and subscription plan rules
+"""
+
+from datetime import datetime, timedelta
+
+from models import db, User, Borrowing, Subscription, SubscriptionPlan
+from fine_service import accrue_fines
+from settings_service import fine_per_day
+from patron_service import get_patron_status
+
+
+def _student():
+    return User.query.filter_by(user_id='STU001').first()
+
+
+def _subscribe(user, **plan_fields):
+    plan = SubscriptionPlan(name='Premium', price_monthly=299, price_yearly=2990, **plan_fields)
+    db.session.add(plan)
+    db.session.flush()
+    db.session.add(Subscription(user_id=user.id, plan_id=plan.id, duration_months=1,
+                                amount_paid=299, end_date=datetime.utcnow() + timedelta(days=30)))
+    db.session.commit()
+
+
+def test_status_matches_python_fine_calculation(app, count_queries):
+    with app.app_context():
+        user = _student()
+        accrue_fines()
+        db.session.commit()
+        active = Borrowing.query.filter_by(user_id=user.id, status='borrowed').all()
+        expected_fine = sum(b.calculate_fine(fine_per_day()) for b in active if b.is_overdue())
+
+        with count_queries() as counter:
+            status = get_patron_status(user.id)
+
+        assert counter.count == 1
+        assert status.active_loans == len(active) == 4
+        assert status.overdue_loans == sum(1 for b in active if b.is_overdue()) == 2
+        assert status.outstanding_fine == expected_fine == 60
+        assert status.borrow_limit == 5
+        assert not status.can_borrow
+
+
+def test_plan_limits_and_no_late_fees(app):
+    with app.app_context():
+        user = _student()
+        _subscribe(user, max_books=10, no_late_fees=True)
+
+        status = get_patron_status(user.id)
+
+        assert status.borrow_limit == 10
+        assert status.outstanding_fine == 0
+        assert status.can_borrow
+
+
+def test_borrow_blocked_by_fines(app, client, login):
+    with app.app_context():
+        accrue_fines()
+        db.session.commit()
+
+    login('STU001')
+    response = client.post('/books/10/borrow', follow_redirects=True)
+
+    assert b'clear your pending fines' in response.data
+    with app.app_context():
+        assert Borrowing.query.filter_by(book_id=10).count() == 0
@@ -0,0 +1,54 @@
+"""
+Popularity Service Tests
+Borrow counters maintained on insert, batch decay and index-served top-K lists
+"""
+
+from datetime import datetime, timedelta
+
+from models import db, Book, Borrowing, User
+from popularity_service import top_borrowed, trending, decay_trending_scores
+
+
+def _borrow(book, times):
+    student = User.query.filter_by(user_id='STU001').first()
+    for _ in range(times):
+        db.session.add(Borrowing(user_id=student.id, book_id=book.id,
+                                 due_date=datetime.utcnow() + timedelta(days=14)))
+    db.session.commit()
+
+
+def test_loans_maintain_counters_without_touching_updated_at(app):
+    with app.app_context():
+        book = Book.query.filter_by(title='Seed Book 012').first()
+        updated_at = book.updated_at
+        _borrow(book, 3)
+
+        db.session.refresh(book)
+        assert book.borrow_count == 3
+        assert book.trending_score == 3
+        assert book.updated_at == updated_at
+        assert top_borrowed(1) == [book]
+
+
+def test_decay_halves_scores_per_half_life(app):
+    with app.app_context():
+        old, recent = Book.query.filter(Book.title.in_(['Seed Book 010', 'Seed Book 011']))\
+            .order_by(Book.title).all()
+        start = datetime.utcnow()
+        assert decay_trending_scores(now=start) == 0  # first run records the starting point
+
+        _borrow(old, 4)
+        decay_trending_scores(now=start + timedelta(days=7))
+        _borrow(recent, 3)
+
+        db.session.refresh(old)
+        assert abs(old.trending_score - 2) < 1e-9
+        assert trending(2) == [recent, old]
+        assert top_borrowed(2) == [old, recent]
+
+        # Long-idle scores drop to zero and leave the trending list
+        decay_trending_scores(now=start + timedelta(days=365))
+        db.session.refresh(recent)
+        assert recent.trending_score == 0
+        assert trending(5) == []
+        assert top_borrowed(1) == [old]
@@ -0,0 +1,97 @@
+"""
+Query Count Regression Tests
+Upper bounds on SQL statements per request for the main endpoints.
+
+Budgets are measured against the dataset seeded in conftest.py. If a change
+legitimately lowers a count, lower the budget with it; never raise a budget
+to make an N+1 pass.
+"""
+
+import pytest
+
+from conftest import seed_books, seed_circulation
+from models import db, User
+
+
+# (endpoint, url, logged-in user, max queries)
+QUERY_BUDGETS = [
+    ('main.index', '/', None, 8),
+    ('books.index', '/books/', None, 3),
+    ('books.detail', '/books/1', None, 5),
+    ('books.detail', '/books/1', 'STU001', 8),
+    ('books.by_category', '/books/category/Fiction', None, 3),
+    ('books.by_department', '/books/department/CSE', None, 3),
+    ('user.dashboard', '/user/dashboard', 'STU001', 7),
+    ('user.borrowings', '/user/borrowings', 'STU001', 4),
+    ('user.notifications', '/user/notifications', 'STU001', 10),
+    ('user.fines', '/user/fines', 'STU001', 6),
+    ('admin.dashboard', '/admin/dashboard', 'ADMIN001', 10),
+    ('admin.books', '/admin/books', 'ADMIN001', 4),
+    ('admin.users', '/admin/users', 'ADMIN001', 3),
+    ('admin.borrowings', '/admin/borrowings', 'ADMIN001', 7),
+    ('api.get_books', '/api/books', None, 4),
+    ('api.get_book', '/api/books/1', None, 3),
+    ('api.search', '/api/search?q=Seed', None, 3),
+    ('api.search', '/api/search?q=Fic', None, 4),
+    ('api.get_user_borrowings', '/api/user/borrowings', 'STU001', 3),
+    ('api.get_user_reservations', '/api/user/reservations', 'STU001', 2),
+    ('api.get_user_stats', '/api/user/stats', 'STU001', 3),
+    ('api.get_admin_stats', '/api/admin/stats', 'ADMIN001', 5),
+]
+
+# List endpoints whose query count must not depend on the number of rows
+FLAT_ENDPOINTS = [
+    ('main.index', '/', None),
+    ('books.index', '/books/', None),
+    ('books.by_category', '/books/category/Fiction', None),
+    ('api.get_books', '/api/books', None),
+    ('api.search', '/api/search?q=Seed', None),
+    ('api.search', '/api/search?q=Fic', None),
+    ('user.dashboard', '/user/dashboard', 'STU001'),
+    ('user.borrowings', '/user/borrowings', 'STU001'),
+    ('user.fines', '/user/fines', 'STU001'),
+    ('admin.dashboard', '/admin/dashboard', 'ADMIN001'),
+    ('admin.borrowings', '/admin/borrowings', 'ADMIN001'),
+    ('admin.user_detail', '/admin/users/1', 'ADMIN001'),
+    ('admin.export_report', '/admin/reports/export/borrowings', 'ADMIN001'),
+    ('api.get_user_borrowings', '/api/user/borrowings', 'STU001'),
+    ('api.get_user_reservations', '/api/user/reservations', 'STU001'),
+]
+
+
+@pytest.mark.parametrize('endpoint,url,user_id,limit', QUERY_BUDGETS,
+                         ids=[f'{e}[{u or "anon"}]' for e, _, u, _ in QUERY_BUDGETS])
+def test_query_budget(client, login, assert_max_queries, endpoint, url, user_id, limit):
+    if user_id:
+        login(user_id)
+
+    with assert_max_queries(limit):
+        response = client.get(url)
+
+    assert response.status_code == 200, f'{endpoint} returned {response.status_code}'
+
+
+@pytest.mark.parametrize('endpoint,url,user_id', FLAT_ENDPOINTS,
+                         ids=[u for _, u, _ in FLAT_ENDPOINTS])
+def test_query_count_independent_of_rows(app, client, login, count_queries, endpoint, url, user_id):
+    if user_id:
+        login(user_id)
+    client.get(url)  # warm per-app caches such as the user loader cache
+
+    with count_queries() as before:
+        client.get(url)
+
+    # Grow the dataset; an N+1 shows up as a higher statement count
+    with app.app_context():
+        student = User.query.filter_by(user_id='STU001').first()
+        seed_circulation(student, seed_books(15, offset=500))
+        db.session.commit()
+    client.get(url)
+
+    with count_queries() as after:
+        client.get(url)
+
+    assert after.count == before.count, (
+        f'{endpoint} went from {before.count} to {after.count} queries '
+        f'after adding rows:\n{after.report()}'
+    )
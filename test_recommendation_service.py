@@ -0,0 +1,70 @@
+"""
+Recommendation Service Tests
+NumPy/SciPy batch scoring and the one-query dashboard read
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Book, Borrowing, Review, User, UserRecommendation
+from recommendation_service import compute_recommendations, recommended_books
+
+
+def _reader(user_id, department='ECE'):
+    user = User(user_id=user_id, email=f'{user_id.lower()}@library.com', full_name=user_id,
+                role='student', department=department, is_verified=True, is_active=True)
+    user.set_password('secret123')
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+def _borrow(user, *books):
+    for book in books:
+        db.session.add(Borrowing(user_id=user.id, book_id=book.id, status='returned',
+                                 due_date=datetime.utcnow() - timedelta(days=1)))
+
+
+def test_co_borrowed_books_are_recommended(app):
+    pytest.importorskip('numpy')
+    pytest.importorskip('scipy')
+    with app.app_context():
+        books = {book.title: book for book in Book.query.all()}
+        first, second, third = (books[f'Seed Book {i:03d}'] for i in (10, 11, 12))
+
+        # Everyone who borrowed the first book also borrowed the second
+        for name in ('RDR001', 'RDR002', 'RDR003'):
+            _borrow(_reader(name), first, second)
+        newcomer = _reader('RDR004')
+        _borrow(newcomer, first)
+        db.session.add(Review(user_id=newcomer.id, book_id=third.id, rating=1))
+        db.session.commit()
+
+        assert compute_recommendations(limit=3) > 0
+
+        suggested = recommended_books(newcomer.id)
+        assert suggested[0] == second
+        assert first not in suggested and third not in suggested
+        assert [r.rank for r in UserRecommendation.query.filter_by(user_id=newcomer.id)
+                .order_by(UserRecommendation.rank)] == [1, 2, 3]
+
+        # A rerun replaces the previous suggestions
+        compute_recommendations(limit=2)
+        assert UserRecommendation.query.filter_by(user_id=newcomer.id).count() == 2
+
+
+def test_dashboard_reads_suggestions_in_one_query(app, client, login, count_queries):
+    with app.app_context():
+        student = User.query.filter_by(user_id='STU001').first()
+        book = Book.query.filter_by(title='Seed Book 014').first()
+        db.session.add(UserRecommendation(user_id=student.id, rank=1, book_id=book.id, score=0.9))
+        db.session.commit()
+
+    login('STU001')
+    client.get('/user/dashboard')
+    with count_queries() as counter:
+        response = client.get('/user/dashboard')
+
+    assert b'Recommended for You' in response.data and b'Seed Book 014' in response.data
+    assert sum('user_recommendations' in statement for statement in counter.statements) == 1
@@ -0,0 +1,97 @@
+"""
+Reservation Service Tests
+Priority queue order, copy handoff on return and the hold expiry sweeper
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, User, Book, Borrowing, Reservation, Subscription, SubscriptionPlan
+from reservation_service import expire_holds, return_copy
+
+
+@pytest.fixture
+def queue(app):
+    """A fully loaned-out book with STU002 queued first and priority member STU003 second"""
+    with app.app_context():
+        now = datetime.utcnow()
+        book = Book(isbn='978-1-000001', title='Queued Book', author='Someone',
+                    category='Fiction', total_copies=1, available_copies=0)
+        db.session.add(book)
+        waiting = []
+        for user_id in ('STU002', 'STU003'):
+            user = User(user_id=user_id, email=f'{user_id.lower()}@library.com',
+                        full_name=user_id, role='student', is_verified=True, is_active=True)
+            user.set_password('student123')
+            db.session.add(user)
+            waiting.append(user)
+        db.session.flush()
+
+        holder = User.query.filter_by(user_id='STU001').first()
+        loan = Borrowing(user_id=holder.id, book_id=book.id,
+                         due_date=now + timedelta(days=7), status='borrowed')
+        db.session.add(loan)
+        db.session.add(Reservation(user_id=waiting[0].id, book_id=book.id,
+                                   created_at=now - timedelta(days=2)))
+        db.session.add(Reservation(user_id=waiting[1].id, book_id=book.id,
+                                   created_at=now - timedelta(days=1)))
+
+        plan = SubscriptionPlan(name='Priority', price_monthly=99, price_yearly=990,
+                                priority_reservation=True)
+        db.session.add(plan)
+        db.session.flush()
+        db.session.add(Subscription(user_id=waiting[1].id, plan_id=plan.id, duration_months=1,
+                                    amount_paid=99, end_date=now + timedelta(days=30)))
+        db.session.commit()
+        return {'book_id': book.id, 'loan_id': loan.id}
+
+
+def _holder_of(book_id):
+    hold = Reservation.query.filter_by(book_id=book_id, status='pending', notified=True).first()
+    return hold and db.session.get(User, hold.user_id).user_id
+
+
+def test_return_hands_copy_to_priority_member(app, client, login, queue):
+    login('STU001')
+    client.post(f"/user/borrowings/{queue['loan_id']}/return")
+
+    with app.app_context():
+        assert _holder_of(queue['book_id']) == 'STU003'
+        assert db.session.get(Book, queue['book_id']).available_copies == 0
+
+    # The held copy can be borrowed even though nothing is on the shelf
+    login('STU003')
+    client.post(f"/books/{queue['book_id']}/borrow")
+
+    with app.app_context():
+        user = User.query.filter_by(user_id='STU003').first()
+        assert Borrowing.query.filter_by(user_id=user.id, book_id=queue['book_id']).count() == 1
+        assert Reservation.query.filter_by(user_id=user.id).one().status == 'fulfilled'
+        assert db.session.get(Book, queue['book_id']).available_copies == 0
+
+
+def test_admin_return_hands_copy_over(app, client, login, queue):
+    login('ADMIN001')
+    client.post(f"/admin/borrowings/{queue['loan_id']}/mark-returned")
+
+    with app.app_context():
+        assert _holder_of(queue['book_id']) == 'STU003'
+
+
+def test_sweeper_expires_and_cascades(app, queue):
+    with app.app_context():
+        book = db.session.get(Book, queue['book_id'])
+        return_copy(book)
+        db.session.commit()
+
+        later = datetime.utcnow() + timedelta(days=4)
+        assert expire_holds(now=later) == 1
+        db.session.commit()
+        assert _holder_of(book.id) == 'STU002'
+
+        assert expire_holds(now=later + timedelta(days=4)) == 1
+        db.session.commit()
+        assert _holder_of(book.id) is None
+        assert db.session.get(Book, book.id).available_copies == 1
+        assert Reservation.query.filter_by(book_id=book.id, status='expired').count() == 2
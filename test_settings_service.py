@@ -0,0 +1,105 @@
+"""
+Settings Service Tests
+Snapshot reads, version-driven reloads and the one-transaction admin save
+"""
+
+from datetime import datetime, timedelta
+
+from models import db, Setting, Borrowing, Book
+from settings_service import SettingsSnapshot, get_setting, loan_days, renewal_days, max_renewals
+
+
+def test_snapshot_reads_are_free(app, count_queries):
+    with app.app_context():
+        with count_queries() as counter:
+            for _ in range(10):
+                assert loan_days() == 14
+                assert get_setting('library_name') == 'Digital Learning Library'
+        assert counter.count == 0
+
+
+def test_other_workers_reload_when_version_moves(app, count_queries):
+    with app.app_context():
+        other = SettingsSnapshot(check_interval=0)
+        assert other.values()['max_books_per_user'] == '5'
+
+        Setting.set_many({'max_books_per_user': '3', 'fine_per_day': '2'})
+        version = Setting.get(Setting.VERSION_KEY)
+        assert version
+
+        with count_queries() as counter:
+            values = other.values()
+        assert counter.count == 2  # version check, reload
+        assert values['max_books_per_user'] == '3'
+        assert values[Setting.VERSION_KEY] == version
+
+        with count_queries() as counter:
+            other.values()
+        assert counter.count == 1  # version unchanged
+
+
+def test_admin_save_is_one_transaction_and_applies_to_loans(app, client, login, count_queries):
+    login('ADMIN001')
+    with count_queries() as counter:
+        response = client.post('/admin/settings', data={
+            'max_borrow_days': '21', 'fine_per_day': '3', 'library_name': 'Branch Library'
+        })
+    assert response.status_code == 302
+    writes = [s for s in counter.statements if s.startswith(('INSERT', 'UPDATE'))]
+    assert len(writes) == 2  # existing rows in one executemany UPDATE, new version row
+
+    with app.app_context():
+        assert loan_days() == 21
+        assert get_setting('library_name') == 'Branch Library'
+
+    login('STU001')
+    with app.app_context():
+        book = Book.query.filter_by(title='Seed Book 010').first()
+        book_id = book.id
+    client.post(f'/books/{book_id}/borrow')
+
+    with app.app_context():
+        loan = Borrowing.query.filter_by(book_id=book_id, status='borrowed').first()
+        assert loan.due_date - datetime.utcnow() > timedelta(days=20)
+
+
+def test_admin_save_ignores_keys_the_form_does_not_edit(app, client, login):
+    with app.app_context():
+        decayed_at = Setting.get('trending_decayed_at')
+
+    login('ADMIN001')
+    client.post('/admin/settings', data={
+        'max_books_per_user': '4', 'trending_decayed_at': '2000-01-01T00:00:00',
+        'setting_lookup_cache_version': '99', 'is_admin': 'yes'
+    })
+
+    with app.app_context():
+        assert get_setting('max_books_per_user') == '4'
+        assert Setting.get('trending_decayed_at') == decayed_at
+        assert Setting.get('lookup_cache_version') != '99'
+        assert Setting.get('is_admin') is None
+
+
+def test_renewals_follow_the_admin_settings(app, client, login):
+    with app.app_context():
+        assert renewal_days() == loan_days()
+        assert max_renewals() == 2
+        loan = Borrowing.query.filter(
+            Borrowing.status == 'borrowed', Borrowing.due_date > datetime.utcnow()
+        ).first()
+        loan_id, user_id = loan.id, loan.user.user_id
+
+    login('ADMIN001')
+    client.post('/admin/settings', data={'renewal_period': '5', 'max_renewals': '1'})
+
+    login(user_id)
+    client.post(f'/user/borrowings/{loan_id}/renew')
+    with app.app_context():
+        loan = db.session.get(Borrowing, loan_id)
+        assert loan.renewed_count == 1
+        assert timedelta(days=4) < loan.due_date - datetime.utcnow() <= timedelta(days=5)
+        assert not loan.can_renew()
+
+    client.post(f'/user/borrowings/{loan_id}/renew')
+    with app.app_context():
+        assert db.session.get(Borrowing, loan_id).renewed_count == 1
@@ -0,0 +1,154 @@
+"""
+Shared Cache Tests
+Per-worker LRU, the Redis tier with tag invalidation, stampede protection and
+ORM-driven invalidation
+"""
+
+import threading
+import time
+
+import shared_cache_service
+from models import db, Book
+from shared_cache_service import LRUCache, TieredCache, should_refresh
+
+
+class StandInRedis:
+    """In-process stand-in for the handful of Redis commands the cache uses"""
+
+    def __init__(self):
+        self.values, self.sets, self.published = {}, {}, []
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+            self.sets.pop(key, None)
+
+    def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member)
+
+    def smembers(self, key):
+        return self.sets.get(key, set())
+
+    def expire(self, key, seconds):
+        pass
+
+    def publish(self, channel, data):
+        self.published.append({'type': 'message', 'channel': channel, 'data': data})
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1, ttl=60)
+    cache.set('b', 2, ttl=60)
+    cache.get('a')
+    cache.set('c', 3, ttl=60)
+
+    assert cache.get('a') == (True, 1)
+    assert cache.get('b') == (False, None)
+
+
+def test_tag_invalidation_reaches_other_workers():
+    redis = StandInRedis()
+    first, second = TieredCache(redis), TieredCache(redis)
+
+    first.set('facets', ['CSE'], tags=('catalog',))
+    assert second.get('facets') == (True, ['CSE'])  # from Redis, now in its L1 too
+
+    first.invalidate_tags('catalog')
+    assert redis.get('library:facets') is None
+    assert second.get('facets') == (True, ['CSE'])  # broadcast not delivered yet
+
+    second.handle_message(redis.published[-1])
+    assert second.get('facets') == (False, None)
+
+
+def test_concurrent_misses_compute_once():
+    cache = TieredCache(namespace=f'test-{time.time()}')
+    calls, results = [], []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'report'
+
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_set('report', loader)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ['report'] * 4
+    assert len(calls) == 1
+
+
+def test_stale_value_served_while_another_worker_refreshes(monkeypatch):
+    redis = StandInRedis()
+    first, second = TieredCache(redis), TieredCache(redis)
+    first.set('dashboard', 'old', ttl=60)
+    monkeypatch.setattr(shared_cache_service, 'should_refresh', lambda *args, **kwargs: True)
+
+    with first.single_flight('dashboard') as leader:
+        assert leader
+        assert second.get_or_set('dashboard', lambda: 'new') == 'old'
+
+    assert second.get_or_set('dashboard', lambda: 'new') == 'new'
+    assert 'library:lock:dashboard' not in redis.values
+
+
+def test_early_refresh_probability(monkeypatch):
+    now = time.time()
+    assert should_refresh(now - 1, delta=0, now=now)
+    assert not should_refresh(now + 10, delta=0, now=now)
+
+    # A slow loader (large delta) is refreshed well before expiry on an unlucky draw
+    monkeypatch.setattr(shared_cache_service.random, 'random', lambda: 0.99)
+    assert should_refresh(now + 10, delta=5, now=now)
+    assert not should_refresh(now + 10, delta=5, beta=0, now=now)
+
+
+def test_commit_invalidates_cached_pages(app, client, count_queries):
+    client.get('/')
+    with count_queries() as cached:
+        assert client.get('/').status_code == 200
+    assert cached.count == 0
+
+    with app.app_context():
+        db.session.add(Book(isbn='978-1-000000', title='Brand New Arrival', author='Someone'))
+        db.session.commit()
+
+    assert b'Brand New Arrival' in client.get('/').data
+
+
+def test_core_updates_invalidate_their_tags(app):
+    from datetime import datetime, timedelta
+    from fine_service import accrue_fines
+    from popularity_service import decay_trending_scores
+
+    with app.app_context():
+        cache = shared_cache_service.shared_cache()
+        cache.set('loans', 'stale', 60, tags=('circulation',))
+        cache.set('books', 'stale', 60, tags=('catalog',))
+
+        assert accrue_fines()
+        assert cache.get('loans') == (True, 'stale')  # not before the commit
+        db.session.commit()
+        assert cache.get('loans') == (False, None)
+
+        book = Book.query.first()
+        book.trending_score = 5
+        db.session.commit()
+        cache.set('books', 'stale', 60, tags=('catalog',))
+        now = datetime.utcnow()
+        decay_trending_scores(now)
+        assert decay_trending_scores(now + timedelta(days=1))
+        assert cache.get('books') == (False, None)